@@ -1,27 +1,31 @@
 # /project_folder/app/__init__.py
 
 import os
-import json
-import csv # <--- IMPORT THE CSV MODULE
 from sqlalchemy.exc import OperationalError
-from flask import Flask,render_template
+from flask import Flask
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_jwt_extended import JWTManager
-from sqlalchemy.orm import joinedload
 from dotenv import load_dotenv # --- 1. IMPORT load_dotenv ---
 from config import config
 # --- Load environment variables from .env file ---
 load_dotenv()
 
 # --- Import your models directly ---
-from .dol_db.models import db, Category, User, DiscourseBlog
+from .dol_db.models import db, User
 
 # --------------------------------------------------------------------------
 # 1. INSTANTIATE EXTENSIONS
 # --------------------------------------------------------------------------
 migrate = Migrate()
 from .dol_db.admin import setup_admin
+from .snapshot import get_global_snapshot
+from .outage import render_outage_page, outage_response
+from .dol_db.user_cache import load_cached_user
+from .dol_db.routing import replica_binds, init_db_routing
+from .dol_db.engine import engine_options, dispose_pools_after_fork
+from .dol_db.snowflake import init_snowflake
+from .cache import cache
 login_manager = LoginManager()
 login_manager.login_view = 'main.login_page'
 login_manager.login_message_category = 'info'
@@ -49,13 +53,67 @@ def create_app():
     # Construct the MySQL Database URI
     # The format is: 'mysql+pymysql://<user>:<password>@<host>/<database_name>'
     database_uri = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}'
+    # A full URI overrides the above, e.g. sqlite:///... for the offline benchmarks
+    database_uri = os.environ.get('DATABASE_URL') or database_uri
 
     # Load configuration from environment variables
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
     app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Connection pool sizing, recycling and timeouts, from DB_POOL_* (see dol_db/engine.py)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_uri)
+    # Read replicas, comma-separated URIs; plain reads in GET requests go there (see dol_db/routing.py)
+    app.config['DATABASE_REPLICA_URLS'] = [u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+    app.config['SQLALCHEMY_BINDS'] = replica_binds(app.config['DATABASE_REPLICA_URLS'])
+    app.config['DATABASE_REPLICA_MAX_LAG'] = float(os.environ.get('DATABASE_REPLICA_MAX_LAG', 5))
+    app.config['DATABASE_REPLICA_CHECK_INTERVAL'] = float(os.environ.get('DATABASE_REPLICA_CHECK_INTERVAL', 2))
+    # After a visitor writes, their reads stay on the primary this long (read-your-writes)
+    app.config['DATABASE_STICKY_SECONDS'] = int(os.environ.get('DATABASE_STICKY_SECONDS', 10))
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY')
     app.config['BIBLE_DATABASES_PATH'] = os.path.join(BASE_DIR,'instance')
+    # Size of the process pool that encodes uploaded images (0 = encode inline)
+    app.config['IMAGE_WORKERS'] = int(os.environ.get('IMAGE_WORKERS', 2))
+    # Root of the content-addressed upload store (served under /media/store)
+    app.config['MEDIA_STORE_PATH'] = os.environ.get('MEDIA_STORE_PATH', os.path.join(BASE_DIR, 'instance', 'media_store'))
+    # TF-IDF index behind the "related discourses" panel (rebuild: flask discourse:rebuild-related)
+    app.config['RELATED_INDEX_PATH'] = os.path.join(BASE_DIR, 'instance', 'related_index.npz')
+    # Seconds between batched writes of discourse view counts
+    app.config['VIEW_FLUSH_INTERVAL'] = int(os.environ.get('VIEW_FLUSH_INTERVAL', 10))
+    # Upper bound on the age of the cached sidebar/content snapshot (other workers' writes)
+    app.config['SNAPSHOT_MAX_AGE'] = int(os.environ.get('SNAPSHOT_MAX_AGE', 60))
+    # How often the static/data files are checked for changes (see datafiles.py)
+    app.config['DATAFILE_RECHECK_SECONDS'] = int(os.environ.get('DATAFILE_RECHECK_SECONDS', 5))
+    # Retry-After (seconds) sent with the database-outage 503 page
+    app.config['OUTAGE_RETRY_AFTER'] = int(os.environ.get('OUTAGE_RETRY_AFTER', 30))
+    # Request metrics, scraped at /metrics with METRICS_TOKEN (see dol_metrics/metrics_routes.py)
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') != '0'
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    # Set for pre-fork servers (gunicorn): one file per worker, merged on scrape
+    app.config['METRICS_MULTIPROC_DIR'] = os.environ.get('METRICS_MULTIPROC_DIR')
+    # SQL instrumentation (see dol_metrics/sql_metrics.py)
+    app.config['SQL_SLOW_QUERY_MS'] = int(os.environ.get('SQL_SLOW_QUERY_MS', 200))
+    app.config['SQL_SLOW_QUERY_LOG'] = os.environ.get('SQL_SLOW_QUERY_LOG')  # JSON lines; unset = application log
+    app.config['SQL_NPLUS1_THRESHOLD'] = int(os.environ.get('SQL_NPLUS1_THRESHOLD', 5))
+    app.config['SQL_SERVER_TIMING'] = os.environ.get('SQL_SERVER_TIMING', '0') == '1'
+    # Outbound HTTP call log read by `flask http:summary`, one file per process (empty = metrics only)
+    app.config['HTTP_CALL_LOG'] = os.environ.get('HTTP_CALL_LOG', os.path.join(app.instance_path, 'http_calls.jsonl'))
+    # Seconds a logged-in user's snapshot is reused before it is reloaded (0 = every request)
+    app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 30))
+    # Application cache shared by the blueprints (see cache.py): memory://, sqlite:///<path>, redis://... or fakeredis://
+    # memory:// is per worker: with several workers, one worker's invalidations never reach the others, so
+    # entries it caches are only as fresh as their TTL (discourse payloads: SNAPSHOT_MAX_AGE). Use sqlite:///
+    # (one host) or redis:// (several hosts) to share entries and invalidations.
+    app.config['CACHE_URL'] = os.environ.get('CACHE_URL', 'memory://')
+    app.config['CACHE_DEFAULT_TTL'] = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    app.config['CACHE_TTL_JITTER'] = float(os.environ.get('CACHE_TTL_JITTER', 0.1))
+    app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 4096))
+    app.config['CACHE_KEY_PREFIX'] = os.environ.get('CACHE_KEY_PREFIX', 'dol')
+    # Lets admins append ?__profile=1 to any URL (see dol_metrics/profiling.py); off = no hooks at all
+    app.config['PROFILER_ENABLED'] = os.environ.get('PROFILER_ENABLED', '0') == '1'
+    app.config['PROFILER_INTERVAL_MS'] = float(os.environ.get('PROFILER_INTERVAL_MS', 1))
+    # Worker id in snowflake IDs: an explicit 0-1023 per process, 'lease' (from the DB) or 'hash' (dev only); see dol_db/snowflake.py
+    app.config['SNOWFLAKE_WORKER_ID'] = os.environ.get('SNOWFLAKE_WORKER_ID', 'lease')
+    app.config['SNOWFLAKE_LEASE_SECONDS'] = int(os.environ.get('SNOWFLAKE_LEASE_SECONDS', 60))
     
     
     # --- END OF CHANGES ---
@@ -68,7 +126,12 @@ def create_app():
     # --------------------------------------------------------------------------
     # 3. INITIALIZE EXTENSIONS WITH THE APP
     # --------------------------------------------------------------------------
+    cache.init_app(app)
     db.init_app(app)
+    with app.app_context():
+        dispose_pools_after_fork(db.engines.values())  # Workers forked after startup open their own connections
+    init_db_routing(app, db)
+    init_snowflake(app)
     migrate.init_app(app, db)
     jwt = JWTManager(app)
     setup_admin(app)
@@ -83,8 +146,9 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
+        # An immutable, cached snapshot (see dol_db/user_cache.py), not the User model
         try:
-            return User.query.get(int(user_id))
+            return load_cached_user(int(user_id), app.config['USER_CACHE_TTL'])
         except OperationalError as e:
             app.logger.warning(f"Could not connect to DB to load user: {e}")
             return None # Tell Flask-Login no user could be loaded
@@ -98,78 +162,14 @@ def create_app():
     
     @app.context_processor
     def inject_global_data():
-        # ... (no changes needed here) ...
-        app.logger.info("--- [CONTEXT] Starting global data injection ---")
-        
-        # --- 1. Load static data for the right sidebar ---
-        daily_data = load_json_data('daily.json')
-
-        # --- 2. Build the dynamic sidebar data from the database ---
-        sidebar_data = []
-        try:
-            # Fetch all categories and their subcategories in a single, efficient query.
-            all_categories = Category.query.options(
-                joinedload(Category.subcategories)
-            ).order_by(Category.name).all()
-
-            for cat in all_categories:
-                if len(cat.subcategories) > 0:
-                    sidebar_data.append({
-                        'id': cat.id,
-                        'name': cat.name,
-                        'icon': "fa-landmark",  # Placeholder icon
-                        'subcategories': [
-                            {'id': sub.id, 'name': sub.name}
-                            for sub in sorted(cat.subcategories, key=lambda x: x.name)
-                        ]
-                    })
-            app.logger.info("[CONTEXT] Successfully built sidebar_data.")
-        except Exception as e:
-            app.logger.error(f"[CONTEXT] Could not build sidebar_data: {e}")
-
-        # --- 3. NEW: Load all approved discourses for the JavaScript front-end ---
-        content_data = []
-        try:
-            # Query all approved discourses, ordering by the newest first.
-            # We only select the columns needed by the JavaScript to keep the payload small.
-            all_discourses = db.session.query(
-                DiscourseBlog.id, 
-                DiscourseBlog.title,
-                DiscourseBlog.subcategory_id
-            ).filter(DiscourseBlog.is_approved == True).order_by(DiscourseBlog.date_posted.desc()).all()
-
-            # Convert the SQLAlchemy objects to a list of simple dictionaries.
-            # This is faster and cleaner for JSON serialization.
-            content_data = [
-                {
-                    'id': disc.id,
-                    'title': disc.title,
-                    'subcategory_id': disc.subcategory_id
-                } for disc in all_discourses
-            ]
-            app.logger.info(f"[CONTEXT] Successfully loaded {len(content_data)} discourses for content_data.")
-        except Exception as e:
-            app.logger.error(f"[CONTEXT] Could not load discourses for content_data: {e}")
-
-
-        # --- 4. Return the complete context dictionary ---
-        return dict(
-            daily_data=daily_data,
-            sidebar_data=sidebar_data,
-            content_data=content_data  # This is the crucial addition
-        )
+        """
+        Injects the sidebar and daily readings into every template. Served from
+        a cached snapshot that is rebuilt only when categories or discourses are
+        written (see snapshot.py); discourse listings load on demand from
+        /discourse/api/index.
+        """
+        return get_global_snapshot(app)
 
-    def load_json_data(filename):
-        """Helper function to load data from the static/data folder."""
-        # Use app.root_path which is more reliable than current_app in this context
-        filepath = os.path.join(app.root_path, 'static', 'data', filename)
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            app.logger.warning(f"Could not load or parse {filename}")
-            return [] if filename.endswith('s.json') else {}
-            
     # --------------------------------------------------------------------------
     # 5. REGISTER BLUEPRINTS & COMMANDS
     # --------------------------------------------------------------------------
@@ -179,48 +179,41 @@ def create_app():
     from .dol_liturgy.lit_routes import liturgy_bp
     from .dol_bible.bible_routes import bible_bp
     from .dol_charity.charity_routes import charity_bp 
+    from .dol_media.media_routes import media_bp
+    from .dol_metrics.metrics_routes import metrics_bp
+    from .dol_metrics.sql_metrics import init_sql_metrics
+    from .dol_metrics.http_metrics import init_http_metrics
+    from .dol_metrics.profiling import init_profiler
+    from .dol_metrics.pool_metrics import init_pool_metrics
     app.register_blueprint(charity_bp) 
+    app.register_blueprint(media_bp)
     app.register_blueprint(bible_bp)
     app.register_blueprint(liturgy_bp)
     app.register_blueprint(routes.bp)
     app.register_blueprint(discourse_bp)
     app.register_blueprint(academic_bp, url_prefix='/academic')
+    app.register_blueprint(metrics_bp)
+    init_sql_metrics(app)
+    init_pool_metrics(app, db)
+    init_http_metrics(app)
+    init_profiler(app)
     
     # --------------------------------------------------------------------------
     # 6. REGISTER CUSTOM ERROR HANDLERS
     # --------------------------------------------------------------------------
 
 
+    # Parsed and rendered once here, so the outage path only serves bytes
+    outage_page = render_outage_page(app)
+
     @app.errorhandler(OperationalError)
     def handle_db_connection_error(e):
         """
         Catches database connection errors and shows an engaging "waiting" page
-        with scrolling quotes.
+        with scrolling quotes, pre-rendered at startup (see outage.py).
         """
         app.logger.error(f"DATABASE CONNECTION ERROR: {e}")
-        
-        quotes = []
-        # --- NEW: Read the CSV file ---
-        csv_path = os.path.join(app.root_path, 'static', 'data', 'Jesus_speaks.csv')
-        try:
-            with open(csv_path, mode='r', encoding='utf-8') as infile:
-                # Use DictReader to read rows as dictionaries
-                reader = csv.DictReader(infile)
-                for row in reader:
-                    # Clean up keys and values
-                    cleaned_row = {k.strip(): v.strip() for k, v in row.items()}
-                    quotes.append(cleaned_row)
-        except FileNotFoundError:
-            app.logger.error(f"Jesus_speaks.csv not found at {csv_path}")
-            # Provide a fallback quote if the file is missing
-            quotes.append({
-                'Quote': 'Come to me, all you who are weary and burdened, and I will give you rest.',
-                'ref': 'Matthew 11:28',
-                'Age': ''
-            })
-
-        # Pass the list of quotes to the template
-        return render_template('errors/503.html', quotes=quotes), 503
+        return outage_response(outage_page, app.config['OUTAGE_RETRY_AFTER'])
     
     from . import commands
     commands.init_app(app)
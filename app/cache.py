@@ -0,0 +1,578 @@
+# /project_folder/app/cache.py
+
+"""
+Application cache shared by the blueprints.
+
+`cache` is configured from CACHE_URL when the app is created:
+
+    memory://                 In-process LRU with TTLs (default). Fastest, but
+                              every worker has its own copy and sees only its
+                              own invalidations.
+    sqlite:////path/cache.db  One file shared by every worker on the host (WAL
+                              mode), so entries and invalidations are shared.
+    redis://host:6379/0       Shared by every host. Needs the `redis` package.
+    fakeredis://              An in-process stand-in for Redis (development
+                              and benchmarks), exercising the Redis backend code.
+
+Code works through a namespace, one per blueprint or feature:
+
+    readings = cache.namespace('liturgy')
+    data = readings.get_or_set(('readings', day), build, ttl=3600, tags=('readings',))
+
+- Keys are namespaced (`<CACHE_KEY_PREFIX>:<namespace>:<key>`); a tuple key
+  is joined with ':'.
+- Tags: an entry remembers the version of each of its tags when it was built.
+  `cache.invalidate_tags('discourse:5')` bumps the version, which turns every
+  entry carrying the tag stale at once, in every namespace. `clear()` on a
+  namespace does the same through the tag every entry of it implicitly has.
+- Single-flight: concurrent misses of one key in a process build it once; the
+  other threads wait and read the result. Across processes, TTL jitter
+  spreads expiries so entries stored together don't all miss together.
+- TTL jitter: each TTL is shortened by a random fraction of up to
+  CACHE_TTL_JITTER.
+- Fill context: `get_or_set` runs each builder inside `cache.fill_context()`.
+  With read replicas this is `use_primary` (see dol_db/routing.py), so no
+  cached value is read from a replica that has not caught up yet.
+- Stats: hits, misses, stale entries and backend errors per namespace go to
+  `/metrics` (cache_requests_total); `flask cache:stats` summarizes them.
+
+A failing backend (a locked file, Redis down) never fails a request: lookups
+count as misses and writes are skipped, with a warning in the log.
+
+The memory backend returns the stored object itself, so treat cached values
+as read-only. The other backends pickle them.
+"""
+
+import fnmatch
+import logging
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+from .dol_metrics.metrics_utils import registry
+
+DEFAULT_URL = 'memory://'
+DEFAULT_PREFIX = 'dol'
+DEFAULT_TTL = 300          # seconds
+DEFAULT_JITTER = 0.1       # up to 10% shorter
+DEFAULT_MAX_ENTRIES = 4096
+SQLITE_MAX_ENTRIES = 100000
+SQLITE_PURGE_EVERY = 500   # writes between purges of expired entries
+
+NAMESPACE_TAG = 'ns:{}'
+
+REQUESTS = registry.counter(
+    'cache_requests_total', 'Application cache lookups, by namespace and result (hit, miss, stale, error).',
+    ('namespace', 'result'))
+INVALIDATIONS = registry.counter(
+    'cache_tag_invalidations_total', 'Cache tag invalidations, by tag family (the part before the first colon).',
+    ('family',))
+
+MISSING = object()
+
+
+def _key_text(key):
+    if isinstance(key, tuple):
+        return ':'.join(str(part) for part in key)
+    return str(key)
+
+
+# -------------------------
+# Backends
+# -------------------------
+# A backend stores records under string keys until a wall-clock expiry, plus
+# an integer version per tag. It never interprets the records.
+class MemoryBackend:
+    """In-process LRU with per-entry expiry."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, record)
+        self._tags = {}
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, record, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, record)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def tag_versions(self, tags):
+        with self._lock:
+            return [self._tags.get(tag, 0) for tag in tags]
+
+    def bump_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()  # Tag versions stay: they only ever move forward
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteBackend:
+    """A cache file shared by the worker processes of one host."""
+
+    name = 'sqlite'
+
+    def __init__(self, path, max_entries=SQLITE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_entries "
+                         "(key TEXT PRIMARY KEY, expires REAL NOT NULL, record BLOB NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_expires ON cache_entries (expires)")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def _connection(self):
+        # One connection per thread and process; sqlite3 connections can't cross either
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT record FROM cache_entries WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, record, ttl):
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO cache_entries (key, expires, record) VALUES (?, ?, ?)",
+                     (key, time.time() + ttl, pickle.dumps(record, pickle.HIGHEST_PROTOCOL)))
+        self._writes += 1
+        if self._writes % SQLITE_PURGE_EVERY == 0:
+            self.purge()
+
+    def purge(self):
+        """Deletes expired entries, then the soonest-expiring ones beyond max_entries."""
+        conn = self._connection()
+        conn.execute("DELETE FROM cache_entries WHERE expires <= ?", (time.time(),))
+        excess = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute("DELETE FROM cache_entries WHERE key IN "
+                         "(SELECT key FROM cache_entries ORDER BY expires LIMIT ?)", (excess,))
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def tag_versions(self, tags):
+        if not tags:
+            return []
+        rows = self._connection().execute(
+            f"SELECT tag, version FROM cache_tags WHERE tag IN ({','.join('?' * len(tags))})", tuple(tags))
+        versions = dict(rows.fetchall())
+        return [versions.get(tag, 0) for tag in tags]
+
+    def bump_tags(self, tags):
+        conn = self._connection()
+        for tag in tags:
+            conn.execute("INSERT INTO cache_tags (tag, version) VALUES (?, 1) "
+                         "ON CONFLICT (tag) DO UPDATE SET version = version + 1", (tag,))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entries")
+
+    def size(self):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE expires > ?", (time.time(),)).fetchone()[0]
+
+
+class RedisBackend:
+    """Entries and tag versions as Redis keys, expired by Redis itself."""
+
+    name = 'redis'
+
+    def __init__(self, client, prefix=DEFAULT_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, prefix=DEFAULT_PREFIX):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL is a redis:// URL but the 'redis' package is not installed.")
+        return cls(redis.Redis.from_url(url), prefix)
+
+    def _tag_key(self, tag):
+        return f"{self.prefix}:tag:{tag}"
+
+    def get(self, key):
+        blob = self.client.get(key)
+        return pickle.loads(blob) if blob is not None else None
+
+    def set(self, key, record, ttl):
+        self.client.set(key, pickle.dumps(record, pickle.HIGHEST_PROTOCOL), px=max(int(ttl * 1000), 1))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def tag_versions(self, tags):
+        if not tags:
+            return []
+        return [int(value) if value is not None else 0
+                for value in self.client.mget([self._tag_key(tag) for tag in tags])]
+
+    def bump_tags(self, tags):
+        for tag in tags:
+            self.client.incr(self._tag_key(tag))
+
+    def clear(self):
+        keys = [key for key in self.client.scan_iter(match=f"{self.prefix}:*")
+                if not _as_text(key).startswith(f"{self.prefix}:tag:")]
+        if keys:
+            self.client.delete(*keys)
+
+    def size(self):
+        return sum(1 for key in self.client.scan_iter(match=f"{self.prefix}:*")
+                   if not _as_text(key).startswith(f"{self.prefix}:tag:"))
+
+
+def _as_text(key):
+    return key.decode('utf-8') if isinstance(key, bytes) else key
+
+
+class FakeRedis:
+    """
+    The subset of the redis-py client the Redis backend uses, in process.
+    Values come back as bytes, as they do from a real server.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}  # key -> (expires_at or None, bytes)
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, name):
+        with self._lock:
+            entry = self._live(name, time.time())
+            return entry[1] if entry else None
+
+    def mget(self, names):
+        with self._lock:
+            now = time.time()
+            return [entry[1] if entry else None for entry in (self._live(name, now) for name in names)]
+
+    def set(self, name, value, px=None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        with self._lock:
+            self._data[name] = (time.time() + px / 1000 if px else None, value)
+        return True
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            entry = self._live(name, time.time())
+            value = int(entry[1]) + amount if entry else amount
+            self._data[name] = (entry[0] if entry else None, str(value).encode('ascii'))
+            return value
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._data.pop(name, None) is not None)
+
+    def scan_iter(self, match='*'):
+        with self._lock:
+            now = time.time()
+            keys = [key for key in list(self._data) if self._live(key, now) and fnmatch.fnmatchcase(key, match)]
+        return iter(keys)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+
+
+def backend_from_url(url, prefix=DEFAULT_PREFIX, max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    Creates the backend a CACHE_URL names.
+
+    Args:
+        url (str): memory://, sqlite:///<path>, redis://... or fakeredis://
+        prefix (str): Prefix of every Redis key.
+        max_entries (int): Capacity of the memory backend.
+    """
+    if not url or url.startswith('memory://'):
+        return MemoryBackend(max_entries)
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    if url.startswith('fakeredis://'):
+        return RedisBackend(FakeRedis(), prefix)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend.from_url(url, prefix)
+    raise ValueError(f"Unsupported CACHE_URL '{url}'.")
+
+
+# -------------------------
+# The cache
+# -------------------------
+class CacheNamespace:
+    """The keys of one blueprint or feature. Get one from `cache.namespace(name)`."""
+
+    def __init__(self, cache, name):
+        self.cache = cache
+        self.name = name
+        self.tag = NAMESPACE_TAG.format(name)
+
+    def _key(self, key):
+        return f"{self.cache.prefix}:{self.name}:{_key_text(key)}"
+
+    def get(self, key, default=None):
+        """Returns the cached value, or `default` if it is missing, expired or stale."""
+        value, _ = self.cache._lookup(self, self._key(key))
+        return default if value is MISSING else value
+
+    def set(self, key, value, ttl=None, tags=(), versions=None):
+        """
+        Stores a value.
+
+        Args:
+            key: A string, or a tuple of parts.
+            value: Anything picklable.
+            ttl (float): Seconds to keep it (default CACHE_DEFAULT_TTL), before jitter.
+            tags (iterable): Tags to invalidate it by.
+            versions (dict): Tag versions read before the value was built (see
+                `Cache.tag_version`). An invalidation since then makes the entry
+                stale on arrival instead of caching an outdated value.
+        """
+        self.cache._store(self, self._key(key), value, ttl, tags, versions)
+
+    def delete(self, key):
+        self.cache._call('delete', self._key(key))
+
+    def get_or_set(self, key, builder, ttl=None, tags=(), cache_if=None):
+        """
+        Returns the cached value, or builds, stores and returns it. Concurrent
+        misses in this process build it once.
+
+        Args:
+            builder (callable): Called with no arguments on a miss.
+            cache_if (callable): Called with the built value; store it only if true.
+        """
+        full_key = self._key(key)
+        value, _ = self.cache._lookup(self, full_key)
+        if value is not MISSING:
+            return value
+        with self.cache.single_flight(full_key):
+            value, versions = self.cache._lookup(self, full_key, count=False, tags=tags)
+            if value is not MISSING:
+                return value  # Built by the thread we waited for
+            with self.cache.fill_context():
+                value = builder()
+            if cache_if is None or cache_if(value):
+                self.cache._store(self, full_key, value, ttl, tags, versions)
+            return value
+
+    def single_flight(self, key):
+        """Holds the per-key lock of `get_or_set`, for callers that build with their own logic."""
+        return self.cache.single_flight(self._key(key))
+
+    def clear(self):
+        """Makes every entry of the namespace stale."""
+        self.cache.invalidate_tags(self.tag)
+
+
+class Cache:
+    """The application cache: a backend plus namespaces, tags and stats."""
+
+    def __init__(self, backend=None, prefix=DEFAULT_PREFIX, default_ttl=DEFAULT_TTL, jitter=DEFAULT_JITTER):
+        self.backend = backend or MemoryBackend()
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        self.jitter = jitter
+        self.fill_context = nullcontext  # Entered around get_or_set builders
+        self.logger = logging.getLogger(__name__)
+        self._namespaces = {}
+        self._flights_lock = threading.Lock()
+        self._flights = {}  # full key -> [lock, waiters]
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Locks held by other threads at fork time would never be released in the child
+        self._flights_lock = threading.Lock()
+        self._flights = {}
+        if hasattr(self.backend, 'after_fork'):
+            self.backend.after_fork()
+
+    def init_app(self, app):
+        """Configures the backend from CACHE_URL. Called from create_app."""
+        self.prefix = app.config.get('CACHE_KEY_PREFIX', DEFAULT_PREFIX)
+        self.backend = backend_from_url(app.config.get('CACHE_URL', DEFAULT_URL), self.prefix,
+                                        app.config.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', DEFAULT_TTL)
+        self.jitter = app.config.get('CACHE_TTL_JITTER', DEFAULT_JITTER)
+        self.logger = app.logger
+        app.extensions['cache'] = self
+        workers = os.environ.get('WEB_CONCURRENCY', '')
+        if not self.shared and workers.isdigit() and int(workers) > 1:
+            app.logger.warning(f"[CACHE] CACHE_URL is memory:// with WEB_CONCURRENCY={workers}: each worker "
+                               f"only sees its own invalidations until entries expire. Use a sqlite:/// "
+                               f"or redis:// CACHE_URL to share them.")
+
+    @property
+    def shared(self):
+        """True if every worker sees the same entries and invalidations."""
+        return self.backend.name != 'memory'
+
+    def namespace(self, name):
+        ns = self._namespaces.get(name)
+        if ns is None:
+            ns = self._namespaces.setdefault(name, CacheNamespace(self, name))
+        return ns
+
+    # --- Tags ----------------------------------------------------------------
+    def tag_version(self, tag):
+        """The current version of a tag (0 if never invalidated, or on a backend error)."""
+        versions = self._call('tag_versions', [tag])
+        return versions[0] if versions else 0
+
+    def invalidate_tags(self, *tags):
+        """Makes every entry carrying any of the tags stale, in every namespace."""
+        if not tags:
+            return
+        for tag in tags:
+            INVALIDATIONS.inc((tag.split(':', 1)[0],))
+        self._call('bump_tags', list(tags))
+
+    # --- Plumbing ------------------------------------------------------------
+    def _call(self, method, *args):
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            self.logger.warning(f"[CACHE] {self.backend.name} backend {method} failed: {e}")
+            return None
+
+    def _lookup(self, ns, full_key, count=True, tags=()):
+        """
+        Returns (value or MISSING, tag versions). On a miss the versions of the
+        namespace tag and `tags` are read first, for a following `_store`.
+        """
+        try:
+            record = self.backend.get(full_key)
+            if record is not None:
+                entry_tags, entry_versions, value = record
+                if self.backend.tag_versions(list(entry_tags)) == list(entry_versions):
+                    if count:
+                        REQUESTS.inc((ns.name, 'hit'))
+                    return value, None
+                if count:
+                    REQUESTS.inc((ns.name, 'stale'))
+            elif count:
+                REQUESTS.inc((ns.name, 'miss'))
+            all_tags = (ns.tag,) + tuple(tags)
+            return MISSING, dict(zip(all_tags, self.backend.tag_versions(list(all_tags))))
+        except Exception as e:
+            REQUESTS.inc((ns.name, 'error'))
+            self.logger.warning(f"[CACHE] {self.backend.name} lookup of '{full_key}' failed: {e}")
+            return MISSING, None
+
+    def _store(self, ns, full_key, value, ttl, tags, versions):
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        if self.jitter:
+            ttl *= 1 - self.jitter * random.random()
+        entry_tags = (ns.tag,) + tuple(tags)
+        versions = versions or {}
+        try:
+            unknown = [tag for tag in entry_tags if tag not in versions]
+            if unknown:
+                versions = {**versions, **dict(zip(unknown, self.backend.tag_versions(unknown)))}
+            record = (entry_tags, tuple(versions[tag] for tag in entry_tags), value)
+            self.backend.set(full_key, record, ttl)
+        except Exception as e:
+            REQUESTS.inc((ns.name, 'error'))
+            self.logger.warning(f"[CACHE] {self.backend.name} write of '{full_key}' failed: {e}")
+
+    @contextmanager
+    def single_flight(self, full_key):
+        with self._flights_lock:
+            flight = self._flights.get(full_key)
+            if flight is None:
+                flight = self._flights[full_key] = [threading.Lock(), 0]
+            flight[1] += 1
+        try:
+            with flight[0]:
+                yield
+        finally:
+            with self._flights_lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    self._flights.pop(full_key, None)
+
+    # --- Maintenance ---------------------------------------------------------
+    def clear(self):
+        """Deletes every entry (tag versions are kept)."""
+        self._call('clear')
+
+    def size(self):
+        return self._call('size')
+
+    def stats(self, values=None):
+        """
+        Lookups per namespace.
+
+        Args:
+            values (dict): Collected metric values; defaults to this process's registry.
+
+        Returns:
+            dict: {namespace: {'hit': n, 'miss': n, 'stale': n, 'error': n, 'hit_rate': float or None}}
+        """
+        values = registry.collect() if values is None else values
+        stats = {}
+        for (name, labels), count in values.items():
+            if name == REQUESTS.name:
+                namespace, result = labels
+                stats.setdefault(namespace, {'hit': 0, 'miss': 0, 'stale': 0, 'error': 0})[result] += count
+        for row in stats.values():
+            lookups = row['hit'] + row['miss'] + row['stale'] + row['error']
+            row['hit_rate'] = row['hit'] / lookups if lookups else None
+        return stats
+
+
+cache = Cache()
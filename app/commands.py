@@ -219,9 +219,317 @@ def seed_from_toml():
         click.echo("No charities found in the seed data.")  
         
         
+@click.command(name='media:resume-pending')
+@with_appcontext
+def resume_pending_media():
+    """
+    Settles uploads left in the pending state (e.g. after a restart killed the
+    image worker pool). Run it while no web worker is encoding images.
+    """
+    from .dol_media.media_utils import resume_pending_images
+    updated = resume_pending_images()
+    click.secho(f"Settled {updated} pending image(s).", fg='green')
+
+
+@click.command(name='media:build-variants')
+@with_appcontext
+@click.option("--workers", default=None, type=int, help="Worker processes (defaults to the CPU count).")
+@click.option("--force", is_flag=True, help="Rebuild variants even if their manifest is up to date.")
+def build_media_variants(workers, force):
+    """
+    Backfills responsive variants for existing discourse images and charity logos.
+    Example: flask media:build-variants --workers 4
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from .dol_media.media_utils import build_variants, list_variant_sources
+
+    sources = list_variant_sources()
+    click.echo(f"Building variants for {len(sources)} image(s)...")
+    built = skipped = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(build_variants, path, force): path for path in sources}
+        for future in as_completed(futures):
+            try:
+                if future.result():
+                    built += 1
+                else:
+                    skipped += 1
+            except Exception as e:
+                failed += 1
+                click.secho(f"  Failed: {futures[future]}: {e}", fg='red')
+    click.secho(f"Done: {built} built, {skipped} up to date, {failed} failed.", fg='green' if not failed else 'yellow')
+
+
+@click.command(name='media:gc')
+@with_appcontext
+@click.option("--grace-hours", default=24, type=int, help="Keep unreferenced files at least this long.")
+@click.option("--dry-run", is_flag=True, help="Only list what would be deleted.")
+@click.option("--legacy", is_flag=True, help="Also sweep unreferenced name-addressed discourse images.")
+def collect_media_garbage(grace_hours, dry_run, legacy):
+    """
+    Deletes media-store blobs that no row references any more, and spooled
+    uploads that were never saved.
+    Example: flask media:gc --grace-hours 48 --dry-run
+    """
+    from datetime import timedelta
+    from .dol_media.media_utils import collect_orphan_blobs, collect_legacy_orphans, collect_stale_spools
+
+    grace = timedelta(hours=grace_hours)
+    verb = "Would delete" if dry_run else "Deleted"
+    removed = collect_orphan_blobs(grace, dry_run=dry_run)
+    for digest in removed:
+        click.echo(f"  {digest}")
+    click.secho(f"{verb} {len(removed)} orphaned blob(s).", fg='green')
+
+    removed = collect_stale_spools(grace, dry_run=dry_run)
+    for name in removed:
+        click.echo(f"  {name}")
+    click.secho(f"{verb} {len(removed)} abandoned upload(s) from the spool.", fg='green')
+
+    if legacy:
+        removed = collect_legacy_orphans(grace, dry_run=dry_run)
+        for filename in removed:
+            click.echo(f"  {filename}")
+        click.secho(f"{verb} {len(removed)} legacy discourse image(s).", fg='green')
+
+
+@click.command(name='discourse:backfill-text')
+@with_appcontext
+@click.option("--batch-size", default=200, type=int, help="Discourses processed per transaction.")
+@click.option("--all", "refresh_all", is_flag=True, help="Recompute every discourse, not only those missing text.")
+def backfill_discourse_text(batch_size, refresh_all):
+    """
+    Fills the plaintext columns (body_text, excerpt, word_count, reading_time)
+    for discourses saved before they existed.
+    Example: flask discourse:backfill-text --batch-size 500
+    """
+    from .dol_db.models import DiscourseBlog
+    from .dol_discourse.disc_text import extract_body_fields
+
+    updated, last_id = 0, 0
+    while True:
+        query = db.session.query(DiscourseBlog.id, DiscourseBlog.body).filter(DiscourseBlog.id > last_id)
+        if not refresh_all:
+            query = query.filter(DiscourseBlog.body_text.is_(None))
+        rows = query.order_by(DiscourseBlog.id).limit(batch_size).all()
+        if not rows:
+            break
+        # Plain dict updates skip loading full objects and their relationships
+        db.session.bulk_update_mappings(DiscourseBlog, [
+            dict(id=discourse_id, **extract_body_fields(body)) for discourse_id, body in rows
+        ])
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+        click.echo(f"  ...{updated} discourse(s) processed")
+    click.secho(f"Backfilled plaintext for {updated} discourse(s).", fg='green')
+
+
+@click.command(name='discourse:rebuild-related')
+@with_appcontext
+def rebuild_related_discourses():
+    """
+    Rebuilds the related-discourse TF-IDF index from scratch, correcting the
+    drift that incremental updates accumulate. Run it after backfill-text.
+    """
+    from .dol_discourse.disc_related import recommendations_enabled, rebuild_related_index
+    if not recommendations_enabled():
+        click.secho("NumPy and SciPy are required for related-discourse recommendations.", fg='red')
+        return
+    indexed = rebuild_related_index()
+    click.secho(f"Indexed {indexed} approved discourse(s).", fg='green')
+
+
+@click.command(name='http:summary')
+@with_appcontext
+@click.option("--last", default=1000, type=int, help="Only the most recent N logged calls.")
+@click.option("--host", default=None, help="Only calls to this host.")
+@click.option("--tail", default=0, type=int, help="Also list the N most recent calls.")
+def summarize_http_calls(last, host, tail):
+    """
+    Summarizes recent outbound HTTP calls (safe_fetch, USCCB) from the call log:
+    latency percentiles, bytes, outcomes and cache hit rate per host.
+    Example: flask http:summary --last 500 --tail 20
+    """
+    from flask import current_app
+    from .dol_metrics.http_metrics import read_call_log, summarize_calls
+
+    log_path = current_app.config.get('HTTP_CALL_LOG')
+    if not log_path:
+        click.secho("HTTP_CALL_LOG is not set; no calls are being logged.", fg='red')
+        return
+    records = read_call_log(log_path, last=last)
+    if host:
+        records = [r for r in records if r.get('host') == host]
+    if not records:
+        click.echo(f"No calls logged in {log_path}.")
+        return
+
+    click.echo(f"{len(records)} call(s) from {records[0]['time']} to {records[-1]['time']}\n")
+    for row in summarize_calls(records):
+        hit_rate = '-' if row['cache_hit_rate'] is None else f"{row['cache_hit_rate']:.0%}"
+        outcomes = ', '.join(f"{kind}={n}" for kind, n in row['outcomes'].most_common()) or '-'
+        if row['calls']:
+            timing = f"p50 {row['p50_ms']} / p95 {row['p95_ms']} / p99 {row['p99_ms']} / max {row['max_ms']} ms"
+        else:
+            timing = "no calls made"
+        click.echo(f"{row['client']:<10} {row['host']}")
+        click.echo(f"    {row['calls']} call(s), {timing}")
+        click.echo(f"    {row['bytes']} bytes, cache hit rate {hit_rate}, outcomes: {outcomes}")
+
+    if tail:
+        click.echo("\nMost recent calls:")
+        for r in records[-tail:]:
+            took = 'cache hit' if r.get('ms') is None else f"{r['ms']} ms"
+            click.echo(f"  {r['time']} {r['method']} {r['host']}{r['path']} -> {r.get('status') or '-'} "
+                       f"{r.get('outcome')} ({took}, {r.get('bytes') or 0} B)")
+
+
+@click.command(name='profile-route')
+@with_appcontext
+@click.argument("path")
+@click.option("--n", "repeat", default=50, type=int, help="How many times to request the route while profiling.")
+@click.option("--format", "fmt", default='speedscope', type=click.Choice(['speedscope', 'collapsed', 'pstats']),
+              help="speedscope JSON or collapsed stacks (sampled), or a cProfile report.")
+@click.option("--out", default=None, help="Output file (default: instance/profiles/<route>.<ext>).")
+@click.option("--user", "user_email", default=None, help="Request the route logged in as this user.")
+@click.option("--interval-ms", default=1.0, type=float, help="Sampling interval of the stack sampler.")
+def profile_route(path, repeat, fmt, out, user_email, interval_ms):
+    """
+    Profiles a route by requesting it N times through the test client.
+    Example: flask profile-route /discourse/dialogues --n 200 --format collapsed
+    """
+    import os
+    import time
+    from flask import current_app
+    from .dol_db.models import User
+    from .dol_metrics.profiling import RouteProfiler
+
+    client = current_app.test_client()
+    if user_email:
+        user = User.query.filter_by(email=user_email).first()
+        if user is None:
+            click.secho(f"No user with email '{user_email}'.", fg='red')
+            return
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+            sess['_fresh'] = True
+
+    # One untimed request so first-use imports and caches don't dominate the profile
+    status = client.get(path).status_code
+    if status >= 400:
+        click.secho(f"Warning: GET {path} returned {status}.", fg='yellow')
+
+    profiler = RouteProfiler(fmt, interval_ms)
+    started = time.perf_counter()
+    profiler.start()
+    try:
+        for _ in range(repeat):
+            client.get(path)
+    finally:
+        profiler.stop()
+    elapsed = time.perf_counter() - started
+
+    body, _, extension = profiler.render(f"GET {path} x{repeat}")
+    if not out:
+        slug = path.strip('/').replace('/', '_') or 'index'
+        out = os.path.join(current_app.instance_path, 'profiles', f"{slug}.{extension}")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        f.write(body)
+
+    click.echo(f"{repeat} request(s) in {elapsed:.2f}s ({elapsed / max(repeat, 1) * 1000:.1f} ms each)")
+    click.secho(f"Profile written to {out}", fg='green')
+
+
+@click.command(name='db:replica-status')
+@with_appcontext
+def replica_status():
+    """
+    Checks every read replica once and shows its lag and whether reads may use it.
+    Example: flask db:replica-status
+    """
+    from flask import current_app
+
+    router = current_app.extensions.get('db_router')
+    if router is None:
+        click.echo("No read replicas configured (DATABASE_REPLICA_URLS); all queries use the primary.")
+        return
+    router.check()
+    click.echo(f"Max lag {router.max_lag}s, checked every {router.check_interval}s")
+    for replica in router.replicas:
+        url = replica.engine.url.render_as_string(hide_password=True)
+        if replica.healthy:
+            click.secho(f"  {replica.name} ({url}): in rotation, {replica.lag:.1f}s behind", fg='green')
+        else:
+            reason = replica.error or f"{replica.lag:.1f}s behind"
+            click.secho(f"  {replica.name} ({url}): skipped, {reason}", fg='red')
+
+
+@click.command(name='cache:clear')
+@with_appcontext
+@click.option("--namespace", "namespaces", multiple=True, help="Only this namespace (repeatable), e.g. bible.")
+@click.option("--tag", "tags", multiple=True, help="Only entries carrying this tag (repeatable), e.g. discourse:42.")
+def clear_cache(namespaces, tags):
+    """
+    Empties the application cache, or makes one namespace's or tag's entries stale.
+    With the default memory:// backend this only affects this process.
+    Example: flask cache:clear --namespace bible
+    """
+    from .cache import cache
+
+    if not namespaces and not tags:
+        cache.clear()
+        click.secho(f"Cleared the {cache.backend.name} cache.", fg='green')
+        return
+    for namespace in namespaces:
+        cache.namespace(namespace).clear()
+    if tags:
+        cache.invalidate_tags(*tags)
+    click.secho(f"Invalidated {len(namespaces)} namespace(s) and {len(tags)} tag(s).", fg='green')
+
+
+@click.command(name='cache:stats')
+@with_appcontext
+def cache_stats():
+    """
+    Shows the cache backend, its size and the hits and misses per namespace.
+    Hit counts are aggregated across workers when METRICS_MULTIPROC_DIR is set;
+    otherwise scrape /metrics (cache_requests_total) of the running server.
+    Example: flask cache:stats
+    """
+    from flask import current_app
+    from .cache import cache
+    from .dol_metrics.metrics_utils import MultiprocessStore
+
+    size = cache.size()
+    click.echo(f"Backend: {current_app.config.get('CACHE_URL')} ({'unknown' if size is None else size} entries)")
+    directory = current_app.config.get('METRICS_MULTIPROC_DIR')
+    if not directory:
+        click.echo("METRICS_MULTIPROC_DIR is not set; per-worker hit counts are only at /metrics.")
+        return
+    stats = cache.stats(MultiprocessStore(directory).collect(fresh=False))
+    if not stats:
+        click.echo("No cache lookups recorded yet.")
+    for namespace, row in sorted(stats.items()):
+        hit_rate = '-' if row['hit_rate'] is None else f"{row['hit_rate']:.0%}"
+        click.echo(f"  {namespace:<12} hit rate {hit_rate:>5}  hits {row['hit']}  misses {row['miss']}  "
+                   f"stale {row['stale']}  errors {row['error']}")
+
+
 def init_app(app):
     """Register CLI commands with the Flask app."""
     app.cli.add_command(seed_db_command)
     app.cli.add_command(fetch_calendar)
     app.cli.add_command(seed_charity_categories)
-    app.cli.add_command(seed_from_toml)
\ No newline at end of file
+    app.cli.add_command(seed_from_toml)
+    app.cli.add_command(resume_pending_media)
+    app.cli.add_command(build_media_variants)
+    app.cli.add_command(collect_media_garbage)
+    app.cli.add_command(backfill_discourse_text)
+    app.cli.add_command(rebuild_related_discourses)
+    app.cli.add_command(summarize_http_calls)
+    app.cli.add_command(profile_route)
+    app.cli.add_command(replica_status)
+    app.cli.add_command(clear_cache)
+    app.cli.add_command(cache_stats)
\ No newline at end of file
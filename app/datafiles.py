@@ -0,0 +1,130 @@
+# /project_folder/app/datafiles.py
+
+"""
+Shared loader for the data files in `static/data` (daily.json, topics.json,
+currencies.json, Jesus_speaks.csv, ...).
+
+Each file is parsed once per process and kept in memory. Its modification
+time is re-checked at most every DATAFILE_RECHECK_SECONDS (default 5), and
+the file is re-parsed only when that changes. Parsed data is returned as
+immutable views (FrozenDict for objects, tuples for arrays and CSV rows), so
+the same object can be shared by every request without being copied.
+
+Usage:
+    daily = load_data_json('daily.json')
+    topics = load_data_json('topics.json', default=())
+    quotes = load_data_csv('Jesus_speaks.csv')
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+
+from flask import current_app
+
+DEFAULT_RECHECK_SECONDS = 5
+
+_lock = threading.Lock()
+_entries = {}  # path -> (checked_at, mtime, value)
+
+
+class FrozenDict(dict):
+    """A dict that refuses modification. Templates and `tojson` treat it as a plain dict."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Data-file contents are read-only.")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze(value):
+    """Recursively converts dicts to FrozenDict and lists to tuples."""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def data_path(filename):
+    return os.path.join(current_app.root_path, 'static', 'data', filename)
+
+
+def _parse_json(f):
+    return freeze(json.load(f))
+
+
+def _parse_csv(f):
+    # Keys and values are stripped, as the spreadsheet exports carry stray spaces
+    return tuple(
+        FrozenDict((k.strip(), (v or '').strip()) for k, v in row.items() if k is not None)
+        for row in csv.DictReader(f)
+    )
+
+
+def _load(filename, parser, default):
+    path = data_path(filename)
+    now = time.monotonic()
+    interval = current_app.config.get('DATAFILE_RECHECK_SECONDS', DEFAULT_RECHECK_SECONDS)
+
+    with _lock:
+        entry = _entries.get(path)
+    if entry is not None and now - entry[0] < interval:
+        return entry[2]
+
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    if entry is not None and entry[1] == mtime:
+        with _lock:
+            _entries[path] = (now, mtime, entry[2])
+        return entry[2]
+
+    value = freeze(default)
+    if mtime is None:
+        current_app.logger.warning(f"Data file not found: {path}")
+    else:
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                value = parser(f)
+        except (OSError, ValueError, csv.Error) as e:
+            # json.JSONDecodeError and UnicodeDecodeError are ValueErrors
+            current_app.logger.error(f"Could not load or parse data file {path}: {e}")
+    # Failures are cached too, so a broken file is reported once per change
+    with _lock:
+        _entries[path] = (now, mtime, value)
+    return value
+
+
+def load_data_json(filename, default=None):
+    """
+    Returns the parsed contents of a JSON file in static/data.
+
+    Args:
+        filename (str): The file name, e.g. 'daily.json'.
+        default: Returned (frozen) when the file is missing or invalid. Defaults to {}.
+
+    Returns:
+        FrozenDict | tuple: The immutable parsed data.
+    """
+    return _load(filename, _parse_json, {} if default is None else default)
+
+
+def load_data_csv(filename, default=()):
+    """
+    Returns the rows of a CSV file (with a header row) in static/data.
+
+    Returns:
+        tuple: One FrozenDict per row, keys and values stripped.
+    """
+    return _load(filename, _parse_csv, default)
@@ -3,6 +3,7 @@ import os
 from flask import Blueprint, jsonify, current_app, g, render_template,request
 from datetime import datetime
 from config import config
+from app.cache import cache
 from .bible_utils import get_bible_db, parse_query, fetch_from_db
 
 bible_bp = Blueprint('bible', __name__,
@@ -29,6 +30,10 @@ def bible_home():
 # A simple mapping for full translation names
 TRANSLATION_NAMES = config.GLOBAL_CONFIG.get('bible_translations', {})
 
+# The translation databases are read-only; after replacing one, run `flask cache:clear --namespace bible`
+BIBLE_CACHE_TTL = 24 * 60 * 60
+_bible = cache.namespace('bible')
+
 
 
 @bible_bp.teardown_app_request
@@ -70,9 +75,17 @@ def get_metadata(version):
     """
     Returns the book list, chapter counts, and book order for a version.
     """
+    metadata = _bible.get_or_set(('metadata', version), lambda: _build_metadata(version),
+                                 ttl=BIBLE_CACHE_TTL, cache_if=lambda value: value is not None)
+    if metadata is None:
+        return jsonify({"error": f"Translation '{version}' not found."}), 404
+    return jsonify(metadata)
+
+
+def _build_metadata(version):
     conn = get_bible_db(version)
     if conn is None:
-        return jsonify({"error": f"Translation '{version}' not found."}), 404
+        return None
 
     cursor = conn.cursor()
     
@@ -94,12 +107,10 @@ def get_metadata(version):
     cursor.execute(query) # The query string now has the correct table names
     rows = cursor.fetchall()
     
-    metadata = {
+    return {
         'books': {row['name']: row['chapter_count'] for row in rows},
         'bookOrder': [row['name'] for row in rows]
     }
-    
-    return jsonify(metadata)
 
 @bible_bp.route('/api/intelligent_search')
 def intelligent_search():
@@ -112,6 +123,12 @@ def intelligent_search():
     if not query:
         return jsonify({"error": "A search query is required."}), 400
 
+    # Repeated lookups (the same passage, the same phrase) are served from the cache
+    cache_key = ('search', version, query)
+    cached = _bible.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
     # 1. Parse the user's query into a structured object
     search_obj = parse_query(query)
 
@@ -144,4 +161,5 @@ def intelligent_search():
     else:
         response_data['reference'] = f'Text search for "{query}"'
 
+    _bible.set(cache_key, response_data, ttl=BIBLE_CACHE_TTL)
     return jsonify(response_data)
\ No newline at end of file
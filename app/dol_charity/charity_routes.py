@@ -1,18 +1,16 @@
 # /project_folder/app/dol_charity/charity_routes.py
 
-import json
 import os
-from os import path
 from flask import Blueprint, render_template, current_app, request,flash, redirect, url_for, jsonify
 from flask_login import login_required
 from app.dol_db.models import Charity, CharityCategoryDef, CharityCategory,db
 from flask_paginate import Pagination, get_page_parameter
 from sqlalchemy import or_
-import uuid # For generating unique filenames
 from werkzeug.utils import secure_filename
-from PIL import Image # For image dimension validation
+from app.dol_media.media_utils import spool_blob, dispatch_image
+from app.datafiles import load_data_json
 
-from app.dol_charity.charity_utils import search_charities
+from app.dol_charity.charity_utils import search_charities, cached_listing, get_active_categories
 
 charity_bp = Blueprint(
     'charity_bp',
@@ -22,17 +20,6 @@ charity_bp = Blueprint(
     static_folder='static'
 )
 
-def load_app_json(filename):
-    """Helper to load a JSON file from the main application's static/data directory."""
-    filepath = path.join(current_app.static_folder, 'data', filename)
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            current_app.logger.info(f"Loading JSON data from {filepath}")
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        current_app.logger.error(f"FATAL: Could not load or parse required config file: {filepath}")
-        return {}
-
 @charity_bp.route('/home')
 @login_required
 def charity_home():
@@ -46,18 +33,10 @@ def charity_home():
     # Use the abstracted search function to get results and pagination
     charities_for_page, pagination = search_charities(search_query, active_filter, page)
 
-    # Get all unique, active categories for the filter pills
-    active_categories = (
-        CharityCategoryDef.query
-        .join(CharityCategoryDef.charities)
-        .filter(Charity.is_vetted == True)
-        .distinct()
-        .order_by(CharityCategoryDef.name)
-        .all()
-    )
+    # Get all unique, active categories for the filter pills (the template reads category.name)
+    active_categories = [{'name': category} for category in get_active_categories()]
     
-    currency_data = load_app_json('currencies.json')
-    current_app.logger.info(f"[CHARITY] Loaded {len(currency_data)} currency entries.")
+    currency_data = load_data_json('currencies.json')
 
     return render_template(
         'charity.html', 
@@ -72,28 +51,30 @@ def charity_home():
 @charity_bp.route('/api/search')
 @login_required
 def api_search_charities():
-    """API endpoint for live charity search, returns HTML partials."""
+    """API endpoint for live charity search, returns HTML partials (cached per query, filter and page)."""
     
     page = request.args.get(get_page_parameter(), type=int, default=1)
     search_query = request.args.get('search', type=str, default='').strip()
     active_filter = request.args.get('filter', type=str, default='all').strip()
-    
-    charities_for_page, pagination = search_charities(search_query, active_filter, page)
-    
-    # Render just the list of charity cards and the pagination controls as HTML snippets
-    charity_list_html = render_template(
-        '_charity_list.html', 
-        charities=charities_for_page
-    )
-    pagination_html = render_template(
-        '_pagination.html',
-        pagination=pagination
-    )
-    
-    return jsonify({
-        'charity_list_html': charity_list_html,
-        'pagination_html': pagination_html
-    })
+
+    def render_results():
+        charities_for_page, pagination = search_charities(search_query, active_filter, page)
+
+        # Render just the list of charity cards and the pagination controls as HTML snippets
+        charity_list_html = render_template(
+            '_charity_list.html', 
+            charities=charities_for_page
+        )
+        pagination_html = render_template(
+            '_pagination.html',
+            pagination=pagination
+        )
+        return {
+            'charity_list_html': charity_list_html,
+            'pagination_html': pagination_html
+        }
+
+    return jsonify(cached_listing(('search', search_query, active_filter, page), render_results))
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
 MAX_IMAGE_SIZE_MB = 2
@@ -128,7 +109,7 @@ def register_charity():
             return render_template('charity_registration.html', categories=all_categories)
 
         # --- 3. Handle File Upload ---
-        logo_filename_to_save = None # Use this variable to store the final filename for the DB
+        pending_logo = None # The spooled logo, encoded in the background once the row exists
         if 'logo_image' in request.files:
             logo_file = request.files['logo_image']
 
@@ -139,6 +120,8 @@ def register_charity():
 
                 # --- START OF MODIFIED UPLOAD & CONVERSION LOGIC ---
                 try:
+                    from PIL import Image  # Imported on first upload, not at startup
+
                     # Perform all validation on the file stream before saving
                     logo_file.seek(0, os.SEEK_END)
                     file_length = logo_file.tell()
@@ -147,26 +130,17 @@ def register_charity():
                         return render_template('charity_registration.html', categories=all_categories)
                     logo_file.seek(0)
 
-                    # Generate a unique base name (without extension)
-                    unique_basename = f"charity_{uuid.uuid4().hex}"
-                    
-                    # The final filename WILL be .webp
-                    logo_filename_to_save = f"{unique_basename}.webp"
-
-                    # Define the full save path
-                    upload_folder = os.path.join(current_app.static_folder, 'images', 'charity_logos')
-                    os.makedirs(upload_folder, exist_ok=True)
-                    save_path = os.path.join(upload_folder, logo_filename_to_save)
-
-                    # Open the uploaded file stream with Pillow
+                    # Open the uploaded file stream with Pillow. This only reads the
+                    # header, so the dimension check stays cheap.
                     with Image.open(logo_file) as img:
                         # Check dimensions BEFORE saving
                         if img.width > MAX_IMAGE_DIMENSION or img.height > MAX_IMAGE_DIMENSION:
                             flash(f'Image dimensions are too large (max {MAX_IMAGE_DIMENSION}x{MAX_IMAGE_DIMENSION}px).', 'danger')
                             return render_template('charity_registration.html', categories=all_categories)
-                        
-                        # Save the image, converting it to WebP format in the process
-                        img.save(save_path, 'webp', quality=85) # quality can be adjusted
+
+                    # Spool the raw upload; the WebP conversion happens in the background and
+                    # the logo is stored under the hash of its encoded bytes
+                    pending_logo = spool_blob(logo_file)
 
                 except Exception as e:
                     current_app.logger.error(f"Image processing/saving failed: {e}")
@@ -186,9 +160,9 @@ def register_charity():
                 is_vetted=False
             )
             
-            # Use the .webp filename if it was successfully created
-            if logo_filename_to_save:
-                new_charity.logo_image = logo_filename_to_save
+            # Point at the pending logo until the background worker has encoded it
+            if pending_logo:
+                new_charity.logo_image = pending_logo.token
             
             selected_categories = CharityCategoryDef.query.filter(CharityCategoryDef.id.in_(category_ids)).all()
             for cat in selected_categories:
@@ -196,6 +170,10 @@ def register_charity():
             
             db.session.add(new_charity)
             db.session.commit()
+
+            if pending_logo:
+                dispatch_image(pending_logo, Charity, new_charity.id, 'logo_image',
+                               fallback='default_charity.webp')
             
             flash('Thank you for your submission! Your charity will be reviewed shortly.', 'success')
             return redirect(url_for('charity_bp.charity_home'))
@@ -1,10 +1,15 @@
-import json
-from os import path
-from flask import current_app
 from app.dol_db.models import Charity, CharityCategory, CharityCategoryDef
-from sqlalchemy import or_
+from app.cache import cache
+from sqlalchemy import or_, event
+from sqlalchemy.orm import Session
 from flask_paginate import Pagination
 
+# Listings are cached (namespace `charity`, see app/cache.py) until a commit
+# writes a charity or a category; the TTL covers writes made outside the ORM.
+CHARITY_CACHE_TTL = 300
+CHARITY_TAG = 'charity'
+_charities = cache.namespace('charity')
+
 def search_charities(search_query, active_filter, page, per_page=9):
     """
     A comprehensive search and filter abstraction for charities.
@@ -56,12 +61,46 @@ def search_charities(search_query, active_filter, page, per_page=9):
 
     return charities_for_page, pagination
 
-def load_app_json(filename):
-    """Helper to load a JSON file from the main application's static/data directory."""
-    filepath = path.join(current_app.static_folder, 'data', filename)
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        current_app.logger.error(f"FATAL: Could not load or parse required config file: {filepath}")
-        return {}
\ No newline at end of file
+
+def cached_listing(key, builder):
+    """
+    Returns a cached charity listing (e.g. rendered search results), building it on a miss.
+
+    Args:
+        key (tuple): Identifies the listing, e.g. ('search', query, filter, page).
+        builder (callable): Builds it; the value must be picklable.
+    """
+    return _charities.get_or_set(key, builder, ttl=CHARITY_CACHE_TTL, tags=(CHARITY_TAG,))
+
+
+def get_active_categories():
+    """Returns the CharityCategory members with at least one vetted charity, by name."""
+    return cached_listing(('active_categories',), lambda: [
+        category.name for category in CharityCategoryDef.query
+        .join(CharityCategoryDef.charities)
+        .filter(Charity.is_vetted == True)
+        .distinct()
+        .order_by(CharityCategoryDef.name)
+    ])
+
+
+# -------------------------
+# Invalidation on commit
+# -------------------------
+@event.listens_for(Session, 'after_flush')
+def _note_charity_writes(session, flush_context):
+    # Category changes of a charity leave the charity itself in session.dirty
+    if any(isinstance(obj, (Charity, CharityCategoryDef))
+           for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['charities_dirty'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_charities(session):
+    if session.info.pop('charities_dirty', False):
+        cache.invalidate_tags(CHARITY_TAG)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_charity_writes(session):
+    session.info.pop('charities_dirty', None)
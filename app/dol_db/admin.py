@@ -3,6 +3,12 @@
 from flask_admin import Admin, AdminIndexView
 from flask_admin.contrib.sqla import ModelView
 from .models import db, User, Role, DiscourseBlog, DiscourseComment, Resource, Organisation, Liturgy, Reading
+from app.dol_discourse.disc_cache import bump_discourse_version
+from app.dol_discourse.disc_utils import refresh_comment_count
+from app.dol_discourse.disc_related import update_discourse_in_index, remove_discourse_from_index
+from app.dol_media.media_utils import release_blob
+from .loaders import loader_options
+from .user_cache import invalidate_user, clear_user_cache
 
 
 
@@ -11,21 +17,72 @@ class UserAdminView(ModelView):
     form_excluded_columns = ('password_hash',) # Don't show password hash in forms
     form_columns = ('name', 'other_names', 'email', 'is_active', 'is_authorized', 'roles')
 
+    # Role and activation changes must reach the cached login snapshot
+    def after_model_change(self, form, model, is_created):
+        invalidate_user(model.id)
+
+    def after_model_delete(self, model):
+        invalidate_user(model.id)
+
+class RoleAdminView(ModelView):
+    # Editing a role can change the roles of many users at once
+    def after_model_change(self, form, model, is_created):
+        clear_user_cache()
+
+    def after_model_delete(self, model):
+        clear_user_cache()
+
 class DiscourseBlogAdminView(ModelView):
     column_list = ('title', 'author', 'date_posted', 'is_approved')
     form_columns = ('title', 'author', 'body', 'is_approved', 'resources')
     # Allows editing resources directly within the discourse form
     inline_models = (Resource,) 
 
+    def get_query(self):
+        # The list view only needs the author; don't drag resources or bodies along
+        return super().get_query().options(*loader_options('discourse.admin'))
+
+    # Admin edits must invalidate the cached detail payload
+    def after_model_change(self, form, model, is_created):
+        bump_discourse_version(model.id)
+        update_discourse_in_index(model) # Also drops it if it was unapproved
+
+    def on_model_delete(self, model):
+        # Runs inside the delete's transaction; the blob file is left to `flask media:gc`
+        release_blob(model.featured_image)
+
+    def after_model_delete(self, model):
+        bump_discourse_version(model.id)
+        remove_discourse_from_index(model.id)
+
 class DiscourseCommentAdminView(ModelView):
     column_list = ('discourse', 'commenter', 'date_commented', 'is_audited')
     form_columns = ('discourse', 'commenter', 'body', 'is_audited', 'ip_address')
 
+    def on_model_change(self, form, model, is_created):
+        # The FK column still holds the old value until flush; remember it in
+        # case the comment is being moved to another discourse.
+        model._previous_discourse_id = None if is_created else model.discourse_id
+
+    def after_model_change(self, form, model, is_created):
+        refresh_comment_count(model.discourse_id)
+        bump_discourse_version(model.discourse_id)
+        if getattr(model, '_previous_discourse_id', None) != model.discourse_id:
+            refresh_comment_count(model._previous_discourse_id)
+            bump_discourse_version(model._previous_discourse_id)
+
+    def after_model_delete(self, model):
+        refresh_comment_count(model.discourse_id)
+        bump_discourse_version(model.discourse_id)
+
 class LiturgyAdminView(ModelView):
     column_list = ('name', 'type', 'date', 'theme')
     # Allows adding/editing readings directly within the liturgy form
     inline_models = (Reading,)
 
+    def get_query(self):
+        return super().get_query().options(*loader_options('liturgy.admin'))
+
 def setup_admin(app):
     # Pass a custom index_view to secure the admin panel
     # admin = Admin(app, name='Dialogues Admin', template_mode='bootstrap4', index_view=MyAdminIndexView())
@@ -35,7 +92,7 @@ def setup_admin(app):
     
     # Add views
     admin.add_view(UserAdminView(User, db.session))
-    admin.add_view(ModelView(Role, db.session))
+    admin.add_view(RoleAdminView(Role, db.session))
     admin.add_view(DiscourseBlogAdminView(DiscourseBlog, db.session))
     admin.add_view(DiscourseCommentAdminView(DiscourseComment, db.session))
     admin.add_view(ModelView(Organisation, db.session))
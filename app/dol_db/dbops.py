@@ -1,8 +1,9 @@
 # /project_folder/app/dbops.py
 
 from .models import db, User, Role, DiscourseBlog, DiscourseComment, Resource, RoleType
-from sqlalchemy.orm import joinedload
-from datetime import datetime
+from sqlalchemy.orm import selectinload
+from .loaders import loader_options
+from .snowflake import new_discourse_reference
 
 # --- User & Role Operations ---
 
@@ -41,10 +42,11 @@ def create_user(name, other_names, email, username, password, organization_name=
 def get_approved_discourses(page=1, per_page=10):
     """
     Gets paginated, approved discourses.
-    Uses joinedload to prevent N+1 queries for author and resources.
+    Uses the listing loader profile: author and category names in one query,
+    and no body columns since listings only need the excerpt.
     """
     return DiscourseBlog.query\
-        .options(joinedload(DiscourseBlog.author), joinedload(DiscourseBlog.resources))\
+        .options(*loader_options('discourse.listing'))\
         .filter_by(is_approved=True)\
         .order_by(DiscourseBlog.date_posted.desc())\
         .paginate(page=page, per_page=per_page, error_out=False)
@@ -52,12 +54,12 @@ def get_approved_discourses(page=1, per_page=10):
 def get_discourse_with_comments(discourse_id):
     """
     Gets a single discourse and eagerly loads its author, resources, and comments with their authors.
+    Collections are select-in loaded so the comments and resources don't multiply each other.
     """
     return DiscourseBlog.query\
         .options(
-            joinedload(DiscourseBlog.author),
-            joinedload(DiscourseBlog.resources),
-            joinedload(DiscourseBlog.comments).joinedload(DiscourseComment.commenter)
+            *loader_options('discourse.detail'),
+            selectinload(DiscourseBlog.comments).joinedload(DiscourseComment.commenter)
         )\
         .filter_by(id=discourse_id, is_approved=True)\
         .first_or_404()
@@ -72,7 +74,7 @@ def add_discourse(user_id, title, body_html, resources_data=[]):
         user_id=user_id,
         title=title,
         body=body_html,
-        reference=f"DISC-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        reference=new_discourse_reference()
     )
     
     for res_data in resources_data:
@@ -99,6 +101,7 @@ def add_comment_to_discourse(user_id, discourse_id, comment_body, ip_address=Non
         ip_address=ip_address
     )
     db.session.add(new_comment)
+    discourse.comment_count = DiscourseBlog.comment_count + 1
     db.session.commit()
     return new_comment
 
@@ -0,0 +1,94 @@
+# /project_folder/app/dol_db/engine.py
+
+"""
+SQLAlchemy engine options: connection pool sizing, stale-connection handling
+and driver timeouts, from the environment.
+
+    DB_POOL_SIZE         Persistent connections per engine and process (default 10).
+    DB_MAX_OVERFLOW      Extra connections opened under load, closed when returned (default 10).
+    DB_POOL_TIMEOUT      Seconds a request waits for a free connection before failing (default 10).
+    DB_POOL_RECYCLE      Replace connections older than this many seconds (default 280). Keep it
+                         below MySQL's wait_timeout and any proxy/load balancer idle timeout.
+    DB_POOL_PRE_PING     Test each connection on checkout and reconnect if it is dead (default 1).
+    DB_CONNECT_TIMEOUT   MySQL connect timeout in seconds (default 5).
+    DB_READ_TIMEOUT      MySQL read/write timeout in seconds (default: none).
+
+Each process holds up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections per
+engine. A threaded worker needs at most one per request thread, so size the
+pool to the thread count and keep workers x (size + overflow) under the
+server's max_connections. `benchmarks/pool_load.py` measures the effect of a
+given sizing.
+
+A pooled connection opened before a fork (e.g. by create_app under
+`gunicorn --preload`) would be one socket shared by every worker. Each
+engine passed to `dispose_pools_after_fork` therefore gets an empty pool in a
+forked child; the parent's connections are left open for the parent.
+"""
+
+import os
+import weakref
+
+from app.dol_metrics.pool_metrics import TimedQueuePool
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_POOL_TIMEOUT = 10
+DEFAULT_POOL_RECYCLE = 280
+DEFAULT_CONNECT_TIMEOUT = 5
+
+
+_fork_safe_engines = weakref.WeakSet()
+
+
+def _reset_pools():
+    for engine in list(_fork_safe_engines):
+        engine.dispose(close=False)  # Closing would close the parent's sockets too
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pools)
+
+
+def dispose_pools_after_fork(engines):
+    """Gives each engine an empty connection pool in every process forked from this one."""
+    _fork_safe_engines.update(engines)
+
+
+def _is_memory_sqlite(uri):
+    return uri.startswith('sqlite') and (uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri)
+
+
+def engine_options(uri, name='primary', environ=None):
+    """
+    Builds the engine options for one database.
+
+    Args:
+        uri (str): The database URI.
+        name (str): Label of the engine's pool in logs and metrics.
+        environ (dict): Defaults to os.environ.
+
+    Returns:
+        dict: Keyword arguments for create_engine (SQLALCHEMY_ENGINE_OPTIONS or a bind entry).
+    """
+    env = os.environ if environ is None else environ
+    options = {
+        'pool_pre_ping': env.get('DB_POOL_PRE_PING', '1') != '0',
+        'pool_logging_name': name,
+    }
+    if _is_memory_sqlite(uri):
+        return options  # A single shared connection; pool sizing does not apply
+
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=int(env.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE)),
+        max_overflow=int(env.get('DB_MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW)),
+        # Whole seconds: Flask-SQLAlchemy builds engines with engine_from_config, which int()s it
+        pool_timeout=int(env.get('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT)),
+        pool_recycle=int(env.get('DB_POOL_RECYCLE', DEFAULT_POOL_RECYCLE)),
+    )
+    if uri.startswith('mysql'):
+        connect_args = {'connect_timeout': int(env.get('DB_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT))}
+        if env.get('DB_READ_TIMEOUT'):
+            connect_args['read_timeout'] = connect_args['write_timeout'] = int(env['DB_READ_TIMEOUT'])
+        options['connect_args'] = connect_args
+    return options
@@ -0,0 +1,77 @@
+# /project_folder/app/dol_db/loaders.py
+
+"""
+Named loader-strategy profiles.
+
+Relationships are declared lazy in models.py; queries say explicitly what they
+need by applying one of the profiles below. Collections are loaded with
+`selectinload` (one extra `IN (...)` query) rather than joined, so a parent row
+is never multiplied by its children. Every profile ends in `raiseload('*')`:
+touching a relationship the profile did not ask for raises instead of quietly
+issuing one query per row. Set `LOADER_RAISELOAD = False` to fall back to
+ordinary lazy loading (e.g. while debugging a template).
+
+Because an unplanned relationship access is a 500, run
+`python benchmarks/query_budget.py` after changing a profile, template or
+serializer: it requests every endpoint and checks its status and SQL
+statement budget.
+
+Usage:
+    DiscourseBlog.query.options(*loader_options('discourse.listing'))
+"""
+
+from flask import current_app
+from sqlalchemy.orm import joinedload, selectinload, raiseload, defer, load_only
+
+from .models import DiscourseBlog, DiscourseComment, SubCategory, Liturgy
+
+
+LOADER_PROFILES = {
+    # Title cards: author and category names, never the body columns
+    'discourse.listing': (
+        joinedload(DiscourseBlog.author),
+        joinedload(DiscourseBlog.subcategory).joinedload(SubCategory.category),
+        defer(DiscourseBlog.body),
+        defer(DiscourseBlog.body_text),
+    ),
+    # A single discourse page or API payload; comments are paged separately
+    'discourse.detail': (
+        joinedload(DiscourseBlog.author),
+        joinedload(DiscourseBlog.subcategory).joinedload(SubCategory.category),
+        selectinload(DiscourseBlog.resources),
+        defer(DiscourseBlog.body_text),
+    ),
+    # Previous/next lookups only compare dates
+    'discourse.navigation': (
+        load_only(DiscourseBlog.id, DiscourseBlog.date_posted),
+    ),
+    # The flask-admin list view shows title, author, date and approval
+    'discourse.admin': (
+        joinedload(DiscourseBlog.author),
+        defer(DiscourseBlog.body),
+        defer(DiscourseBlog.body_text),
+    ),
+    'comment.page': (
+        joinedload(DiscourseComment.commenter),
+    ),
+    'liturgy.detail': (
+        selectinload(Liturgy.readings),
+    ),
+    'liturgy.admin': (),
+}
+
+
+def loader_options(profile):
+    """
+    Returns the loader options of a named profile, ready to pass to `.options()`.
+
+    Args:
+        profile (str): A key of `LOADER_PROFILES`.
+
+    Returns:
+        tuple: SQLAlchemy loader options.
+    """
+    options = LOADER_PROFILES[profile]
+    if current_app.config.get('LOADER_RAISELOAD', True):
+        options = options + (raiseload('*'),)
+    return options
@@ -6,8 +6,11 @@ from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from sqlalchemy.orm import validates
+from app.dol_discourse.disc_text import extract_body_fields
+from .routing import RoutingSession
 
-db = SQLAlchemy()
+# Reads may be served by a replica (see routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # --- Enums for controlled vocabulary ---
 class RoleType(enum.Enum):
@@ -128,6 +131,9 @@ class User(db.Model, UserMixin):
     def has_role(self, role_name):
         return any(role.name.value == role_name for role in self.roles)
 
+    def has_any_role(self, *role_names):
+        return any(role.name.value in role_names for role in self.roles)
+
     @staticmethod
     def find_by_email(email):
         return User.query.filter_by(email=email).first()
@@ -167,17 +173,42 @@ class DiscourseBlog(db.Model):
     date_posted = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     is_approved = db.Column(db.Boolean, default=False, nullable=False)
     featured_image = db.Column(db.String(255), nullable=True)
+    # Denormalized counter, kept in step with the comments table on every write
+    comment_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Plaintext derived from `body` whenever it is set (see validate_body below)
+    body_text = db.Column(db.Text, nullable=True)
+    excerpt = db.Column(db.String(300), nullable=True)
+    word_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    reading_time = db.Column(db.Integer, default=0, server_default='0', nullable=False) # Minutes
 
     author = db.relationship('User', back_populates='discourses')
-    resources = db.relationship('Resource', back_populates='discourse', lazy='joined', cascade="all, delete-orphan")
+    resources = db.relationship('Resource', back_populates='discourse', cascade="all, delete-orphan") # Eager-load via loaders.py profiles
     comments = db.relationship('DiscourseComment', back_populates='discourse', cascade="all, delete-orphan")
     
     subcategory = db.relationship('SubCategory', back_populates='discourses')
 
+    @validates('body')
+    def validate_body(self, key, value):
+        # Keep the search/listing columns in step with the editor HTML
+        for field, derived in extract_body_fields(value).items():
+            setattr(self, field, derived)
+        return value
+
     def __repr__(self):
         return f'<DiscourseBlog {self.title}>'
 
 
+class DiscourseViewCount(db.Model):
+    """Views of a discourse within one hour, written in batches by disc_views.py."""
+    __tablename__ = 'discourse_view_counts'
+    discourse_id = db.Column(db.Integer, db.ForeignKey('discourse_blogs.id', ondelete='CASCADE'), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True, index=True) # Start of the hour (UTC)
+    views = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DiscourseViewCount {self.discourse_id} @ {self.bucket}: {self.views}>'
+
+
 class DiscourseComment(db.Model):
     __tablename__ = 'discourse_comments'
     id = db.Column(db.Integer, primary_key=True)
@@ -189,6 +220,11 @@ class DiscourseComment(db.Model):
     ip_address = db.Column(db.String(45)) # For audit trail
     commenter = db.relationship('User', back_populates='comments')
     discourse = db.relationship('DiscourseBlog', back_populates='comments')
+
+    # Supports keyset pagination of a discourse's comments on (date_commented, id)
+    __table_args__ = (
+        db.Index('ix_discourse_comments_keyset', 'discourse_id', 'date_commented', 'id'),
+    )
     
     @validates('body')
     def validate_body(self, key, value):
@@ -239,7 +275,7 @@ class Liturgy(db.Model):
 
     body = db.Column(db.Text) 
 
-    readings = db.relationship('Reading', back_populates='liturgy', lazy='joined', cascade="all, delete-orphan")
+    readings = db.relationship('Reading', back_populates='liturgy', cascade="all, delete-orphan") # Eager-load via loaders.py profiles
 
     def __repr__(self):
         return f'<Liturgy {self.name} on {self.date}>'
@@ -336,4 +372,39 @@ class Charity(db.Model):
         }
 
     def __repr__(self):
-        return f'<Charity {self.name}>'
\ No newline at end of file
+        return f'<Charity {self.name}>'
+
+class MediaBlob(db.Model):
+    """A content-addressed upload in the media store, shared by every row that references it."""
+    __tablename__ = 'media_blobs'
+    digest = db.Column(db.String(64), primary_key=True) # SHA-256 of the encoded bytes
+    extension = db.Column(db.String(10), nullable=False, default='webp')
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    date_created = db.Column(db.DateTime, default=datetime.utcnow)
+    # Last time a reference was dropped; zero-ref blobs are collected after a grace period
+    date_released = db.Column(db.DateTime, nullable=True, index=True)
+
+    def __repr__(self):
+        return f'<MediaBlob {self.digest[:12]} refs={self.ref_count}>'
+
+
+class ReplicaHeartbeat(db.Model):
+    """A single row rewritten on the primary; its copy on a replica shows how far behind that replica is (routing.py)."""
+    __tablename__ = 'replica_heartbeat'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    beat_ms = db.Column(db.BigInteger, nullable=False) # Unix time in milliseconds, as written on the primary
+
+    def __repr__(self):
+        return f'<ReplicaHeartbeat {self.beat_ms}>'
+
+
+class SnowflakeWorkerLease(db.Model):
+    """A snowflake worker id held by one process until `expires_ms` (snowflake.py renews it)."""
+    __tablename__ = 'snowflake_worker_leases'
+    worker_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    owner = db.Column(db.String(255), nullable=False) # host:pid:nonce of the holder
+    expires_ms = db.Column(db.BigInteger, nullable=False) # Unix time in milliseconds
+
+    def __repr__(self):
+        return f'<SnowflakeWorkerLease {self.worker_id} {self.owner}>'
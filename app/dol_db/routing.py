@@ -0,0 +1,292 @@
+# /project_folder/app/dol_db/routing.py
+
+"""
+Read/write splitting between the primary database and read replicas.
+
+`db.session` is a `RoutingSession`. With DATABASE_REPLICA_URLS set, each
+statement is routed as follows:
+
+- writes (flushes, INSERT/UPDATE/DELETE) and `SELECT ... FOR UPDATE` go to
+  the primary, and so does everything outside a request (CLI commands,
+  background threads) and any raw `text()` statement;
+- plain SELECTs in GET/HEAD/OPTIONS requests go to a healthy replica, round
+  robin, unless:
+    * the request has already written (it must read its own writes),
+    * the visitor wrote within the last DATABASE_STICKY_SECONDS (kept in
+      their session cookie, so it holds across workers),
+    * the view asked for the primary with `use_primary()`,
+    * no replica is healthy.
+
+Whatever is stored in a cache is read from the primary: a value built from a
+lagging replica would be stored under the tag version of the write it
+missed and then served, stale, to everyone, the writer included. Builders of
+`get_or_set` run under `use_primary()` (`init_db_routing` installs it as
+`cache.fill_context`), and so do the views and the snapshot that fill their
+caches by hand.
+
+Replica health: a monitor thread in each worker compares the heartbeat row
+(`replica_heartbeat`) on the primary with each replica's copy every
+DATABASE_REPLICA_CHECK_INTERVAL seconds, then writes a fresh heartbeat. A
+replica whose copy is more than DATABASE_REPLICA_MAX_LAG seconds behind,
+that can't be read, or that has not been checked recently is skipped until
+it catches up. Lag is only resolved to about one check interval.
+
+The heartbeat row is written when routing is set up, so a replica cloned
+from the primary carries one from the start.
+
+Trying it locally with two SQLite files:
+    DATABASE_URL=sqlite:////tmp/primary.db
+    DATABASE_REPLICA_URLS=sqlite:////tmp/replica.db
+Create the schema on the primary and start the app, whose monitor keeps the
+heartbeat fresh; then copy primary.db to replica.db to "replicate". Reads go
+to replica_1 until the copy's heartbeat is DATABASE_REPLICA_MAX_LAG behind
+the primary's, then return to the primary; copy again to bring it back.
+`flask db:replica-status` shows the state (and writes a heartbeat itself).
+benchmarks/replica_routing.py runs through these steps.
+"""
+
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request, session as http_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import select, update, insert
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.selectable import Select
+
+from app.dol_metrics.metrics_utils import registry
+from .engine import engine_options
+
+REPLICA_BIND_PREFIX = 'replica_'
+SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+STICKY_SESSION_KEY = '_db_primary_until'
+HEARTBEAT_ID = 1
+
+DEFAULT_MAX_LAG = 5           # seconds
+DEFAULT_CHECK_INTERVAL = 2    # seconds
+DEFAULT_STICKY_SECONDS = 10
+
+ROUTED_READS = registry.counter(
+    'db_routed_reads_total', 'SELECTs routed by the read/write splitter, by target database.', ('target',))
+
+
+def replica_binds(urls):
+    """
+    Returns the SQLALCHEMY_BINDS entries for the replica URIs. Binds don't
+    inherit SQLALCHEMY_ENGINE_OPTIONS, so each carries its own pool options.
+
+    Args:
+        urls (list): Replica database URIs.
+    """
+    binds = {}
+    for i, url in enumerate(urls, 1):
+        key = f"{REPLICA_BIND_PREFIX}{i}"
+        binds[key] = {'url': url, **engine_options(url, key)}
+    return binds
+
+
+# -------------------------
+# Per-request routing state
+# -------------------------
+def _note_write():
+    if has_request_context():
+        g._db_wrote = True
+
+
+def _replica_allowed():
+    if not has_request_context() or request.method not in SAFE_METHODS:
+        return False
+    if g.get('_db_wrote') or g.get('_db_use_primary'):
+        return False
+    return http_session.get(STICKY_SESSION_KEY, 0) <= time.time()
+
+
+@contextmanager
+def use_primary():
+    """
+    Sends every read in the block (or decorated view) to the primary.
+    Outside a request reads go to the primary anyway, so it does nothing there.
+
+    Usage:
+        @bp.route('/checkout')
+        @use_primary()
+        def checkout(): ...
+    """
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('_db_use_primary', False)
+    g._db_use_primary = True
+    try:
+        yield
+    finally:
+        g._db_use_primary = previous
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy's session, with plain reads routed to replicas when allowed."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None:
+            return engine
+        if self._flushing or isinstance(clause, UpdateBase):
+            _note_write()
+            return engine
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            return engine
+
+        router = current_app.extensions.get('db_router')
+        if router is None or engine is not router.primary:
+            return engine  # No replicas, or a model with its own bind
+        if not _replica_allowed():
+            ROUTED_READS.inc(('primary',))
+            return engine
+        replica = router.pick()
+        ROUTED_READS.inc((replica.name if replica else 'primary',))
+        return replica.engine if replica else engine
+
+
+# -------------------------
+# Replica health
+# -------------------------
+class Replica:
+    __slots__ = ('name', 'engine', 'lag', 'healthy', 'checked_at', 'error')
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.lag = None          # Seconds behind the primary at the last check
+        self.healthy = False
+        self.checked_at = 0.0    # time.monotonic() of the last check
+        self.error = None
+
+
+class ReplicaRouter:
+    """Tracks the replicas of one app and picks one for each routed read."""
+
+    def __init__(self, app, primary, replicas, max_lag=DEFAULT_MAX_LAG, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.app = app
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stop = threading.Event()
+
+    def pick(self):
+        """Returns the next healthy replica (round robin), or None to use the primary."""
+        if self._pid != os.getpid():
+            self._start_monitor()
+        deadline = time.monotonic() - 3 * self.check_interval
+        healthy = [r for r in self.replicas if r.healthy and r.checked_at >= deadline]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def _start_monitor(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()  # Once per (possibly forked) worker process
+            self._stop.clear()
+            thread = threading.Thread(target=self._run, name='replica-monitor', daemon=True)
+            thread.start()
+
+    def _run(self):
+        while True:
+            self.check()
+            if self._stop.wait(self.check_interval):
+                return
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self):
+        """Measures every replica's lag once, then writes a new heartbeat to the primary."""
+        from .models import ReplicaHeartbeat
+        table = ReplicaHeartbeat.__table__
+        query = select(table.c.beat_ms).where(table.c.id == HEARTBEAT_ID)
+
+        try:
+            with self.primary.connect() as conn:
+                primary_beat = conn.execute(query).scalar()
+        except Exception as e:
+            self.app.logger.warning(f"[DB] Could not read the primary heartbeat: {e}")
+            primary_beat = None
+
+        for replica in self.replicas:
+            was_healthy = replica.healthy
+            try:
+                with replica.engine.connect() as conn:
+                    replica_beat = conn.execute(query).scalar()
+                if primary_beat is None or replica_beat is None:
+                    replica.lag, replica.error = None, 'no heartbeat to compare'
+                else:
+                    replica.lag, replica.error = max(primary_beat - replica_beat, 0) / 1000, None
+            except Exception as e:
+                replica.lag, replica.error = None, str(e)
+            replica.healthy = replica.lag is not None and replica.lag <= self.max_lag
+            replica.checked_at = time.monotonic()
+            if was_healthy and not replica.healthy:
+                self.app.logger.warning(
+                    f"[DB] Replica {replica.name} taken out of rotation: "
+                    f"{replica.error or f'{replica.lag:.1f}s behind the primary'}"
+                )
+            elif replica.healthy and not was_healthy:
+                self.app.logger.info(f"[DB] Replica {replica.name} in rotation ({replica.lag:.1f}s behind)")
+
+        self.beat()
+
+    def beat(self):
+        """Writes a fresh heartbeat to the primary, creating the row the first time."""
+        from .models import ReplicaHeartbeat
+        table = ReplicaHeartbeat.__table__
+        now_ms = int(time.time() * 1000)
+        try:
+            with self.primary.begin() as conn:
+                written = conn.execute(update(table).where(table.c.id == HEARTBEAT_ID).values(beat_ms=now_ms))
+                if written.rowcount == 0:
+                    conn.execute(insert(table).values(id=HEARTBEAT_ID, beat_ms=now_ms))
+        except Exception as e:
+            self.app.logger.warning(f"[DB] Could not write the replica heartbeat: {e}")
+
+
+def init_db_routing(app, db):
+    """
+    Sets up replica routing when DATABASE_REPLICA_URLS is configured.
+    Called from create_app, after db.init_app.
+    """
+    urls = app.config.get('DATABASE_REPLICA_URLS')
+    if not urls:
+        return None
+    with app.app_context():
+        engines = db.engines
+        replicas = [Replica(key, engines[key]) for key in replica_binds(urls)]
+        router = ReplicaRouter(
+            app, engines[None], replicas,
+            max_lag=app.config.get('DATABASE_REPLICA_MAX_LAG', DEFAULT_MAX_LAG),
+            check_interval=app.config.get('DATABASE_REPLICA_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL),
+        )
+    app.extensions['db_router'] = router
+    # Cached values outlive the request; never build one from a lagging replica
+    from app.cache import cache
+    cache.fill_context = use_primary
+    # Seed the heartbeat row, so replicas cloned from here on have one to compare
+    router.beat()
+    router.primary.dispose()  # Don't keep a connection checked out by create_app (see dol_db/engine.py)
+    sticky_seconds = app.config.get('DATABASE_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+
+    @app.after_request
+    def remember_write(response):
+        # Read-your-writes: this visitor's next requests read from the primary for a while
+        if g.get('_db_wrote'):
+            http_session[STICKY_SESSION_KEY] = time.time() + sticky_seconds
+        return response
+
+    return router
@@ -0,0 +1,299 @@
+# /project_folder/app/dol_db/snowflake.py
+
+"""
+Snowflake-style unique IDs, generated in-process without a database round trip.
+
+Layout of the 63-bit integer (most significant first):
+
+    41 bits  milliseconds since EPOCH_MS   (~69 years)
+    10 bits  worker id                     (0-1023)
+    12 bits  per-millisecond sequence      (4096 IDs/ms per worker)
+
+IDs from one worker are strictly increasing; IDs from different workers never
+collide as long as their worker ids differ, and all IDs sort by creation time
+(to the millisecond).
+
+SNOWFLAKE_WORKER_ID (config or environment) chooses where the worker id comes
+from:
+
+    <0-1023>  An explicit id. Every process must be given a distinct one.
+    lease     (default) Each process leases a free id from the
+              `snowflake_worker_leases` table and a heartbeat thread renews it.
+              A process that could not renew for a whole lease stops issuing
+              IDs under that id and leases a new one; if no id can be leased,
+              ID generation fails rather than guessing.
+    hash      Derived from the host name and process id. Two processes can
+              collide, so `init_snowflake` refuses it outside debug/testing.
+
+References are formatted zero-padded, so string order equals numeric order
+and `DiscourseBlog.reference` can serve as a keyset pagination key. (The
+older timestamp-based references predate this and do not share that order.)
+"""
+
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+
+from flask import current_app, has_app_context
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, SnowflakeWorkerLease
+
+EPOCH_MS = 1577836800000  # 2020-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+REFERENCE_DIGITS = 19  # 2**63 - 1 has 19 digits
+DEFAULT_LEASE_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+class SnowflakeGenerator:
+    """Generates monotonic 63-bit IDs for one worker."""
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"Worker id must be between 0 and {MAX_WORKER_ID}.")
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self):
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            if now_ms < self._last_ms:
+                # The clock stepped backwards: keep issuing from the last timestamp
+                now_ms = self._last_ms
+            if now_ms == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # 4096 IDs this millisecond already; borrow the next one
+                    now_ms = self._last_ms + 1
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            return ((now_ms - EPOCH_MS) << (WORKER_BITS + SEQUENCE_BITS)) \
+                | (self.worker_id << SEQUENCE_BITS) \
+                | self._sequence
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+class WorkerLease:
+    """
+    A worker id leased from `snowflake_worker_leases` for this process.
+
+    A daemon thread renews the lease every third of its length. Once the lease
+    has run out locally (renewals failed, or another process took the id),
+    `valid` is False and the caller must lease a new id before issuing more.
+    """
+
+    def __init__(self, engine, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.engine = engine
+        self.lease_ms = int(lease_seconds * 1000)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[-255:]
+        self.pid = os.getpid()
+        self.worker_id = None
+        self._expires_ms = 0
+        self._stop = threading.Event()
+
+    @property
+    def valid(self):
+        return self.worker_id is not None and _now_ms() < self._expires_ms
+
+    def acquire(self, attempts=5):
+        """
+        Claims an expired lease, or else the lowest id never leased.
+
+        Returns:
+            int: The leased worker id.
+
+        Raises:
+            RuntimeError: Every id is held by a live lease, or other processes
+                kept winning the race for the free ones.
+        """
+        table = SnowflakeWorkerLease.__table__
+        for _ in range(attempts):
+            now_ms = _now_ms()
+            expires_ms = now_ms + self.lease_ms
+            with self.engine.connect() as conn:
+                leases = dict(conn.execute(select(table.c.worker_id, table.c.expires_ms)).all())
+            expired = [worker_id for worker_id, expires in leases.items() if expires < now_ms]
+            try:
+                with self.engine.begin() as conn:
+                    if expired:
+                        # Guarded on expiry, so only one of several racing processes gets it
+                        claimed = min(expired, key=leases.get)
+                        taken = conn.execute(
+                            update(table)
+                            .where(table.c.worker_id == claimed, table.c.expires_ms < now_ms)
+                            .values(owner=self.owner, expires_ms=expires_ms)
+                        ).rowcount
+                    else:
+                        claimed = next((i for i in range(MAX_WORKER_ID + 1) if i not in leases), None)
+                        if claimed is None:
+                            raise RuntimeError(f"All {MAX_WORKER_ID + 1} snowflake worker ids are leased.")
+                        conn.execute(insert(table).values(worker_id=claimed, owner=self.owner, expires_ms=expires_ms))
+                        taken = 1
+            except IntegrityError:
+                taken = 0  # Another process inserted the same id first
+            if taken:
+                self.worker_id, self._expires_ms = claimed, expires_ms
+                threading.Thread(target=self._run, name='snowflake-lease', daemon=True).start()
+                logger.info(f"[SNOWFLAKE] Leased worker id {claimed} as {self.owner}")
+                return claimed
+        raise RuntimeError("Could not lease a snowflake worker id: other processes kept taking the free ones.")
+
+    def renew(self):
+        """Extends the lease; returns False if this process no longer holds it."""
+        table = SnowflakeWorkerLease.__table__
+        expires_ms = _now_ms() + self.lease_ms
+        with self.engine.begin() as conn:
+            renewed = conn.execute(
+                update(table)
+                .where(table.c.worker_id == self.worker_id, table.c.owner == self.owner)
+                .values(expires_ms=expires_ms)
+            ).rowcount
+        self._expires_ms = expires_ms if renewed else 0
+        return bool(renewed)
+
+    def release(self):
+        """Stops renewing and marks the id free for the next process."""
+        self._stop.set()
+        if self.worker_id is None or self.pid != os.getpid():
+            return  # Never release a lease inherited from the parent of a fork
+        table = SnowflakeWorkerLease.__table__
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(table)
+                .where(table.c.worker_id == self.worker_id, table.c.owner == self.owner)
+                .values(expires_ms=0)
+            )
+        self.worker_id, self._expires_ms = None, 0
+
+    def _run(self):
+        while not self._stop.wait(self.lease_ms / 3000):
+            try:
+                if not self.renew():
+                    logger.error(f"[SNOWFLAKE] Lost the lease on worker id {self.worker_id}")
+                    return
+            except Exception as e:
+                logger.warning(f"[SNOWFLAKE] Could not renew the lease on worker id {self.worker_id}: {e}")
+
+
+def _setting(name, default=None):
+    value = current_app.config.get(name) if has_app_context() else None
+    return value if value is not None else os.environ.get(name, default)
+
+
+def worker_id_strategy(value):
+    """
+    Parses SNOWFLAKE_WORKER_ID.
+
+    Returns:
+        int | str: An explicit worker id, or 'lease' / 'hash'.
+
+    Raises:
+        ValueError: The value is neither a valid id nor a known strategy.
+    """
+    if value is None or str(value).strip() in ('', 'lease'):
+        return 'lease'
+    if str(value).strip() == 'hash':
+        return 'hash'
+    try:
+        worker_id = int(value)
+    except ValueError:
+        raise ValueError(f"SNOWFLAKE_WORKER_ID must be 0-{MAX_WORKER_ID}, 'lease' or 'hash', not {value!r}.")
+    if not 0 <= worker_id <= MAX_WORKER_ID:
+        raise ValueError(f"SNOWFLAKE_WORKER_ID must be between 0 and {MAX_WORKER_ID}.")
+    return worker_id
+
+
+def hashed_worker_id():
+    """A worker id derived from host and pid. Can collide; debug/testing only."""
+    return (zlib.crc32(socket.gethostname().encode('utf-8')) ^ os.getpid()) & MAX_WORKER_ID
+
+
+def init_snowflake(app):
+    """
+    Validates SNOWFLAKE_WORKER_ID at startup, so a setting that could hand two
+    processes the same worker id stops the app instead of duplicating IDs.
+    """
+    strategy = worker_id_strategy(app.config.get('SNOWFLAKE_WORKER_ID'))
+    if strategy == 'hash' and not (app.debug or app.testing):
+        raise RuntimeError(
+            "SNOWFLAKE_WORKER_ID=hash can give two processes the same worker id; "
+            "set a distinct explicit id per process, or use 'lease', outside debug/testing."
+        )
+
+
+_generator = None
+_generator_pid = None
+_generator_lock = threading.Lock()
+_lease = None
+
+
+def _worker_id():
+    """Resolves this process's worker id, leasing one if configured to."""
+    global _lease
+    strategy = worker_id_strategy(_setting('SNOWFLAKE_WORKER_ID'))
+    if strategy == 'hash':
+        return hashed_worker_id()
+    if isinstance(strategy, int):
+        return strategy
+    if not has_app_context():
+        raise RuntimeError("Leasing a snowflake worker id needs an app context; set SNOWFLAKE_WORKER_ID explicitly.")
+    if _lease is not None:
+        try:
+            _lease.release()
+        except Exception as e:
+            logger.warning(f"[SNOWFLAKE] Could not release worker id {_lease.worker_id}: {e}")
+    _lease = WorkerLease(db.engine, float(_setting('SNOWFLAKE_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)))
+    return _lease.acquire()
+
+
+def _needs_worker_id():
+    return _generator_pid != os.getpid() or (_lease is not None and not _lease.valid)
+
+
+def next_id():
+    """Returns the next unique ID for this process."""
+    global _generator, _generator_pid
+    if _needs_worker_id():
+        with _generator_lock:
+            # Forked workers must not share the parent's worker id, and an
+            # expired lease may already belong to another process
+            if _needs_worker_id():
+                _generator = SnowflakeGenerator(_worker_id())
+                _generator_pid = os.getpid()
+    return _generator.next_id()
+
+
+@atexit.register
+def _release_lease():
+    if _lease is not None:
+        try:
+            _lease.release()
+        except Exception:
+            pass  # The lease simply expires
+
+
+def id_timestamp(snowflake_id):
+    """Returns the creation time of an ID in seconds since the Unix epoch."""
+    return ((snowflake_id >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH_MS) / 1000
+
+
+def new_discourse_reference():
+    """A unique, time-sortable discourse reference, e.g. DISC-0371245882736377856."""
+    return f"DISC-{next_id():0{REFERENCE_DIGITS}d}"
@@ -0,0 +1,131 @@
+# /project_folder/app/dol_db/user_cache.py
+
+"""
+Cache behind the Flask-Login user loader.
+
+Loading `User` costs two queries (the row, then its roles via the
+`lazy='subquery'` relationship) on every authenticated request. Instead the
+loader returns a `UserSnapshot`: an immutable copy of the columns templates
+and views read from `current_user`, with the roles folded into a bitmask so
+`has_role` is a single AND.
+
+Snapshots are kept in the application cache (namespace `users`, see
+app/cache.py) for USER_CACHE_TTL seconds, and turn stale as soon as the user
+is written through the app: profile updates, admin edits (including role
+changes) and logout. With a shared cache backend (sqlite://, redis://) that
+holds for every worker; with the default in-process one, other workers pick
+the change up when their entry expires, so keep the TTL short.
+
+Code that needs to modify a user must load the model (`db.session.get(User,
+current_user.id)`), then call `invalidate_user` once committed.
+"""
+
+from flask_login import UserMixin
+from sqlalchemy import select
+
+from app.cache import cache
+from .models import db, User, Role, RoleType, user_roles
+
+DEFAULT_TTL = 30
+
+# Bit per role, in RoleType declaration order
+ROLE_BITS = {role.value: 1 << i for i, role in enumerate(RoleType)}
+
+SNAPSHOT_FIELDS = (
+    'id', 'username', 'email', 'name', 'other_names', 'organization_name', 'website',
+    'education', 'contact', 'career', 'profile_picture', 'is_active', 'is_authorized', 'date_created',
+)
+
+_users = cache.namespace('users')
+
+
+def role_mask(role_names):
+    """Folds role names ('Admin', ...) into a bitmask of ROLE_BITS."""
+    mask = 0
+    for role_name in role_names:
+        mask |= ROLE_BITS.get(role_name, 0)
+    return mask
+
+
+class UserSnapshot(UserMixin):
+    """A read-only stand-in for `User` as `current_user`."""
+
+    __slots__ = SNAPSHOT_FIELDS + ('role_mask',)
+
+    def __init__(self, values, mask):
+        for field in SNAPSHOT_FIELDS:
+            object.__setattr__(self, field, values[field])
+        object.__setattr__(self, 'role_mask', mask)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"UserSnapshot is read-only; load the User model to change '{name}'.")
+
+    def __reduce__(self):
+        # Shared cache backends pickle it; rebuild through __init__, not __setattr__
+        return UserSnapshot, ({field: getattr(self, field) for field in SNAPSHOT_FIELDS}, self.role_mask)
+
+    def has_role(self, role_name):
+        return bool(self.role_mask & ROLE_BITS.get(role_name, 0))
+
+    def has_any_role(self, *role_names):
+        return bool(self.role_mask & role_mask(role_names))
+
+    def __eq__(self, other):
+        return isinstance(other, (UserSnapshot, User)) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.id} {self.email}>'
+
+
+def _query_snapshot(user_id):
+    """
+    Loads the columns and role names in one statement. Plain rows, not the
+    model: a User already in the identity map may have been loaded with
+    raiseload options by the view.
+    """
+    columns = [getattr(User, field) for field in SNAPSHOT_FIELDS]
+    rows = db.session.execute(
+        select(*columns, Role.name)
+        .outerjoin(user_roles, user_roles.c.user_id == User.id)
+        .outerjoin(Role, Role.id == user_roles.c.role_id)
+        .where(User.id == user_id)
+    ).all()
+    if not rows:
+        return None
+    values = dict(zip(SNAPSHOT_FIELDS, rows[0]))
+    return UserSnapshot(values, role_mask(row[-1].value for row in rows if row[-1] is not None))
+
+
+def _user_tag(user_id):
+    return f"user:{user_id}"
+
+
+def load_cached_user(user_id, ttl=DEFAULT_TTL):
+    """
+    Returns the snapshot of a user, from the cache while it is fresh.
+
+    Args:
+        user_id (int): The id stored in the session.
+        ttl (int): Seconds an entry may be served (0 disables the cache).
+
+    Returns:
+        UserSnapshot: Or None if there is no such user.
+    """
+    if ttl <= 0:
+        return _query_snapshot(user_id)
+    # A load that raced an invalidation is stored stale (see CacheNamespace.set)
+    return _users.get_or_set(user_id, lambda: _query_snapshot(user_id), ttl=ttl, tags=(_user_tag(user_id),),
+                             cache_if=lambda snapshot: snapshot is not None)
+
+
+def invalidate_user(user_id):
+    """Drops a user's cached snapshot, e.g. after a profile update or role change."""
+    cache.invalidate_tags(_user_tag(user_id))
+
+
+def clear_user_cache():
+    """Drops every cached snapshot, e.g. after a role itself was edited."""
+    _users.clear()
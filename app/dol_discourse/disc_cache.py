@@ -0,0 +1,113 @@
+# /project_folder/app/dol_discourse/disc_cache.py
+
+"""
+Versioned response cache for the discourse detail API.
+
+Each discourse has a version stamp that is bumped whenever the discourse,
+its comments or its resources are written. The serialized payload for
+`/discourse/api/get/<id>` is stored as pre-encoded JSON bytes together with
+its ETag, so a cache hit never touches the database or the JSON encoder.
+
+Both live in the application cache (namespace `discourse`, see app/cache.py):
+the version stamp is the version of the tag `discourse:<id>`, so a bump makes
+the payload stale at once, in every worker when the cache backend is shared.
+
+With the default `memory://` backend each worker has its own tags, so an edit
+handled by one worker is invisible to the others: they keep serving (and
+answering 304 for) their old payload. Payloads are therefore kept for at most
+SNAPSHOT_MAX_AGE seconds under that backend, the same staleness bound as the
+sidebar snapshot, instead of PAYLOAD_TTL.
+
+Pages of the navigation content index (`/discourse/api/index`) are cached the
+same way, keyed on the global snapshot version (see app/snapshot.py), which is
+bumped whenever a discourse's title, subcategory, approval or date changes.
+"""
+
+import hashlib
+import json
+
+from flask import current_app
+
+from app.cache import cache
+from app.snapshot import DEFAULT_MAX_AGE
+
+PAYLOAD_TTL = 24 * 60 * 60  # With a shared backend payloads are invalidated exactly; the TTL only bounds memory
+
+_discourses = cache.namespace('discourse')
+
+
+def _tag(discourse_id):
+    return f"discourse:{discourse_id}"
+
+
+def get_discourse_version(discourse_id):
+    """Returns the current version stamp of a discourse."""
+    return cache.tag_version(_tag(discourse_id))
+
+
+def bump_discourse_version(discourse_id):
+    """
+    Marks a discourse as changed. Any payload built from an older version is
+    stale immediately, so the next request rebuilds it.
+    """
+    if discourse_id is None:
+        return
+    cache.invalidate_tags(_tag(discourse_id))
+
+
+def _payload_ttl():
+    if cache.shared:
+        return PAYLOAD_TTL
+    # Other workers' invalidations never reach this one; bound how long it can lag
+    return min(PAYLOAD_TTL, current_app.config.get('SNAPSHOT_MAX_AGE', DEFAULT_MAX_AGE))
+
+
+def get_cached_payload(discourse_id):
+    """
+    Returns `(etag, body_bytes)` for a discourse if a payload for its current
+    version is cached, otherwise None.
+    """
+    return _discourses.get(('payload', discourse_id))
+
+
+def _encode(payload):
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha1(body).hexdigest(), body
+
+
+def store_payload(discourse_id, version, payload):
+    """
+    Encodes `payload` once and caches it against `version`.
+
+    `version` must be the stamp read *before* the payload was built: if the
+    discourse was bumped in the meantime the payload is stored already
+    stale, which keeps invalidation exact.
+
+    Returns:
+        tuple: (etag, body_bytes)
+    """
+    encoded = _encode(payload)
+    tag = _tag(discourse_id)
+    _discourses.set(('payload', discourse_id), encoded, ttl=_payload_ttl(), tags=(tag,), versions={tag: version})
+    return encoded
+
+
+def get_cached_index_page(key, version):
+    """
+    Returns `(etag, body_bytes)` for a content-index page built from `version`,
+    otherwise None.
+    """
+    return _discourses.get(('index', version) + tuple(key))
+
+
+def store_index_page(key, version, payload, max_age):
+    """
+    Encodes a content-index page once and caches it against `version` for
+    `max_age` seconds.
+
+    Returns:
+        tuple: (etag, body_bytes)
+    """
+    encoded = _encode(payload)
+    _discourses.set(('index', version) + tuple(key), encoded, ttl=max_age)
+    return encoded
@@ -0,0 +1,424 @@
+# /project_folder/app/dol_discourse/disc_related.py
+
+"""
+"Related discourses" recommendations from a TF-IDF index.
+
+The index covers approved discourses. It keeps a sparse term-count matrix
+(one row per discourse) plus the precomputed top-k neighbours of every
+discourse, so serving a recommendation is a dictionary lookup. It is saved
+as a single `.npz` file (RELATED_INDEX_PATH) and reloaded by other worker
+processes when the file changes.
+
+`update_discourse_in_index` queues a discourse after `save_discourse`,
+`update_discourse` or an admin edit commits; it never touches the index on
+the request path. A background thread per worker process applies the queued
+discourses every INDEX_UPDATE_DELAY seconds, in one pass and one save, from
+their committed rows. Document frequencies then drift a little from a full
+recount; `flask discourse:rebuild-related` rebuilds from scratch.
+
+Writers in every process serialize on a lock file next to the index
+(`<RELATED_INDEX_PATH>.lock`, flock) and always start from the latest file,
+so concurrent updates from different workers are not lost; the file is
+replaced atomically, so readers never see a partial one.
+
+NumPy and SciPy are optional: without them recommendations are simply empty.
+They are imported on first use rather than at startup, as they account for
+most of the app's import time.
+"""
+
+import atexit
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+from flask import current_app
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process
+    fcntl = None
+
+from app.dol_db.models import db, DiscourseBlog
+
+RELATED_TOP_K = 5
+SIMILARITY_BLOCK_ROWS = 256  # Rows scored at once during a full rebuild
+MIN_SIMILARITY = 0.05
+INDEX_UPDATE_DELAY = 2  # seconds; edits queued meanwhile share one pass and one save
+TOKEN_PATTERN = re.compile(r"[a-z][a-z']{2,}")
+STOPWORDS = frozenset("""
+    about above after again against all also and any are because been before being below between both
+    but can could did does doing down during each few for from further had has have having her here
+    hers herself him himself his how into its itself just more most not now off once only other our
+    ours ourselves out over own same she should some such than that the their theirs them themselves
+    then there these they this those through too under until very was were what when where which while
+    who whom why will with would you your yours yourself yourselves shall may might must upon unto
+""".split())
+
+_lock = threading.Lock()         # Guards _index and _loaded_version for readers
+_write_lock = threading.Lock()   # Writers in this process; the lock file covers other processes
+_index = None
+_loaded_version = None
+
+np = sparse = None  # Bound by recommendations_enabled() on first use
+_numeric_imported = False
+
+
+def recommendations_enabled():
+    """Imports NumPy and SciPy on the first call; False if either is missing."""
+    global np, sparse, _numeric_imported
+    if not _numeric_imported:
+        try:
+            import numpy
+            import scipy.sparse
+            np, sparse = numpy, scipy.sparse
+        except ImportError:  # Recommendations are disabled, everything else keeps working
+            pass
+        _numeric_imported = True
+    return np is not None
+
+
+def index_path():
+    return current_app.config.get('RELATED_INDEX_PATH') or \
+        os.path.join(current_app.instance_path, 'related_index.npz')
+
+
+def tokenize(text):
+    """Lower-cases text and returns its content words."""
+    return [t.strip("'") for t in TOKEN_PATTERN.findall((text or '').lower())
+            if t.strip("'") not in STOPWORDS]
+
+
+def document_text(title, body_text):
+    # The title is repeated so it weighs more than a single mention in the body
+    return f"{title} {title} {body_text or ''}"
+
+
+class RelatedIndex:
+    """Term counts, vocabulary and precomputed neighbours for the indexed discourses."""
+
+    def __init__(self, ids, titles, vocab, counts, neighbors):
+        self.ids = list(ids)                       # row -> discourse id
+        self.rows = {d: r for r, d in enumerate(self.ids)}
+        self.titles = dict(titles)                 # discourse id -> title
+        self.vocab = dict(vocab)                   # term -> column
+        self.counts = counts                       # csr_matrix (n_docs x n_terms)
+        self.neighbors = dict(neighbors)           # discourse id -> [(id, score), ...]
+
+    # --- TF-IDF -------------------------------------------------------------
+    def _weights(self):
+        """Sublinear-TF, smoothed-IDF, L2-normalized weights for every row."""
+        n_docs = max(len(self.ids), 1)
+        df = np.bincount(self.counts.indices, minlength=self.counts.shape[1])
+        idf = np.log((1 + n_docs) / (1 + df)) + 1.0
+        weights = self.counts.astype(np.float64)
+        weights.data = 1.0 + np.log(weights.data)
+        weights = weights.multiply(idf).tocsr()
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms) @ weights
+
+    def _top_k(self, scores, exclude_row):
+        scores[exclude_row] = 0.0
+        k = min(RELATED_TOP_K, len(scores))
+        if k == 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.ids[r], round(float(scores[r]), 4)) for r in best if scores[r] >= MIN_SIMILARITY]
+
+    def rebuild_neighbors(self):
+        """Recomputes every discourse's top-k neighbours."""
+        if not self.ids:
+            self.neighbors = {}
+            return
+        weights = self._weights()
+        self.neighbors = {}
+        # Score in blocks so the dense similarity slab stays small
+        for start in range(0, len(self.ids), SIMILARITY_BLOCK_ROWS):
+            block = (weights[start:start + SIMILARITY_BLOCK_ROWS] @ weights.T).toarray()
+            for offset, scores in enumerate(block):
+                r = start + offset
+                self.neighbors[self.ids[r]] = self._top_k(scores, r)
+
+    # --- Incremental updates -----------------------------------------------
+    def _count_row(self, text):
+        counts = {}
+        for token in tokenize(text):
+            col = self.vocab.setdefault(token, len(self.vocab))
+            counts[col] = counts.get(col, 0) + 1
+        cols = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        data = np.fromiter(counts.values(), dtype=np.int32, count=len(counts))
+        return sparse.csr_matrix((data, (np.zeros(len(cols), dtype=np.int32), cols)),
+                                 shape=(1, len(self.vocab)))
+
+    def upsert(self, discourse_id, title, text):
+        """Adds or replaces one discourse and re-scores the neighbours it affects."""
+        row = self._count_row(text)
+        self.counts.resize((self.counts.shape[0], len(self.vocab)))
+        if discourse_id in self.rows:
+            r = self.rows[discourse_id]
+            self.counts = sparse.vstack([self.counts[:r], row, self.counts[r + 1:]], format='csr')
+        else:
+            self.rows[discourse_id] = len(self.ids)
+            self.ids.append(discourse_id)
+            self.counts = sparse.vstack([self.counts, row], format='csr')
+        self.titles[discourse_id] = title
+        self._rescore_around(discourse_id)
+
+    def remove(self, discourse_id):
+        r = self.rows.get(discourse_id)
+        if r is None:
+            return
+        self.counts = sparse.vstack([self.counts[:r], self.counts[r + 1:]], format='csr')
+        del self.ids[r]
+        self.rows = {d: i for i, d in enumerate(self.ids)}
+        self.titles.pop(discourse_id, None)
+        self.neighbors.pop(discourse_id, None)
+        weights = self._weights() if self.ids else None
+        for d, related in list(self.neighbors.items()):
+            if any(n == discourse_id for n, _ in related):
+                i = self.rows[d]
+                self.neighbors[d] = self._top_k((weights @ weights[i].T).toarray().ravel(), i)
+
+    def _rescore_around(self, discourse_id):
+        """
+        Recomputes the changed discourse's own list, then fixes up the lists of
+        discourses it now enters or used to belong to. Other lists keep their
+        (slightly stale) scores until the next full rebuild.
+        """
+        weights = self._weights()
+        r = self.rows[discourse_id]
+        scores = (weights @ weights[r].T).toarray().ravel()
+        self.neighbors[discourse_id] = self._top_k(scores.copy(), r)
+
+        for i, d in enumerate(self.ids):
+            if d == discourse_id:
+                continue
+            related = self.neighbors.get(d, [])
+            was_listed = any(n == discourse_id for n, _ in related)
+            floor = related[-1][1] if len(related) >= RELATED_TOP_K else MIN_SIMILARITY
+            if was_listed or scores[i] >= floor:
+                self.neighbors[d] = self._top_k((weights @ weights[i].T).toarray().ravel(), i)
+
+    # --- Persistence -------------------------------------------------------
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        n = len(self.ids)
+        nbr_ids = np.full((n, RELATED_TOP_K), -1, dtype=np.int64)
+        nbr_scores = np.zeros((n, RELATED_TOP_K), dtype=np.float32)
+        for r, d in enumerate(self.ids):
+            for j, (n_id, score) in enumerate(self.neighbors.get(d, [])):
+                nbr_ids[r, j], nbr_scores[r, j] = n_id, score
+        terms = sorted(self.vocab, key=self.vocab.get)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            ids=np.array(self.ids, dtype=np.int64),
+            titles=np.array([self.titles.get(d, '') for d in self.ids], dtype=str),
+            terms=np.array(terms, dtype=str),
+            data=self.counts.data, indices=self.counts.indices, indptr=self.counts.indptr,
+            shape=np.array(self.counts.shape),
+            nbr_ids=nbr_ids, nbr_scores=nbr_scores
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            ids = [int(d) for d in f['ids']]
+            counts = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+            neighbors = {
+                d: [(int(n), float(s)) for n, s in zip(f['nbr_ids'][r], f['nbr_scores'][r]) if n >= 0]
+                for r, d in enumerate(ids)
+            }
+            titles = zip(ids, map(str, f['titles']))
+            return cls(ids, titles, {str(t): i for i, t in enumerate(f['terms'])}, counts, neighbors)
+
+    @classmethod
+    def empty(cls):
+        return cls([], {}, {}, sparse.csr_matrix((0, 0), dtype=np.int32), {})
+
+
+def _file_version(path):
+    """Identifies one saved file: every save replaces it with a new inode."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _get_index():
+    """Returns the in-memory index, reloading it if another process saved a newer file."""
+    global _index, _loaded_version
+    path = index_path()
+    version = _file_version(path)
+    if _index is None or version != _loaded_version:
+        _index = RelatedIndex.load(path) if version is not None else RelatedIndex.empty()
+        _loaded_version = version
+    return _index
+
+
+@contextmanager
+def _index_write_lock():
+    """Serializes index writers across threads and worker processes."""
+    path = index_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _write_lock, open(f"{path}.lock", 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield path
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _publish_index(index, path):
+    """Saves the index (atomic replace) and makes it this process's copy. Hold the write lock."""
+    global _index, _loaded_version
+    index.save(path)
+    with _lock:
+        _index, _loaded_version = index, _file_version(path)
+
+
+def get_related_discourses(discourse_id, limit=RELATED_TOP_K):
+    """
+    Returns the precomputed neighbours of a discourse.
+
+    Returns:
+        list: Dictionaries with id, title and score, best match first.
+    """
+    if not recommendations_enabled():
+        return []
+    with _lock:
+        index = _get_index()
+        return [
+            {"id": n, "title": index.titles.get(n, ''), "score": score}
+            for n, score in index.neighbors.get(discourse_id, [])[:limit]
+        ]
+
+
+def _apply_updates(discourse_ids):
+    """
+    Re-indexes discourses from their committed rows: approved ones are
+    (re)scored, unapproved or deleted ones are dropped.
+    """
+    rows = {
+        row.id: row for row in db.session.query(
+            DiscourseBlog.id, DiscourseBlog.title, DiscourseBlog.body_text, DiscourseBlog.is_approved
+        ).filter(DiscourseBlog.id.in_(discourse_ids))
+    }
+    with _index_write_lock() as path:
+        # Start from the latest file, which may hold other workers' updates
+        index = RelatedIndex.load(path) if os.path.exists(path) else RelatedIndex.empty()
+        for discourse_id in sorted(discourse_ids):
+            row = rows.get(discourse_id)
+            if row is not None and row.is_approved:
+                index.upsert(row.id, row.title, document_text(row.title, row.body_text))
+            else:
+                index.remove(discourse_id)
+        _publish_index(index, path)
+
+
+class IndexUpdater:
+    """Queues discourse ids and applies them to the index from a background thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._app = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    def enqueue(self, discourse_id):
+        with self._lock:
+            self._pending.add(discourse_id)
+            if self._pid != os.getpid():
+                # First update in this (possibly forked) worker process
+                self._app = current_app._get_current_object()
+                self._pid = os.getpid()
+                self._stop.clear()
+                threading.Thread(target=self._run, name='related-index-update', daemon=True).start()
+
+    def _run(self):
+        while not self._stop.wait(INDEX_UPDATE_DELAY):
+            self.flush()
+
+    def flush(self):
+        """
+        Applies every queued discourse. Errors are logged, never raised.
+
+        Returns:
+            int: The number of discourses applied.
+        """
+        with self._lock:
+            if not self._pending or self._app is None:
+                return 0
+            pending, self._pending = self._pending, set()
+        with self._app.app_context():
+            try:
+                _apply_updates(pending)
+            except Exception as e:
+                self._app.logger.error(
+                    f"Could not update the related-discourse index for {sorted(pending)} "
+                    f"(run `flask discourse:rebuild-related`): {e}", exc_info=True
+                )
+                return 0
+            finally:
+                db.session.remove()
+        return len(pending)
+
+    def shutdown(self):
+        self._stop.set()
+        self.flush()
+
+
+index_updater = IndexUpdater()
+atexit.register(index_updater.shutdown)
+
+
+def update_discourse_in_index(discourse):
+    """
+    Queues one discourse for re-indexing once it is committed. Returns at once;
+    the index is updated in the background.
+    """
+    if not recommendations_enabled() or discourse is None:
+        return
+    index_updater.enqueue(discourse.id)
+
+
+def remove_discourse_from_index(discourse_id):
+    """Queues a deleted discourse for removal from the index."""
+    if not recommendations_enabled():
+        return
+    index_updater.enqueue(discourse_id)
+
+
+def rebuild_related_index():
+    """
+    Rebuilds the whole index from the approved discourses.
+
+    Returns:
+        int: The number of discourses indexed.
+    """
+    if not recommendations_enabled():
+        return 0
+    rows = db.session.query(DiscourseBlog.id, DiscourseBlog.title, DiscourseBlog.body_text)\
+                     .filter(DiscourseBlog.is_approved == True)\
+                     .order_by(DiscourseBlog.id).all()
+    index = RelatedIndex.empty()
+    index.counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+    count_rows = [index._count_row(document_text(title, body_text)) for _, title, body_text in rows]
+    for row in count_rows:
+        row.resize((1, len(index.vocab)))
+    if count_rows:
+        index.counts = sparse.vstack(count_rows, format='csr')
+    index.ids = [r.id for r in rows]
+    index.rows = {d: i for i, d in enumerate(index.ids)}
+    index.titles = {r.id: r.title for r in rows}
+    index.rebuild_neighbors()
+    with _index_write_lock() as path:
+        _publish_index(index, path)
+    return len(index.ids)
@@ -1,14 +1,17 @@
 # /project_folder/app/dol_discourse/disc_routes.py
 
-import os
-from flask import Blueprint, render_template, current_app, request, jsonify, url_for, abort
-from datetime import datetime
+from flask import Blueprint, render_template, current_app, request, jsonify, url_for, abort, Response
 from app.dol_db.models import db, DiscourseBlog, User, Category, SubCategory, Resource, ResourceMedium,ResourceType, DiscourseComment
-from .disc_utils import search_discourses
-from sqlalchemy.orm import joinedload
+from .disc_utils import search_discourses, get_comments_page, decode_comment_cursor, serialize_comment, sync_discourse_resources, get_content_index_page, decode_index_cursor
+from .disc_cache import get_discourse_version, bump_discourse_version, get_cached_payload, store_payload, get_cached_index_page, store_index_page
+from .disc_related import get_related_discourses, update_discourse_in_index
+from .disc_views import record_view, get_trending_discourses
+from app.dol_db.loaders import loader_options
+from app.dol_db.routing import use_primary
+from app.dol_db.snowflake import new_discourse_reference
+from app.snapshot import get_snapshot_version, DEFAULT_MAX_AGE
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from PIL import Image
+from app.dol_media.media_utils import spool_blob, dispatch_image, release_blob, upload_url, image_srcset
 import json
 from flask_paginate import Pagination, get_page_parameter
 from sqlalchemy import func, or_
@@ -53,14 +56,11 @@ def new_discourse_editor():
 @login_required
 def edit_discourse(discourse_id):
     """Renders the editor pre-populated with an existing discourse."""
-    discourse = DiscourseBlog.query.options(
-        joinedload(DiscourseBlog.resources),
-        joinedload(DiscourseBlog.subcategory)
-    ).get_or_404(discourse_id)
+    discourse = DiscourseBlog.query.options(*loader_options('discourse.detail')).get_or_404(discourse_id)
 
     # --- Authorization Check ---
     is_author = discourse.user_id == current_user.id
-    is_privileged = current_user.has_role('Admin') or current_user.has_role('Editor')
+    is_privileged = current_user.has_any_role('Admin', 'Editor')
     if not is_author and not is_privileged:
         abort(403) # Forbidden
 
@@ -114,26 +114,18 @@ def save_discourse():
         current_app.logger.error(f"Missing or invalid form data: {e}")
         return jsonify({"status": "error", "message": "Missing or invalid required form data."}), 400
 
-    if not current_user.has_role('Admin') and not current_user.has_role('Editor') and not current_user.has_role('Writer'):
+    if not current_user.has_any_role('Admin', 'Editor', 'Writer'):
         return jsonify({"status": "error", "message": "You are not authorized to create a discourse."}), 403
 
     try:
-        image_filename = None
-        # 2. Handle the optional image upload from request.files
+        pending_image = None
+        # 2. Handle the optional image upload: spool it now, encode it in the background
         if 'featured_image' in request.files:
             file = request.files['featured_image']
             if file and file.filename != '':
-                timestamp = int(datetime.now().timestamp())
-                base_filename = secure_filename(os.path.splitext(file.filename)[0])
-                image_filename = f"{base_filename}_{timestamp}.webp"
-                
-                save_path_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'discourse_images')
-                os.makedirs(save_path_dir, exist_ok=True)
-                save_path = os.path.join(save_path_dir, image_filename)
-
-                with Image.open(file.stream) as img:
-                    img.save(save_path, 'webp', quality=85)
-                current_app.logger.info(f"Successfully saved image as {image_filename}")
+                # Stored content-addressed: identical images are kept only once
+                pending_image = spool_blob(file)
+                current_app.logger.info(f"Spooled image {file.filename} for background encoding")
 
         # 3. Create the DiscourseBlog object
         new_discourse = DiscourseBlog(
@@ -141,8 +133,8 @@ def save_discourse():
             title=title,
             body=body,
             subcategory_id=subcategory_id,
-            featured_image=image_filename,
-            reference=f"DISC-{int(datetime.now().timestamp())}",
+            featured_image=pending_image.token if pending_image else None,
+            reference=new_discourse_reference(), # Unique without a DB round trip
             is_approved=True
         )
 
@@ -160,6 +152,11 @@ def save_discourse():
         
         db.session.add(new_discourse)
         db.session.commit()
+
+        if pending_image:
+            dispatch_image(pending_image, DiscourseBlog, new_discourse.id, 'featured_image',
+                           on_done=bump_discourse_version)
+        update_discourse_in_index(new_discourse)
         
         current_app.logger.info(f"Discourse '{title}' saved successfully with ID {new_discourse.id}")
         
@@ -167,6 +164,7 @@ def save_discourse():
         return jsonify({
             "status": "success", 
             "message": "Discourse saved successfully!",
+            "pending_image_id": pending_image.pending_id if pending_image else None,
             "redirect_url": url_for('discourse.dialogues')
         }), 201
 
@@ -185,7 +183,7 @@ def update_discourse(discourse_id):
 
     # --- Authorization Check ---
     is_author = discourse_to_update.user_id == current_user.id
-    is_privileged = current_user.has_role('Admin') or current_user.has_role('Editor')
+    is_privileged = current_user.has_any_role('Admin', 'Editor')
     if not is_author and not is_privileged:
         return jsonify({"status": "error", "message": "You are not authorized to edit this discourse."}), 403
 
@@ -197,51 +195,37 @@ def update_discourse(discourse_id):
         resources_json_string = request.form.get('resources', '[]')
 
         # 2. Handle optional image update
+        pending_image = None
         if 'featured_image' in request.files:
             file = request.files['featured_image']
             if file and file.filename != '':
-                # (Optional) Delete old image file
-                if discourse_to_update.featured_image:
-                    old_image_path = os.path.join(current_app.root_path, 'static', 'uploads', 'discourse_images', discourse_to_update.featured_image)
-                    if os.path.exists(old_image_path):
-                        os.remove(old_image_path)
-                
-                # Save new image
-                timestamp = int(datetime.now().timestamp())
-                base_filename = secure_filename(os.path.splitext(file.filename)[0])
-                new_image_filename = f"{base_filename}_{timestamp}.webp"
-                save_path_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'discourse_images')
-                os.makedirs(save_path_dir, exist_ok=True)
-                save_path = os.path.join(save_path_dir, new_image_filename)
-                
-                with Image.open(file.stream) as img:
-                    img.save(save_path, 'webp', quality=85)
+                # Drop our reference to the old image; other discourses may share
+                # the same blob, so the file itself is reclaimed by `flask media:gc`
+                release_blob(discourse_to_update.featured_image)
+
+                # Spool the new image; the row points at the pending token until it is encoded
+                pending_image = spool_blob(file)
                 
                 # Update the filename in the database
-                discourse_to_update.featured_image = new_image_filename
+                discourse_to_update.featured_image = pending_image.token
 
-        # 3. Synchronize resources (simple and robust: delete all, then re-add)
-        discourse_to_update.resources.clear() # Requires cascade="all, delete-orphan" on relationship
-        db.session.flush() # Persist the deletion before adding new ones
-
-        resources_data = json.loads(resources_json_string)
-        if resources_data:
-            for res_data in resources_data:
-                resource = Resource(
-                    name=res_data['name'],
-                    type=ResourceType[res_data['type']],
-                    medium=ResourceMedium[res_data['medium']],
-                    link=res_data['link']
-                )
-                discourse_to_update.resources.append(resource)
+        # 3. Synchronize resources: only changed rows are written
+        resource_changes = sync_discourse_resources(discourse_to_update, json.loads(resources_json_string))
+        current_app.logger.debug(f"Resource sync for discourse {discourse_id}: {resource_changes}")
 
         db.session.commit()
+        bump_discourse_version(discourse_id)
+        if pending_image:
+            dispatch_image(pending_image, DiscourseBlog, discourse_id, 'featured_image',
+                           on_done=bump_discourse_version)
+        update_discourse_in_index(discourse_to_update)
         current_app.logger.info(f"Discourse ID {discourse_id} updated successfully.")
 
         # Redirect to the discourse's view page
         return jsonify({
             "status": "success",
             "message": "Discourse updated successfully!",
+            "pending_image_id": pending_image.pending_id if pending_image else None,
             "redirect_url": url_for('discourse.dialogues')
         }), 200
 
@@ -264,13 +248,9 @@ def dialogues():
     
     content_to_load = None
 
-    # Eagerly load all related data needed for the initial render
-    query_options = [
-        joinedload(DiscourseBlog.subcategory).joinedload(SubCategory.category),
-        joinedload(DiscourseBlog.author),
-        joinedload(DiscourseBlog.resources),
-        joinedload(DiscourseBlog.comments).joinedload(DiscourseComment.commenter) # Eager load comments and their authors
-    ]
+    # Eagerly load all related data needed for the initial render.
+    # Comments are not loaded here: only their first page is fetched below.
+    query_options = loader_options('discourse.detail')
 
     if requested_discourse_id:
         current_app.logger.info(f"Loading specific discourse with ID: {requested_discourse_id}")
@@ -281,60 +261,109 @@ def dialogues():
                                           .order_by(DiscourseBlog.date_posted.desc())\
                                           .options(*query_options)\
                                           .first()
+
+    initial_comments, next_comments_cursor, related = [], None, []
+    if content_to_load:
+        initial_comments, next_comments_cursor = get_comments_page(content_to_load.id)
+        related = get_related_discourses(content_to_load.id)
+        record_view(content_to_load.id)
     
     return render_template(
         'dialogues.html',
-        initial_content=content_to_load
+        initial_content=content_to_load,
+        initial_comments=initial_comments,
+        next_comments_cursor=next_comments_cursor,
+        related_discourses=related
     )
 
 # ============= API ENDPOINT TO GET DISCOURSE DETAILS (UPDATED) ================
 @discourse_bp.route('/api/get/<int:discourse_id>')
 def get_discourse_details(discourse_id):
-    """API endpoint to fetch the full details of a single discourse, including comments."""
-    try:
-        discourse = DiscourseBlog.query.options(
-            joinedload(DiscourseBlog.resources),
-            joinedload(DiscourseBlog.comments).joinedload(DiscourseComment.commenter),
-            joinedload(DiscourseBlog.subcategory).joinedload(SubCategory.category)# Eagerly load comments and authors
-        ).get(discourse_id)
+    """
+    API endpoint to fetch the full details of a single discourse, including comments.
+    Responses are served from the versioned payload cache with an ETag.
+    """
+    cached = get_cached_payload(discourse_id)
+    if cached is None:
+        # Read the version before building so a concurrent write can't be cached over.
+        version = get_discourse_version(discourse_id)
+        try:
+            # The payload is stored under `version`; a lagging replica may not have its write yet
+            with use_primary():
+                discourse = DiscourseBlog.query.options(*loader_options('discourse.detail')).get(discourse_id)
+
+                if not discourse:
+                    return jsonify({"status": "error", "message": "Discourse not found"}), 404
+
+                comments, next_cursor = get_comments_page(discourse_id)
+            cached = store_payload(discourse_id, version, _serialize_discourse(discourse, comments, next_cursor))
+        except Exception as e:
+            current_app.logger.error(f"API Error fetching discourse {discourse_id}: {e}")
+            return jsonify({"status": "error", "message": "An internal server error occurred"}), 500
+
+    record_view(discourse_id) # In-memory only; flushed to the database in batches
+    etag, body = cached
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+def _serialize_discourse(discourse, comments, next_comments_cursor):
+    """
+    Builds the JSON payload served by `get_discourse_details`.
+    Only the first page of comments is included; the rest is fetched from
+    `/discourse/api/<id>/comments` using `comments_next_cursor`.
+    """
+    return {
+        "status": "success",
+        "discourse": {
+            "id": discourse.id,
+            "title": discourse.title,
+            "body": discourse.body,
+            "featured_image_url": upload_url('uploads/discourse_images', discourse.featured_image),
+            "featured_image_srcset": image_srcset('uploads/discourse_images', discourse.featured_image),
+            "date_posted": discourse.date_posted.strftime('%B %d, %Y'),
+            "reference": discourse.reference,                
+            "category_name": discourse.subcategory.category.name if discourse.subcategory and discourse.subcategory.category else None,
+            "subcategory_name": discourse.subcategory.name if discourse.subcategory else None,
+            "resources": [
+                {
+                    "type_value": resource.type.value,
+                    "type_name": resource.type.name,
+                    "name": resource.name,
+                    "link": resource.link
+                } for resource in discourse.resources
+            ],
+            "comments": [serialize_comment(comment) for comment in comments],
+            "comment_count": discourse.comment_count,
+            "comments_next_cursor": next_comments_cursor
+        }
+    }
 
-        if not discourse:
-            return jsonify({"status": "error", "message": "Discourse not found"}), 404
 
-        # Sort comments by date posted
-        sorted_comments = sorted(discourse.comments, key=lambda c: c.date_commented)
+# === API ROUTE FOR PAGINATED COMMENTS ===
+@discourse_bp.route('/api/<int:discourse_id>/comments')
+def get_discourse_comments(discourse_id):
+    """
+    API endpoint returning one page of a discourse's comments.
+    Pass the `next_cursor` of the previous page as `?cursor=` to continue.
+    """
+    cursor = None
+    raw_cursor = request.args.get('cursor', '').strip()
+    if raw_cursor:
+        cursor = decode_comment_cursor(raw_cursor)
+        if cursor is None:
+            return jsonify({"status": "error", "message": "Invalid cursor."}), 400
 
-        data_to_return = {
+    try:
+        comments, next_cursor = get_comments_page(discourse_id, cursor)
+        return jsonify({
             "status": "success",
-            "discourse": {
-                "id": discourse.id,
-                "title": discourse.title,
-                "body": discourse.body,
-                "featured_image_url": url_for('static', filename=f'uploads/discourse_images/{discourse.featured_image}') if discourse.featured_image else None,
-                "date_posted": discourse.date_posted.strftime('%B %d, %Y'),
-                "reference": discourse.reference,                
-                "category_name": discourse.subcategory.category.name if discourse.subcategory and discourse.subcategory.category else None,
-                "subcategory_name": discourse.subcategory.name if discourse.subcategory else None,
-                "resources": [
-                    {
-                        "type_value": resource.type.value,
-                        "type_name": resource.type.name,
-                        "name": resource.name,
-                        "link": resource.link
-                    } for resource in discourse.resources
-                ],
-                "comments": [ # NEW: Add comments to the payload
-                    {
-                        "body": comment.body,
-                        "author_name": f"{comment.commenter.name} {comment.commenter.other_names}",
-                        "date_commented": comment.date_commented.strftime('%B %d, %Y at %I:%M %p')
-                    } for comment in sorted_comments
-                ]
-            }
-        }
-        return jsonify(data_to_return)
+            "comments": [serialize_comment(comment) for comment in comments],
+            "next_cursor": next_cursor
+        })
     except Exception as e:
-        current_app.logger.error(f"API Error fetching discourse {discourse_id}: {e}")
+        current_app.logger.error(f"API Error fetching comments for discourse {discourse_id}: {e}")
         return jsonify({"status": "error", "message": "An internal server error occurred"}), 500
 
 # === API ROUTE TO ADD A COMMENT TO A DISCOURSE ===
@@ -367,7 +396,13 @@ def add_comment():
         )
 
         db.session.add(new_comment)
+        # Keep the denormalized counter in the same transaction as the insert
+        DiscourseBlog.query.filter_by(id=discourse.id).update(
+            {DiscourseBlog.comment_count: DiscourseBlog.comment_count + 1},
+            synchronize_session=False
+        )
         db.session.commit()
+        bump_discourse_version(discourse.id)
 
         current_app.logger.info(f"User {current_user.id} added comment to Discourse {discourse_id}")
 
@@ -408,6 +443,7 @@ def add_resource():
         
         db.session.add(new_resource)
         db.session.commit()
+        bump_discourse_version(discourse.id)
 
         return jsonify({
             "status": "success",
@@ -427,6 +463,59 @@ def add_resource():
         return jsonify({'status': 'error', 'message': 'An internal server error occurred.'}), 500
     
 
+@discourse_bp.route('/api/related/<int:discourse_id>')
+def get_related(discourse_id):
+    """
+    Returns the discourses most similar to this one, precomputed from the
+    TF-IDF index (see disc_related.py).
+    """
+    return jsonify({"status": "success", "related": get_related_discourses(discourse_id)})
+
+
+@discourse_bp.route('/api/index')
+def get_content_index():
+    """
+    One page of the approved-discourse listing behind the navigation panels,
+    newest first. Optional `?subcategory=<id>`; pass the `next_cursor` of the
+    previous page as `?cursor=` to continue. Pages are cached and served with
+    an ETag, so an unchanged listing costs the browser a 304.
+    """
+    subcategory_id = request.args.get('subcategory', type=int)
+    raw_cursor = request.args.get('cursor', '').strip()
+    cursor = None
+    if raw_cursor:
+        cursor = decode_index_cursor(raw_cursor)
+        if cursor is None:
+            return jsonify({"status": "error", "message": "Invalid cursor."}), 400
+
+    key = (subcategory_id, raw_cursor)
+    version = get_snapshot_version()
+    max_age = current_app.config.get('SNAPSHOT_MAX_AGE', DEFAULT_MAX_AGE)
+    cached = get_cached_index_page(key, version)
+    if cached is None:
+        try:
+            with use_primary():  # Cached under `version`, which a lagging replica may predate
+                items, next_cursor = get_content_index_page(subcategory_id, cursor)
+        except Exception as e:
+            current_app.logger.error(f"API Error fetching content index (subcategory {subcategory_id}): {e}")
+            return jsonify({"status": "error", "message": "An internal server error occurred"}), 500
+        cached = store_index_page(key, version, {"status": "success", "items": items, "next_cursor": next_cursor},
+                                  max_age)
+
+    etag, body = cached
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True  # Always revalidate; unchanged pages come back as 304
+    return response.make_conditional(request)
+
+
+@discourse_bp.route('/api/trending')
+def get_trending():
+    """Returns the most viewed approved discourses, with recent views weighted more."""
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify({"status": "success", "trending": get_trending_discourses(limit=limit)})
+
+
 @discourse_bp.route('/api/navigation/<int:discourse_id>')
 def get_navigation_links(discourse_id):
     """
@@ -434,7 +523,8 @@ def get_navigation_links(discourse_id):
     approved discourses.
     """
     try:
-        current_discourse = DiscourseBlog.query.get(discourse_id)
+        navigation_options = loader_options('discourse.navigation')
+        current_discourse = DiscourseBlog.query.options(*navigation_options).get(discourse_id)
         if not current_discourse:
             return jsonify({"status": "error", "message": "Discourse not found"}), 404
 
@@ -442,7 +532,7 @@ def get_navigation_links(discourse_id):
             current_app.logger.warning(f"Discourse ID {discourse_id} has no date_posted. Cannot determine navigation.")
             return jsonify({"status": "success", "previous_id": None, "next_id": None})
 
-        previous_post = DiscourseBlog.query.filter(
+        previous_post = DiscourseBlog.query.options(*navigation_options).filter(
             DiscourseBlog.date_posted < current_discourse.date_posted,
             DiscourseBlog.is_approved == True
         ).order_by(
@@ -450,7 +540,7 @@ def get_navigation_links(discourse_id):
             DiscourseBlog.id.desc()
         ).first()
 
-        next_post = DiscourseBlog.query.filter(
+        next_post = DiscourseBlog.query.options(*navigation_options).filter(
             DiscourseBlog.date_posted > current_discourse.date_posted,
             DiscourseBlog.is_approved == True
         ).order_by(
@@ -510,16 +600,16 @@ def dialogues_by_author(user_id):
     search_query = request.args.get('search', '').strip()
 
     # 2. Build the base query for all approved discourses by this author
-    query = DiscourseBlog.query.filter_by(user_id=user_id, is_approved=True)
+    query = DiscourseBlog.query.options(*loader_options('discourse.listing')).filter_by(user_id=user_id, is_approved=True)
 
     # 3. Apply search filter if present
     if search_query:
         search_term = f"%{search_query}%"
-        # Search in title, body, and category/subcategory names
+        # Search in title, plaintext body, and category/subcategory names
         query = query.join(SubCategory).join(Category).filter(
             or_(
                 DiscourseBlog.title.ilike(search_term),
-                DiscourseBlog.body.ilike(search_term),
+                DiscourseBlog.body_text.ilike(search_term),
                 SubCategory.name.ilike(search_term),
                 Category.name.ilike(search_term)
             )
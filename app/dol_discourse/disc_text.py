@@ -0,0 +1,98 @@
+# /project_folder/app/dol_discourse/disc_text.py
+
+"""
+Plaintext pipeline for discourse bodies.
+
+`DiscourseBlog.body` holds editor (Quill) HTML. Searching and listing work on
+derived columns instead — `body_text`, `excerpt`, `word_count` and
+`reading_time` — which are computed here whenever the body is set.
+Only the standard library is used, so the model can call it on every write.
+"""
+
+import math
+from html.parser import HTMLParser
+
+EXCERPT_LENGTH = 280
+WORDS_PER_MINUTE = 200
+
+# Tags that end a line of text; everything else is treated as inline
+BLOCK_TAGS = {
+    'address', 'article', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'figcaption',
+    'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'li', 'ol', 'p', 'pre',
+    'section', 'table', 'td', 'th', 'tr', 'ul'
+}
+# Tags whose content is never shown to the reader
+SKIP_TAGS = {'script', 'style', 'template', 'noscript'}
+
+
+class _TextExtractor(HTMLParser):
+    """Collects the visible text of an HTML fragment, one line per block."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html):
+    """
+    Strips markup from an HTML fragment.
+
+    Returns:
+        str: The visible text, with whitespace collapsed and one block per line.
+    """
+    if not html:
+        return ''
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    lines = (' '.join(line.split()) for line in ''.join(parser.parts).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def make_excerpt(text, max_length=EXCERPT_LENGTH):
+    """Shortens plaintext to at most `max_length` characters on a word boundary."""
+    flat = ' '.join(text.split())
+    if len(flat) <= max_length:
+        return flat
+    cut = flat[:max_length - 1]
+    if ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip(' ,;:.-') + '…'
+
+
+def extract_body_fields(html):
+    """
+    Derives the plaintext columns of a discourse from its HTML body.
+
+    Returns:
+        dict: body_text, excerpt, word_count and reading_time (whole minutes).
+    """
+    text = html_to_text(html)
+    word_count = len(text.split())
+    return {
+        'body_text': text,
+        'excerpt': make_excerpt(text),
+        'word_count': word_count,
+        'reading_time': math.ceil(word_count / WORDS_PER_MINUTE) if word_count else 0
+    }
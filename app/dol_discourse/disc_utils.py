@@ -1,5 +1,12 @@
-from app.dol_db.models import db, DiscourseBlog, User, Category, SubCategory
-from sqlalchemy import or_, case
+import base64
+from collections import defaultdict
+from datetime import datetime
+from app.dol_db.models import db, DiscourseBlog, DiscourseComment, User, Category, SubCategory, Resource, ResourceType, ResourceMedium
+from sqlalchemy import or_, and_, case, func
+from app.dol_db.loaders import loader_options
+
+COMMENTS_PER_PAGE = 20
+INDEX_PAGE_SIZE = 50
 
 def search_discourses(search_query, limit=7):
     """
@@ -24,7 +31,7 @@ def search_discourses(search_query, limit=7):
         (DiscourseBlog.title.ilike(search_term), 1),
         (User.name.ilike(search_term), 2),
         (User.other_names.ilike(search_term), 2),
-        (DiscourseBlog.body.ilike(search_term), 3),
+        (DiscourseBlog.body_text.ilike(search_term), 3),
         (SubCategory.name.ilike(search_term), 4),
         (Category.name.ilike(search_term), 4),
         else_=5
@@ -33,6 +40,7 @@ def search_discourses(search_query, limit=7):
     # Build the query
     query = (
         db.session.query(DiscourseBlog)
+        .options(*loader_options('discourse.listing'))
         .join(User, DiscourseBlog.user_id == User.id)
         .join(SubCategory, DiscourseBlog.subcategory_id == SubCategory.id)
         .join(Category, SubCategory.category_id == Category.id)
@@ -41,7 +49,7 @@ def search_discourses(search_query, limit=7):
             DiscourseBlog.is_approved == True, # Only search approved posts
             or_(
                 DiscourseBlog.title.ilike(search_term),
-                DiscourseBlog.body.ilike(search_term),
+                DiscourseBlog.body_text.ilike(search_term), # Plaintext, so tag names never match
                 User.name.ilike(search_term),
                 User.other_names.ilike(search_term),
                 SubCategory.name.ilike(search_term),
@@ -74,9 +82,222 @@ def search_by_author(author_id):
     # This is a simple, direct query.
     results = (
         DiscourseBlog.query
+        .options(*loader_options('discourse.listing'))
         .filter_by(user_id=author_id, is_approved=True)
         .order_by(DiscourseBlog.date_posted.desc())
         .all()
     )
     
-    return results
\ No newline at end of file
+    return results
+
+# ================================================================
+# KEYSET PAGINATION FOR DISCOURSE COMMENTS
+# ================================================================
+
+def encode_comment_cursor(comment):
+    """Encodes the (date_commented, id) position of a comment as an opaque cursor."""
+    raw = f"{comment.date_commented.isoformat()}|{comment.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_comment_cursor(cursor):
+    """
+    Decodes a cursor produced by `encode_comment_cursor`.
+
+    Returns:
+        tuple: (date_commented, id), or None if the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date_str, comment_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date_str), int(comment_id)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def get_comments_page(discourse_id, cursor=None, per_page=COMMENTS_PER_PAGE):
+    """
+    Fetches one page of a discourse's comments in chronological order.
+
+    Uses keyset pagination on (date_commented, id), so every page costs a
+    single indexed range scan no matter how deep the reader scrolls.
+
+    Args:
+        discourse_id (int): The discourse whose comments to fetch.
+        cursor (tuple): A decoded cursor, or None for the first page.
+        per_page (int): The page size.
+
+    Returns:
+        tuple: (list_of_comments, next_cursor_or_None)
+    """
+    query = (
+        DiscourseComment.query
+        .options(*loader_options('comment.page'))
+        .filter(DiscourseComment.discourse_id == discourse_id)
+    )
+    if cursor:
+        after_date, after_id = cursor
+        query = query.filter(
+            or_(
+                DiscourseComment.date_commented > after_date,
+                and_(DiscourseComment.date_commented == after_date, DiscourseComment.id > after_id)
+            )
+        )
+
+    # Fetch one extra row to learn whether another page exists
+    rows = query.order_by(DiscourseComment.date_commented, DiscourseComment.id).limit(per_page + 1).all()
+    comments = rows[:per_page]
+    next_cursor = encode_comment_cursor(comments[-1]) if len(rows) > per_page else None
+    return comments, next_cursor
+
+
+def encode_index_cursor(date_posted, discourse_id):
+    """Encodes the (date_posted, id) position of a content-index row as an opaque cursor."""
+    raw = f"{date_posted.isoformat() if date_posted else ''}|{discourse_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_index_cursor(cursor):
+    """
+    Decodes a cursor produced by `encode_index_cursor`.
+
+    Returns:
+        tuple: (date_posted_or_None, id), or None if the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date_str, discourse_id = raw.rsplit('|', 1)
+        return (datetime.fromisoformat(date_str) if date_str else None), int(discourse_id)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def get_content_index_page(subcategory_id=None, cursor=None, per_page=INDEX_PAGE_SIZE):
+    """
+    Fetches one page of the approved-discourse listing used by the navigation
+    panels, newest first.
+
+    Keyset pagination on (date_posted, id) descending; discourses without a
+    date come last, as they do in the ORDER BY on both SQLite and MySQL.
+
+    Args:
+        subcategory_id (int): Restrict the listing to one subcategory, or None for all.
+        cursor (tuple): A decoded cursor, or None for the first page.
+        per_page (int): The page size.
+
+    Returns:
+        tuple: (list_of_row_dicts, next_cursor_or_None)
+    """
+    query = db.session.query(
+        DiscourseBlog.id, DiscourseBlog.title, DiscourseBlog.subcategory_id, DiscourseBlog.date_posted
+    ).filter(DiscourseBlog.is_approved == True)
+    if subcategory_id is not None:
+        query = query.filter(DiscourseBlog.subcategory_id == subcategory_id)
+    if cursor:
+        after_date, after_id = cursor
+        if after_date is None:
+            query = query.filter(DiscourseBlog.date_posted.is_(None), DiscourseBlog.id < after_id)
+        else:
+            query = query.filter(
+                or_(
+                    DiscourseBlog.date_posted < after_date,
+                    and_(DiscourseBlog.date_posted == after_date, DiscourseBlog.id < after_id),
+                    DiscourseBlog.date_posted.is_(None)
+                )
+            )
+
+    # Fetch one extra row to learn whether another page exists
+    rows = query.order_by(DiscourseBlog.date_posted.desc(), DiscourseBlog.id.desc()).limit(per_page + 1).all()
+    page = rows[:per_page]
+    next_cursor = encode_index_cursor(page[-1].date_posted, page[-1].id) if len(rows) > per_page else None
+    return [{'id': r.id, 'title': r.title, 'subcategory_id': r.subcategory_id} for r in page], next_cursor
+
+
+def serialize_comment(comment):
+    """Converts a comment to the dictionary shape used by the dialogues UI."""
+    return {
+        "id": comment.id,
+        "body": comment.body,
+        "author_name": f"{comment.commenter.name} {comment.commenter.other_names}",
+        "date_commented": comment.date_commented.strftime('%B %d, %Y at %I:%M %p')
+    }
+
+
+def refresh_comment_count(discourse_id):
+    """
+    Recomputes a discourse's comment counter from the comments table.
+    Used after writes that bypass `add_comment` (e.g. admin edits).
+    """
+    if discourse_id is None:
+        return
+    total = db.session.query(func.count(DiscourseComment.id))\
+                      .filter(DiscourseComment.discourse_id == discourse_id)\
+                      .scalar() or 0
+    DiscourseBlog.query.filter_by(id=discourse_id).update({DiscourseBlog.comment_count: total})
+    db.session.commit()
+
+
+# ================================================================
+# DIFF-BASED RESOURCE SYNCHRONIZATION
+# ================================================================
+
+def _resource_key(type_, medium, name, link):
+    return (type_, medium, (name or '').strip(), (link or '').strip())
+
+
+def sync_discourse_resources(discourse, resources_data):
+    """
+    Makes a discourse's resources match the submitted list, touching only the
+    rows that differ. Resources are matched on (type, medium, name, link):
+    matches are left alone, a removed row is reused (UPDATE) for each added
+    entry where possible, and the remainder is bulk deleted or inserted.
+    Joins the caller's transaction; the caller commits.
+
+    Args:
+        discourse (DiscourseBlog): The discourse being updated.
+        resources_data (list): Dicts with 'type', 'medium', 'name' and 'link',
+                               as posted by the editor.
+
+    Returns:
+        dict: Counts of inserted, updated and deleted rows.
+    """
+    wanted = [
+        _resource_key(ResourceType[r['type']], ResourceMedium[r['medium']], r['name'], r.get('link'))
+        for r in resources_data
+    ]
+
+    # key -> ids of existing rows with that key (a list, since duplicates are allowed)
+    existing = defaultdict(list)
+    rows = db.session.query(Resource.id, Resource.type, Resource.medium, Resource.name, Resource.link)\
+                     .filter(Resource.discourse_id == discourse.id)\
+                     .order_by(Resource.id)
+    for row in rows:
+        existing[_resource_key(row.type, row.medium, row.name, row.link)].append(row.id)
+
+    added = []
+    for key in wanted:
+        if existing.get(key):
+            existing[key].pop(0) # Unchanged: keep the row as it is
+        else:
+            added.append(key)
+    removed_ids = [resource_id for ids in existing.values() for resource_id in ids]
+
+    def as_mapping(key):
+        type_, medium, name, link = key
+        return {'type': type_, 'medium': medium, 'name': name, 'link': link}
+
+    # Reuse removed rows for added entries, then delete/insert whatever is left
+    updates = [dict(id=resource_id, **as_mapping(key)) for resource_id, key in zip(removed_ids, added)]
+    to_delete = removed_ids[len(updates):]
+    to_insert = [dict(discourse_id=discourse.id, **as_mapping(key)) for key in added[len(updates):]]
+
+    if updates:
+        db.session.bulk_update_mappings(Resource, updates)
+    if to_delete:
+        Resource.query.filter(Resource.id.in_(to_delete)).delete(synchronize_session=False)
+    if to_insert:
+        db.session.bulk_insert_mappings(Resource, to_insert)
+
+    # Any loaded collection is now stale
+    db.session.expire(discourse, ['resources'])
+    return {'inserted': len(to_insert), 'updated': len(updates), 'deleted': len(to_delete)}
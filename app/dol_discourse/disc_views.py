@@ -0,0 +1,224 @@
+# /project_folder/app/dol_discourse/disc_views.py
+
+"""
+Batched view counting and trending discourses.
+
+Recording a view only bumps an in-memory counter. A background thread per
+worker process flushes the accumulated counts every VIEW_FLUSH_INTERVAL
+seconds (and once more at shutdown) as a single multi-row upsert into
+`discourse_view_counts`, one row per discourse and hour. Hot discourses
+therefore cost one row write per flush instead of one per request.
+
+If the batch fails, the rows are written one at a time instead: rows of
+discourses deleted since the view are dropped, and any other row that keeps
+failing is retried on the next MAX_FLUSH_ATTEMPTS - 1 flushes, then
+discarded with an error, so one bad row can't stop view counting.
+
+Trending scores are computed from the flushed hourly buckets with an
+exponential decay, so recent views weigh more than old ones.
+"""
+
+import atexit
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, update, insert
+from sqlalchemy.dialects import mysql, sqlite
+
+from app.dol_db.models import db, DiscourseBlog, DiscourseViewCount
+from app.dol_db.loaders import loader_options
+
+DEFAULT_FLUSH_INTERVAL = 10  # seconds
+MAX_FLUSH_ATTEMPTS = 3
+TRENDING_WINDOW_HOURS = 72
+TRENDING_HALF_LIFE_HOURS = 24
+
+
+def _hour_bucket(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class ViewCounter:
+    """Thread-safe accumulator of (discourse_id, hour) -> views, flushed in batches."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._attempts = Counter()  # (discourse_id, hour) -> failed flushes so far
+        self._app = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    def record(self, discourse_id, count=1):
+        """Counts a view. Never touches the database."""
+        with self._lock:
+            self._pending[(discourse_id, _hour_bucket(datetime.utcnow()))] += count
+            if self._pid != os.getpid():
+                # First view in this (possibly forked) worker process
+                self._start(current_app._get_current_object())
+
+    def _start(self, app):
+        self._app = app
+        self._pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        interval = self._app.config.get('VIEW_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all pending counts in one upsert, or row by row if that fails.
+
+        Returns:
+            int: The number of (discourse, hour) rows written.
+        """
+        with self._lock:
+            if not self._pending or self._app is None:
+                return 0
+            pending, self._pending = self._pending, Counter()
+
+        with self._app.app_context():
+            try:
+                try:
+                    _write_rows(_rows(pending))
+                    db.session.commit()
+                    written = len(pending)
+                except Exception as e:
+                    db.session.rollback()
+                    self._app.logger.warning(f"Batched flush of {len(pending)} view count row(s) failed, "
+                                             f"writing them one at a time: {e}")
+                    written = self._flush_rows(pending)
+            finally:
+                db.session.remove()
+        with self._lock:
+            for key in pending:
+                if key not in self._pending:
+                    self._attempts.pop(key, None)
+        return written
+
+    def _flush_rows(self, pending):
+        """Writes rows one transaction at a time; returns how many were written."""
+        existing = set(db.session.scalars(
+            select(DiscourseBlog.id).where(DiscourseBlog.id.in_({key[0] for key in pending}))))
+        written, failed = 0, Counter()
+        for key, views in pending.items():
+            if key[0] not in existing:
+                self._app.logger.warning(f"Dropped {views} view(s) of deleted discourse {key[0]}")
+                continue
+            try:
+                _write_rows(_rows({key: views}))
+                db.session.commit()
+                written += 1
+            except Exception as e:
+                db.session.rollback()
+                failed[key] = views
+                last_error = e
+        if failed:
+            with self._lock:
+                for key, views in failed.items():
+                    self._attempts[key] += 1
+                    if self._attempts[key] >= MAX_FLUSH_ATTEMPTS:
+                        del self._attempts[key]
+                        self._app.logger.error(f"Discarded {views} view(s) of discourse {key[0]} at {key[1]} "
+                                               f"after {MAX_FLUSH_ATTEMPTS} failed flushes: {last_error}")
+                    else:
+                        self._pending[key] += views  # Retried by the next flush
+        return written
+
+    def shutdown(self):
+        self._stop.set()
+        self.flush()
+
+
+def _rows(pending):
+    return [
+        {'discourse_id': discourse_id, 'bucket': bucket, 'views': views}
+        for (discourse_id, bucket), views in pending.items()
+    ]
+
+
+def _write_rows(rows):
+    """Adds the rows' views to the table, in the current transaction."""
+    stmt = _upsert_statement(rows)
+    if stmt is not None:
+        db.session.execute(stmt)
+        return
+    # No native upsert: update the existing row, or insert it. A concurrent insert of the
+    # same row fails this flush, and the retry then finds the row to update.
+    table = DiscourseViewCount.__table__
+    for row in rows:
+        updated = db.session.execute(
+            update(table)
+            .where(table.c.discourse_id == row['discourse_id'], table.c.bucket == row['bucket'])
+            .values(views=table.c.views + row['views'])
+        ).rowcount
+        if not updated:
+            db.session.execute(insert(table).values(**row))
+
+
+def _upsert_statement(rows):
+    """
+    Builds a multi-row 'insert, or add to the existing views' statement for the
+    active dialect, or None if it has no native upsert.
+    """
+    table = DiscourseViewCount.__table__
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        stmt = mysql.insert(table).values(rows)
+        return stmt.on_duplicate_key_update(views=table.c.views + stmt.inserted.views)
+    if dialect == 'sqlite':
+        stmt = sqlite.insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.discourse_id, table.c.bucket],
+            set_={'views': table.c.views + stmt.excluded.views}
+        )
+    return None
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.shutdown)
+
+
+def record_view(discourse_id):
+    view_counter.record(discourse_id)
+
+
+def get_trending_discourses(limit=10, window_hours=TRENDING_WINDOW_HOURS, half_life_hours=TRENDING_HALF_LIFE_HOURS):
+    """
+    Ranks approved discourses by exponentially decayed views over a window.
+    A view `half_life_hours` old counts half as much as one from this hour.
+
+    Returns:
+        list: Dictionaries with id, title, views (in the window) and score.
+    """
+    now = _hour_bucket(datetime.utcnow())
+    buckets = db.session.query(DiscourseViewCount.discourse_id, DiscourseViewCount.bucket, DiscourseViewCount.views)\
+                        .filter(DiscourseViewCount.bucket >= now - timedelta(hours=window_hours))\
+                        .all()
+
+    scores, views = Counter(), Counter()
+    for discourse_id, bucket, count in buckets:
+        age_hours = max((now - bucket).total_seconds() / 3600, 0)
+        scores[discourse_id] += count * 0.5 ** (age_hours / half_life_hours)
+        views[discourse_id] += count
+    if not scores:
+        return []
+
+    # Over-fetch a little: some top scorers may have been unapproved since
+    candidate_ids = [d for d, _ in scores.most_common(limit * 2)]
+    discourses = DiscourseBlog.query.options(*loader_options('discourse.listing'))\
+                                    .filter(DiscourseBlog.id.in_(candidate_ids), DiscourseBlog.is_approved == True)\
+                                    .all()
+    ranked = sorted(discourses, key=lambda d: scores[d.id], reverse=True)[:limit]
+    return [
+        {"id": d.id, "title": d.title, "views": views[d.id], "score": round(scores[d.id], 3)}
+        for d in ranked
+    ]
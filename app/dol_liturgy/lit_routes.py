@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, current_app, jsonify, request
 from datetime import date, datetime
 from app.dol_db.models import LiturgicalDay
+from app.cache import cache
 
 # Import helpers from lit_utils
 from app.dol_liturgy.lit_utils import (
@@ -19,6 +20,8 @@ liturgy_bp = Blueprint(
     static_folder='static'
 )
 
+_readings = cache.namespace('liturgy')
+
 @liturgy_bp.route('/liturgy')
 def liturgy():
     today = date.today()
@@ -122,29 +125,33 @@ def daily_devotions():
 def get_readings_for_date(date_str):
     """
     Fetches daily readings for a given date using the catholic-mass-readings library helper.
+    A day's readings are scraped once and then served from the cache.
     """
     try:
         target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
     except ValueError:
         return jsonify({'status': 'error', 'message': 'Invalid date format provided.'}), 400
 
-    current_app.logger.info(f"Fetching readings for {target_date} using lit_utils helper.")
-    
-    mass_data = get_daily_readings(target_date)
-    if not mass_data or not mass_data.sections:
+    def fetch_readings():
+        current_app.logger.info(f"Fetching readings for {target_date} using lit_utils helper.")
+        mass_data = get_daily_readings(target_date)
+        if not mass_data or not mass_data.sections:
+            return None
+        return [
+            {'title': reading.header, 'body': reading.text}
+            for section in mass_data.sections
+            for reading in section.readings
+        ]
+
+    # Failures aren't cached, so the next request tries again
+    readings_list = _readings.get_or_set(('readings', target_date.isoformat()), fetch_readings,
+                                         ttl=DEFAULTS["readings_ttl"], cache_if=bool)
+    if readings_list is None:
         return jsonify({
             'status': 'error',
             'message': f'Readings are not available for {date_str}.'
         }), 404
 
-    readings_list = []
-    for section in mass_data.sections:
-        for reading in section.readings:
-            readings_list.append({
-                'title': reading.header,
-                'body': reading.text
-            })
-
     if not readings_list:
         return jsonify({
             'status': 'error',
@@ -1,11 +1,11 @@
 # /project_folder/app/lit_utils.py
 # /project_folder/app/lit_utils.py
-import requests, time
 from urllib.parse import urlencode
 import asyncio
 import datetime
-from plugins.catholic_mass_readings import USCCB,models
 from typing import Optional
+from app.dol_metrics.http_metrics import record_call, TimedCall
+from app.cache import cache
 
 
 """
@@ -39,25 +39,14 @@ DEFAULTS = {
     "accept": "application/json",
     "calendar_ttl": 60 * 60 * 12,  # 12h cache for calendars
     "devotions_ttl": 60 * 15,      # 15m cache for daily devotions
+    "readings_ttl": 60 * 60 * 12,  # 12h cache for a day's Mass readings
     "timeout": 10,
 }
 
 # -------------------------
-# Simple in-memory TTL cache
+# Response cache (the application cache, see app/cache.py)
 # -------------------------
-_CACHE = {}  # key -> {"exp": <epoch>, "data": <payload>}
-
-def _cache_get(key):
-    now = time.time()
-    item = _CACHE.get(key)
-    if item and item["exp"] > now:
-        return item["data"]
-    if item:
-        _CACHE.pop(key, None)
-    return None
-
-def _cache_set(key, data, ttl):
-    _CACHE[key] = {"exp": time.time() + max(1, int(ttl)), "data": data}
+_responses = cache.namespace("http")
 
 # -------------------------
 # Extended safe_fetch
@@ -77,7 +66,8 @@ def safe_fetch(
     Robust fetch with:
       - optional params/headers/json
       - JSON/text auto-parsing
-      - per-request TTL cache
+      - per-request TTL cache, shared by the workers with a shared cache
+        backend; concurrent misses of one key make a single call
       - graceful error shaping
     Returns: (data, error_dict_or_None)
     """
@@ -96,51 +86,69 @@ def safe_fetch(
         ]
         cache_key = "|".join(key_parts)
 
+    if not ttl:
+        return _fetch(url, method, params, headers, json, timeout, cache_result=None)
+
+    cached = _responses.get(cache_key)
+    if cached is None:
+        with _responses.single_flight(cache_key):
+            cached = _responses.get(cache_key)  # Fetched by a concurrent caller while we waited
+            if cached is None:
+                data, parse_err = _fetch(url, method, params, headers, json, timeout, cache_result="miss")
+                if data is not None:
+                    _responses.set(cache_key, data, ttl=max(1, int(ttl)))
+                return data, parse_err
     # Cache hit
-    if ttl:
-        cached = _cache_get(cache_key)
-        if cached is not None:
-            return cached, None
+    record_call(url, method, None, client="safe_fetch", cache="hit")
+    return cached, None
 
-    try:
-        resp = requests.request(
-            method=method.upper(),
-            url=url,
-            params=params,
-            headers=headers,
-            json=json,
-            timeout=timeout,
-        )
-    except requests.RequestException as e:
-        return None, {"kind": "network_error", "detail": str(e)}
-
-    ct = resp.headers.get("Content-Type", "")
-    if not resp.ok:
-        return None, {
-            "kind": "http_error",
-            "status": resp.status_code,
-            "content_type": ct,
-            "detail": (resp.text or "")[:400],
-        }
-
-    # parse
-    data = None
-    try:
-        if "application/json" in ct:
-            data = resp.json()
-        else:
-            data = resp.text  # XML / ICS / plain text, etc.
-    except Exception as e:
-        # Last resort: return text
-        data = resp.text
-        # but flag parse issue (non-fatal)
-        parse_err = {"kind": "parse_warning", "detail": str(e)}
-    else:
-        parse_err = None
 
-    # Cache store
-    if ttl:
-        _cache_set(cache_key, data, ttl)
+def _fetch(url, method, params, headers, json, timeout, cache_result):
+    """The outbound call of safe_fetch, uncached."""
+    import requests  # Imported on the first outbound call, not at startup
+
+    # Latency, bytes and outcome (ok, or the error kind below) go to /metrics
+    # and to the call log read by `flask http:summary`
+    with TimedCall(url, method, client="safe_fetch", cache=cache_result) as call:
+        try:
+            resp = requests.request(
+                method=method.upper(),
+                url=url,
+                params=params,
+                headers=headers,
+                json=json,
+                timeout=timeout,
+            )
+        except requests.RequestException as e:
+            call.outcome = "network_error"
+            return None, {"kind": "network_error", "detail": str(e)}
+        call.status, call.nbytes = resp.status_code, len(resp.content)
+
+        ct = resp.headers.get("Content-Type", "")
+        if not resp.ok:
+            call.outcome = "http_error"
+            return None, {
+                "kind": "http_error",
+                "status": resp.status_code,
+                "content_type": ct,
+                "detail": (resp.text or "")[:400],
+            }
+
+        # parse
+        data = None
+        try:
+            if "application/json" in ct:
+                data = resp.json()
+            else:
+                data = resp.text  # XML / ICS / plain text, etc.
+        except Exception as e:
+            # Last resort: return text
+            data = resp.text
+            # but flag parse issue (non-fatal)
+            parse_err = {"kind": "parse_warning", "detail": str(e)}
+            call.outcome = "parse_warning"
+        else:
+            parse_err = None
 
     # Return with optional parse warning attached (non-fatal)
     return data, parse_err
@@ -175,12 +183,58 @@ def litcal_url(
 
 
 
+class _TimedSession:
+    """Wraps the USCCB client's HTTP session so every page fetch is recorded (see http_metrics)."""
+
+    def __init__(self, session):
+        self._session = session
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    async def _timed(self, method, url, *args, **kwargs):
+        with TimedCall(url, method, client="usccb") as call:
+            resp = await getattr(self._session, method.lower())(url, *args, **kwargs)
+            call.status, call.nbytes = resp.status_code, len(resp.content)
+            if resp.status_code >= 400:
+                call.outcome = "http_error"
+        return resp
+
+    async def get(self, url, *args, **kwargs):
+        return await self._timed("GET", url, *args, **kwargs)
+
+    async def head(self, url, *args, **kwargs):
+        # get_mass_types probes every mass type's page with HEAD
+        return await self._timed("HEAD", url, *args, **kwargs)
+
+
+_timed_usccb_class = None
+
+def _usccb_client():
+    """
+    Returns a USCCB client whose page fetches are timed.
+    The scraper is imported here, on first use: it pulls in BeautifulSoup,
+    html5lib, curl_cffi and pytz, which only this code path needs.
+    """
+    global _timed_usccb_class
+    if _timed_usccb_class is None:
+        from plugins.catholic_mass_readings import USCCB
+
+        class TimedUSCCB(USCCB):
+            def _ensure_session(self):
+                return _TimedSession(super()._ensure_session())
+
+        _timed_usccb_class = TimedUSCCB
+    return _timed_usccb_class()
+
+
 # The core async function now accepts a date object
 async def fetch_readings_async(target_date: datetime.date):
     """Asynchronously fetches mass readings for a specific date."""
+    from plugins.catholic_mass_readings import models
     try:
         # The library uses an async context manager
-        async with USCCB() as usccb:
+        async with _usccb_client() as usccb:
             # --- FIX: Explicitly specify the MassType as DAILY ---
             mass = await usccb.get_mass(target_date, type_=models.MassType.DEFAULT) 
             # Note: The argument name is 'type_'
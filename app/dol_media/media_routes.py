@@ -0,0 +1,57 @@
+# /project_folder/app/dol_media/media_routes.py
+
+import os
+from flask import Blueprint, Response, current_app, redirect, url_for, abort, send_from_directory
+from werkzeug.security import safe_join
+
+from .media_utils import upload_url, image_srcset, responsive_image, media_store_path
+
+media_bp = Blueprint('media', __name__, url_prefix='/media')
+
+# A neutral placeholder shown while an upload is still being encoded
+PLACEHOLDER_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="640" height="360" viewBox="0 0 640 360">'
+    '<rect width="640" height="360" fill="#EAEDED"/>'
+    '<text x="320" y="188" font-family="sans-serif" font-size="20" fill="#8a8f94" '
+    'text-anchor="middle">Processing image&#8230;</text>'
+    '</svg>'
+)
+
+# Blob filenames are content hashes, so a stored file never changes
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+@media_bp.app_context_processor
+def inject_media_helpers():
+    """Makes the upload URL and responsive image helpers available to all templates."""
+    return dict(
+        upload_url=upload_url,
+        image_srcset=image_srcset,
+        responsive_image=responsive_image
+    )
+
+
+@media_bp.route('/pending/<path:path>')
+def pending_image(path):
+    """
+    Serves the placeholder for an upload that is still being encoded, or
+    redirects to the real file once the background worker has written it.
+    """
+    full_path = safe_join(current_app.static_folder, path)
+    if full_path is None:
+        abort(404)
+
+    if os.path.exists(full_path):
+        return redirect(url_for('static', filename=path))
+
+    response = Response(PLACEHOLDER_SVG, mimetype='image/svg+xml')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@media_bp.route('/store/<path:path>')
+def stored_file(path):
+    """Serves a content-addressed blob (or one of its variants) from the media store."""
+    response = send_from_directory(media_store_path(), path, max_age=IMMUTABLE_MAX_AGE)
+    response.headers['Cache-Control'] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return response
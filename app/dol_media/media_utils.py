@@ -0,0 +1,704 @@
+# /project_folder/app/dol_media/media_utils.py
+
+"""
+Background image processing for uploads.
+
+Request handlers no longer decode and encode images themselves. They write the
+raw upload to a spool directory and hand it to a process pool, which does the
+CPU-bound Pillow work. The request stores a pending token (`pending:<filename>`)
+in the DB column; when encoding finishes the row is updated to the final
+filename. Until then `upload_url()` points at a placeholder route.
+
+Discourse images and charity logos are content-addressed: the SHA-256 of the
+encoded WebP bytes is the filename (`<digest>.webp`), stored in sharded
+directories under the media store and reference-counted in `media_blobs`.
+Identical uploads are stored once and served with immutable cache headers;
+unreferenced blobs are reclaimed by `flask media:gc` rather than inline.
+Profile pictures keep their client-chosen names: `/upload-image` only spools
+them, and the profile form, once committed, dispatches the encoding with the
+previous picture as the fallback.
+
+Discourse images and charity logos additionally get responsive variants
+(several widths, AVIF + WebP) written to `<dir>/variants/<stem>/` with a
+`manifest.json` that `responsive_image()` turns into `<picture>` markup.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from flask import current_app, url_for
+from markupsafe import Markup, escape
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from app.dol_db.models import db, DiscourseBlog, Charity, MediaBlob, User
+
+PENDING_PREFIX = 'pending:'
+SPOOL_DIR_NAME = 'upload_spool'
+MEDIA_STORE_DIR_NAME = 'media_store'
+BLOB_PATTERN = re.compile(r'^[0-9a-f]{64}\.webp$')
+DEFAULT_IMAGE_WORKERS = 2
+WEBP_QUALITY = 85
+
+# Responsive variants: widths wider than the source are skipped, never upscaled
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_FORMATS = ('avif', 'webp')  # Preferred first; AVIF is dropped if Pillow lacks it
+VARIANT_QUALITY = {'avif': 60, 'webp': 80}
+VARIANTS_DIR_NAME = 'variants'
+MANIFEST_NAME = 'manifest.json'
+
+# Upload folders (relative to static/) whose images get responsive variants
+VARIANT_FOLDERS = ('uploads/discourse_images', 'images/charity_logos')
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+PROFILE_PICTURE_FOLDER = 'images/profile_pics'
+PROFILE_PICTURE_SIZE = (300, 300)
+
+# Columns that may hold a pending token:
+# (model, column, static subfolder, fallback on failure, content-addressed, max_size)
+PENDING_COLUMNS = [
+    (DiscourseBlog, 'featured_image', 'uploads/discourse_images', None, True, None),
+    (Charity, 'logo_image', 'images/charity_logos', 'default_charity.webp', True, None),
+    (User, 'profile_picture', PROFILE_PICTURE_FOLDER, 'default.webp', False, PROFILE_PICTURE_SIZE),
+]
+
+
+class PendingImage:
+    """
+    A spooled upload waiting to be encoded, either into `dest_dir/filename` or,
+    when `store_root` is set, into the content-addressed media store (in which
+    case `filename` is only a temporary name for the token and the spool file).
+    """
+
+    def __init__(self, spool_path, dest_dir, filename, max_size=None, variants=False, store_root=None):
+        self.spool_path = spool_path
+        self.dest_dir = dest_dir
+        self.filename = filename
+        self.max_size = max_size
+        self.variants = variants
+        self.store_root = store_root
+
+    @property
+    def token(self):
+        """The value stored in the DB column while encoding is in progress."""
+        return f"{PENDING_PREFIX}{self.filename}"
+
+    @property
+    def pending_id(self):
+        return os.path.splitext(self.filename)[0]
+
+
+def is_pending(value):
+    return bool(value) and value.startswith(PENDING_PREFIX)
+
+
+def is_blob(value):
+    """True for values that name a content-addressed blob (`<sha256>.webp`)."""
+    return bool(value) and BLOB_PATTERN.match(value) is not None
+
+
+def blob_relpath(value):
+    """Shards a blob into `ab/cd/<digest>.webp` to keep directories small."""
+    return f"{value[:2]}/{value[2:4]}/{value}"
+
+
+def media_store_path():
+    return current_app.config.get('MEDIA_STORE_PATH') or \
+        os.path.join(current_app.instance_path, MEDIA_STORE_DIR_NAME)
+
+
+def upload_url(folder, value):
+    """
+    Builds the public URL for an uploaded image: a content-addressed blob, or a
+    legacy file stored under `static/<folder>`. Pending uploads resolve to the
+    placeholder route until they are encoded.
+    """
+    if not value:
+        return None
+    if is_pending(value):
+        return url_for('media.pending_image', path=f"{folder}/{value[len(PENDING_PREFIX):]}")
+    if is_blob(value):
+        return url_for('media.stored_file', path=blob_relpath(value))
+    return url_for('static', filename=f"{folder}/{value}")
+
+
+def _image_path(folder, value):
+    """Absolute path of an uploaded image on disk."""
+    if is_blob(value):
+        return os.path.join(media_store_path(), *blob_relpath(value).split('/'))
+    return os.path.join(current_app.static_folder, *folder.split('/'), value)
+
+
+def _variant_url(folder, value, variant_file):
+    stem = os.path.splitext(value)[0]
+    if is_blob(value):
+        return url_for('media.stored_file', path=f"{value[:2]}/{value[2:4]}/{VARIANTS_DIR_NAME}/{stem}/{variant_file}")
+    return url_for('static', filename=f"{folder}/{VARIANTS_DIR_NAME}/{stem}/{variant_file}")
+
+
+_manifest_cache = {}  # manifest path -> (mtime, manifest)
+
+
+def load_variant_manifest(folder, value):
+    """Returns the variant manifest of an uploaded image, or None if it has none yet."""
+    if not value or is_pending(value):
+        return None
+    manifest_path = os.path.join(variants_dir_for(_image_path(folder, value)), MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(manifest_path)
+    except OSError:
+        return None
+
+    cached = _manifest_cache.get(manifest_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    _manifest_cache[manifest_path] = (mtime, manifest)
+    return manifest
+
+
+def image_srcset(folder, value, fmt='webp'):
+    """
+    Builds a `srcset` string for one format, ending with the original image at
+    its intrinsic width. Returns None when the image has no variants.
+    """
+    manifest = load_variant_manifest(folder, value)
+    if not manifest:
+        return None
+    candidates = [
+        f"{_variant_url(folder, value, v['file'])} {v['width']}w"
+        for v in manifest['variants'] if v['format'] == fmt
+    ]
+    if fmt == 'webp':
+        candidates.append(f"{upload_url(folder, value)} {manifest['width']}w")
+    return ', '.join(candidates) or None
+
+
+def responsive_image(folder, value, alt='', sizes='100vw', css_class=None):
+    """
+    Renders a `<picture>` element with AVIF and WebP `srcset`s for an uploaded
+    image, falling back to a plain `<img>` when no variants exist (yet).
+    """
+    src = upload_url(folder, value)
+    if not src:
+        return Markup('')
+    class_attr = Markup(f' class="{escape(css_class)}"') if css_class else Markup('')
+    img_attrs = Markup('src="{}" alt="{}"').format(src, alt) + class_attr
+
+    manifest = load_variant_manifest(folder, value)
+    if not manifest or not manifest['variants']:
+        return Markup('<img {}>').format(img_attrs)
+
+    sources = []
+    for fmt in VARIANT_FORMATS:
+        srcset = image_srcset(folder, value, fmt)
+        if srcset:
+            sources.append(Markup('<source type="image/{}" srcset="{}" sizes="{}">').format(fmt, srcset, sizes))
+    return Markup('<picture>{}<img {} width="{}" height="{}" loading="lazy" decoding="async"></picture>').format(
+        Markup('').join(sources), img_attrs, manifest['width'], manifest['height']
+    )
+
+
+# -------------------------
+# Worker-side encoding
+# -------------------------
+def encode_image(spool_path, save_path=None, max_size=None, quality=WEBP_QUALITY, variants=False,
+                 store_root=None):
+    """
+    Decodes a spooled upload and writes it as WebP. Runs inside the process pool,
+    so it must stay a plain module-level function.
+
+    With `store_root`, the encoded bytes are hashed and moved to their
+    content-addressed location instead of `save_path`; if that blob already
+    exists the new copy is discarded.
+
+    Returns:
+        str: The final filename (`<digest>.webp` for the media store).
+    """
+    from PIL import Image
+
+    if store_root:
+        os.makedirs(store_root, exist_ok=True)
+        tmp_path = os.path.join(store_root, f"{os.path.basename(spool_path)}.part")
+    else:
+        tmp_path = f"{save_path}.part"
+    try:
+        with Image.open(spool_path) as img:
+            if max_size:
+                img.thumbnail(max_size) # Maintains aspect ratio
+            img.save(tmp_path, 'webp', quality=quality)
+
+        if store_root:
+            digest = _file_digest(tmp_path)
+            save_path = os.path.join(store_root, *blob_relpath(f"{digest}.webp").split('/'))
+            if os.path.exists(save_path):
+                os.remove(tmp_path)  # Identical image already stored
+            else:
+                os.makedirs(os.path.dirname(save_path), exist_ok=True)
+                os.replace(tmp_path, save_path)
+        else:
+            os.replace(tmp_path, save_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+
+    if variants:
+        # The main image is already usable; a variant failure only costs srcset
+        try:
+            build_variants(save_path)
+        except Exception:
+            logger.exception("Could not build variants for %s", save_path)
+    return os.path.basename(save_path)
+
+
+def _file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def variants_dir_for(image_path):
+    """Returns `<folder>/variants/<stem>` for an image at `<folder>/<stem>.<ext>`."""
+    folder, filename = os.path.split(image_path)
+    return os.path.join(folder, VARIANTS_DIR_NAME, os.path.splitext(filename)[0])
+
+
+def available_variant_formats():
+    from PIL import features
+    return tuple(fmt for fmt in VARIANT_FORMATS if features.check(fmt))
+
+
+def build_variants(image_path, force=False):
+    """
+    Writes the responsive variants of one image and its manifest. Runs inside
+    the process pool (uploads and the backfill command).
+
+    Returns:
+        bool: True if variants were (re)built, False if an up-to-date manifest existed.
+    """
+    from PIL import Image
+
+    out_dir = variants_dir_for(image_path)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    if not force and os.path.exists(manifest_path) \
+            and os.path.getmtime(manifest_path) >= os.path.getmtime(image_path):
+        return False
+
+    os.makedirs(out_dir, exist_ok=True)
+    formats = available_variant_formats()
+    entries = []
+    with Image.open(image_path) as img:
+        img.load()
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+        source_width, source_height = img.size
+
+        for width in VARIANT_WIDTHS:
+            if width >= source_width:
+                break
+            height = max(1, round(source_height * width / source_width))
+            resized = img.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                variant_name = f"{width}.{fmt}"
+                resized.save(os.path.join(out_dir, variant_name), fmt, quality=VARIANT_QUALITY[fmt])
+                entries.append({"width": width, "format": fmt, "file": variant_name})
+
+    manifest = {
+        "source": os.path.basename(image_path),
+        "width": source_width,
+        "height": source_height,
+        "variants": entries,
+    }
+    tmp_path = f"{manifest_path}.part"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    return True
+
+
+# -------------------------
+# Request-side API
+# -------------------------
+def spool_dir():
+    path = os.path.join(current_app.instance_path, SPOOL_DIR_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def spool_image(file_storage, dest_dir, filename, max_size=None, variants=False):
+    """
+    Writes an uploaded file to the spool directory without decoding it.
+
+    Args:
+        file_storage: The werkzeug FileStorage from `request.files`.
+        dest_dir (str): Absolute directory the encoded image will be written to.
+        filename (str): Final filename, including the `.webp` extension.
+        max_size (tuple): Optional (width, height) bound for a thumbnail.
+        variants (bool): Also build responsive variants once encoded.
+
+    Returns:
+        PendingImage: Pass it to `dispatch_image` once the DB row is committed.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    # Named after the final file so `flask media:resume-pending` can find it after a restart
+    spool_path = os.path.join(spool_dir(), f"{filename}.upload")
+    file_storage.stream.seek(0)
+    file_storage.save(spool_path)
+    return PendingImage(spool_path, dest_dir, filename, max_size, variants)
+
+
+def find_spooled_image(dest_dir, filename, max_size=None, variants=False):
+    """
+    Returns the PendingImage of an upload an earlier request spooled with
+    `spool_image` but did not dispatch, or None if there is no such spool file.
+    """
+    if not filename or os.path.basename(filename) != filename:
+        return None
+    spool_path = os.path.join(spool_dir(), f"{filename}.upload")
+    if not os.path.exists(spool_path):
+        return None
+    return PendingImage(spool_path, dest_dir, filename, max_size, variants)
+
+
+def discard_image(pending):
+    """Deletes the spool file of an upload that will never be dispatched (e.g. its row failed to commit)."""
+    if pending is not None and os.path.exists(pending.spool_path):
+        os.remove(pending.spool_path)
+
+
+def spool_blob(file_storage, max_size=None, variants=True):
+    """
+    Like `spool_image`, but the image goes to the content-addressed media store.
+    Its final name (`<digest>.webp`) is only known once it has been encoded.
+    """
+    temp_name = f"{uuid.uuid4().hex}.webp"
+    spool_path = os.path.join(spool_dir(), f"{temp_name}.upload")
+    file_storage.stream.seek(0)
+    file_storage.save(spool_path)
+    return PendingImage(spool_path, None, temp_name, max_size, variants, store_root=media_store_path())
+
+
+def dispatch_image(pending, model=None, row_id=None, column=None, fallback=None, on_done=None):
+    """
+    Queues a spooled image for encoding.
+
+    If `model`, `row_id` and `column` are given, the row's column is switched
+    from the pending token to the final filename when encoding succeeds, or to
+    `fallback` when it fails. The update only applies while the column still
+    holds this upload's token, so a newer upload is never overwritten.
+    `on_done(row_id)` is called after the row update.
+    """
+    app = current_app._get_current_object()
+    save_path = os.path.join(pending.dest_dir, pending.filename) if pending.dest_dir else None
+    callback = partial(_finish_job, app, pending, model, row_id, column, fallback, on_done)
+    job_args = (pending.spool_path, save_path, pending.max_size)
+    job_kwargs = dict(variants=pending.variants, store_root=pending.store_root)
+
+    executor = _get_executor(app)
+    if executor is None:
+        # IMAGE_WORKERS = 0: encode inline (CLI commands and debugging)
+        try:
+            result, error = encode_image(*job_args, **job_kwargs), None
+        except Exception as e:
+            result, error = None, e
+        callback(result=result, error=error)
+        return
+
+    future = executor.submit(encode_image, *job_args, **job_kwargs)
+    future.add_done_callback(
+        lambda f: callback(result=None if f.exception() else f.result(), error=f.exception())
+    )
+
+
+def _finish_job(app, pending, model, row_id, column, fallback, on_done, result=None, error=None):
+    """
+    Records the outcome of an encoding job. Runs on the executor's callback thread.
+
+    A failed write is retried once (an IntegrityError usually means another
+    worker registered the same blob first); if it still fails, or the blob has
+    vanished from the store, the row is switched to `fallback` rather than
+    being left pending.
+    """
+    with app.app_context():
+        if error is not None:
+            app.logger.error(f"Background encoding failed for {pending.filename}: {error}")
+        if model is None:
+            return
+        final_value = fallback if error is not None else result
+        try:
+            try:
+                _record_image(model, row_id, column, pending.token, final_value, blob=result)
+            except IntegrityError as e:
+                db.session.rollback()
+                app.logger.warning(f"Retrying image record for {model.__name__} {row_id}: {e}")
+                _record_image(model, row_id, column, pending.token, final_value, blob=result)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Could not record encoded image for {model.__name__} {row_id}: {e}")
+            if error is not None:
+                return  # The fallback itself could not be written
+            try:
+                _record_image(model, row_id, column, pending.token, fallback)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Could not restore fallback image for {model.__name__} {row_id}: {e}")
+                return
+        if on_done:
+            on_done(row_id)
+
+
+def _record_image(model, row_id, column, token, value, blob=None):
+    """
+    Switches a row from its pending token to `value` and registers `blob`
+    (referenced only if the row still held the token), then commits.
+    """
+    updated = model.query.filter(
+        model.id == row_id,
+        getattr(model, column) == token
+    ).update({column: value}, synchronize_session=False)
+    if is_blob(blob):
+        register_blob(blob, referenced=bool(updated))
+    db.session.commit()
+    return updated
+
+
+def _get_executor(app):
+    """Lazily starts the shared process pool (None when IMAGE_WORKERS is 0)."""
+    global _executor
+    workers = app.config.get('IMAGE_WORKERS', DEFAULT_IMAGE_WORKERS)
+    if not workers:
+        return None
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=workers)
+    return _executor
+
+
+def resume_pending_images():
+    """
+    Settles rows left holding a pending token, e.g. after a restart killed the pool.
+    Encodes any spool file still on disk, synchronously.
+
+    Returns:
+        int: The number of rows updated.
+    """
+    updated = 0
+    for model, column, folder, fallback, content_addressed, max_size in PENDING_COLUMNS:
+        dest_dir = os.path.join(current_app.static_folder, *folder.split('/'))
+        rows = model.query.filter(getattr(model, column).like(f"{PENDING_PREFIX}%")).all()
+        for row in rows:
+            filename = getattr(row, column)[len(PENDING_PREFIX):]
+            spool_path = os.path.join(spool_dir(), f"{filename}.upload")
+            value = fallback
+            if os.path.exists(os.path.join(dest_dir, filename)):
+                value = filename  # A name-addressed upload that finished after all
+            elif os.path.exists(spool_path):
+                try:
+                    if content_addressed:
+                        encoded = encode_image(spool_path, store_root=media_store_path(), variants=True)
+                        register_blob(encoded)
+                    else:
+                        os.makedirs(dest_dir, exist_ok=True)
+                        encoded = encode_image(spool_path, os.path.join(dest_dir, filename), max_size=max_size)
+                    value = encoded
+                except Exception as e:
+                    current_app.logger.error(f"Could not encode spooled image {filename}: {e}")
+            setattr(row, column, value)
+            updated += 1
+    db.session.commit()
+    return updated
+
+
+def collect_stale_spools(grace=timedelta(hours=24), dry_run=False):
+    """
+    Deletes spool files older than `grace` that no pending row refers to, e.g.
+    a profile picture uploaded but never saved with the profile form.
+
+    Returns:
+        list: The spool file names that were (or, with dry_run, would be) removed.
+    """
+    folder = spool_dir()
+    referenced = set()
+    for model, column, *_ in PENDING_COLUMNS:
+        for (value,) in db.session.query(getattr(model, column)).filter(getattr(model, column).like(f"{PENDING_PREFIX}%")):
+            referenced.add(f"{value[len(PENDING_PREFIX):]}.upload")
+    cutoff = (datetime.utcnow() - grace).timestamp()
+
+    removed = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if name in referenced or not os.path.isfile(path) or os.path.getmtime(path) >= cutoff:
+            continue
+        if not dry_run:
+            os.remove(path)
+        removed.append(name)
+    return removed
+
+
+# -------------------------
+# Blob reference counting
+# -------------------------
+def register_blob(value, referenced=True):
+    """
+    Records a blob in `media_blobs`, adding one reference if `referenced`.
+    Joins the caller's transaction; the caller commits.
+
+    Uses a native upsert where the dialect has one, so two workers registering
+    the same new blob both end up counted.
+
+    Raises:
+        FileNotFoundError: The blob is not in the store (e.g. `media:gc` removed
+            an identical orphan between encoding and registration).
+    """
+    path = os.path.join(media_store_path(), *blob_relpath(value).split('/'))
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Blob {value} is missing from the media store")
+    digest, extension = os.path.splitext(value)
+    increment = 1 if referenced else 0
+    row = dict(
+        digest=digest,
+        extension=extension.lstrip('.'),
+        size_bytes=os.path.getsize(path),
+        ref_count=increment,
+        date_released=None if referenced else datetime.utcnow()
+    )
+    table = MediaBlob.__table__
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        stmt = mysql.insert(table).values(**row)
+        db.session.execute(stmt.on_duplicate_key_update(ref_count=table.c.ref_count + stmt.inserted.ref_count))
+        return
+    if dialect == 'sqlite':
+        stmt = sqlite.insert(table).values(**row)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.digest],
+            set_={'ref_count': table.c.ref_count + stmt.excluded.ref_count}
+        ))
+        return
+    # No native upsert: a concurrent insert raises IntegrityError and the caller retries
+    updated = db.session.execute(
+        update(table).where(table.c.digest == digest).values(ref_count=table.c.ref_count + increment)
+    ).rowcount
+    if not updated:
+        db.session.execute(insert(table).values(**row))
+
+
+def release_blob(value):
+    """
+    Drops one reference to a blob. Legacy filenames, pending tokens and None are
+    ignored. The file itself is only deleted by `collect_orphan_blobs`.
+    Joins the caller's transaction; the caller commits.
+    """
+    if not is_blob(value):
+        return
+    MediaBlob.query.filter_by(digest=os.path.splitext(value)[0]).update(
+        {MediaBlob.ref_count: MediaBlob.ref_count - 1, MediaBlob.date_released: datetime.utcnow()},
+        synchronize_session=False
+    )
+
+
+def collect_orphan_blobs(grace=timedelta(hours=24), dry_run=False):
+    """
+    Deletes blobs (and their variants) that have had no references for longer
+    than `grace`. The grace period covers uploads that are encoded but whose
+    row update has not been committed yet.
+
+    Returns:
+        list: The digests that were (or, with dry_run, would be) removed.
+    """
+    cutoff = datetime.utcnow() - grace
+    orphans = db.session.query(MediaBlob.digest, MediaBlob.extension).filter(
+        MediaBlob.ref_count <= 0,
+        MediaBlob.date_released < cutoff
+    ).all()
+
+    removed = []
+    for digest, extension in orphans:
+        value = f"{digest}.{extension}"
+        if not dry_run:
+            # Delete the row first, guarded on the count, so a blob that was
+            # re-referenced in the meantime survives.
+            deleted = MediaBlob.query.filter(
+                MediaBlob.digest == digest, MediaBlob.ref_count <= 0
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            if not deleted:
+                continue
+            path = os.path.join(media_store_path(), *blob_relpath(value).split('/'))
+            if os.path.exists(path):
+                os.remove(path)
+            shutil.rmtree(variants_dir_for(path), ignore_errors=True)
+        removed.append(digest)
+    return removed
+
+
+def collect_legacy_orphans(grace=timedelta(hours=24), dry_run=False):
+    """
+    Deletes name-addressed discourse images that no discourse references any
+    more (they used to be removed inline by `update_discourse`).
+
+    Returns:
+        list: The filenames that were (or, with dry_run, would be) removed.
+    """
+    folder_path = os.path.join(current_app.static_folder, 'uploads', 'discourse_images')
+    if not os.path.isdir(folder_path):
+        return []
+    referenced = {
+        value[len(PENDING_PREFIX):] if is_pending(value) else value
+        for (value,) in db.session.query(DiscourseBlog.featured_image)
+                                  .filter(DiscourseBlog.featured_image.isnot(None))
+    }
+    cutoff = (datetime.utcnow() - grace).timestamp()
+
+    removed = []
+    for entry in os.scandir(folder_path):
+        if not entry.is_file() or entry.name in referenced or entry.stat().st_mtime > cutoff:
+            continue
+        if not dry_run:
+            os.remove(entry.path)
+            shutil.rmtree(variants_dir_for(entry.path), ignore_errors=True)
+        removed.append(entry.name)
+    return removed
+
+
+def list_variant_sources():
+    """
+    Lists every original image in the `VARIANT_FOLDERS` and the media store
+    (variant folders excluded).
+    """
+    paths = []
+    for folder in VARIANT_FOLDERS:
+        folder_path = os.path.join(current_app.static_folder, *folder.split('/'))
+        if not os.path.isdir(folder_path):
+            continue
+        for entry in os.scandir(folder_path):
+            if entry.is_file() and entry.name.lower().endswith(('.webp', '.png', '.jpg', '.jpeg')):
+                paths.append(entry.path)
+
+    for dirpath, dirnames, filenames in os.walk(media_store_path()):
+        if VARIANTS_DIR_NAME in dirnames:
+            dirnames.remove(VARIANTS_DIR_NAME)
+        paths.extend(os.path.join(dirpath, name) for name in filenames if is_blob(name))
+    return sorted(paths)
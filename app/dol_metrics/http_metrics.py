@@ -0,0 +1,279 @@
+# /project_folder/app/dol_metrics/http_metrics.py
+
+"""
+Instrumentation for outbound HTTP calls (lit_utils.safe_fetch and the USCCB
+readings client).
+
+Every call is recorded twice:
+
+- in the /metrics registry: per-host latency histograms, response bytes,
+  call counts by outcome (`ok` or the safe_fetch error `kind`), and cache
+  hits/misses of the safe_fetch TTL cache;
+- as one JSON line in the call log, which `flask http:summary` reads back
+  to summarize or list recent calls from any process.
+
+Rotating one file from several worker processes is not safe (each worker
+renames it under the others), so every process appends to its own file next
+to HTTP_CALL_LOG: `instance/http_calls.jsonl` becomes
+`instance/http_calls.<pid>.jsonl`, rotated at HTTP_CALL_LOG_MAX_BYTES with
+one backup. A worker forked after create_app switches to its own file on its
+first call. Files of processes that are gone are removed once they have not
+been written for LOG_RETENTION seconds; `read_call_log` merges the rest by
+time.
+
+Query strings are dropped from logged URLs.
+"""
+
+import glob
+import json
+import logging
+import math
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from urllib.parse import urlsplit
+
+from .metrics_utils import _process_alive, registry
+
+DEFAULT_LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_RETENTION = 7 * 24 * 60 * 60  # Seconds a finished process's call log is kept
+OK = 'ok'
+
+CALL_LATENCY = registry.histogram(
+    'http_client_request_duration_seconds', 'Outbound HTTP call latency, by host and client.', ('host', 'client'))
+CALLS = registry.counter(
+    'http_client_requests_total', 'Outbound HTTP calls, by host and outcome (ok or error kind).',
+    ('host', 'client', 'outcome'))
+RESPONSE_BYTES = registry.counter(
+    'http_client_response_bytes_total', 'Bytes received from outbound HTTP calls, by host.', ('host', 'client'))
+CACHE_LOOKUPS = registry.counter(
+    'http_client_cache_total', 'Outbound-call cache lookups, by cache and result (hit or miss).', ('cache', 'result'))
+
+# A child of the Flask app logger; propagation is switched off once it has its file
+call_logger = logging.getLogger('app.http_calls')
+
+
+def _process_log_path(log_path, pid):
+    root, ext = os.path.splitext(log_path)
+    return f"{root}.{pid}{ext}"
+
+
+def _process_log_paths(log_path):
+    """Yields `(pid, path)` for every per-process call log (and backup) of HTTP_CALL_LOG."""
+    root, ext = os.path.splitext(log_path)
+    for path in glob.glob(f"{glob.escape(root)}.*{ext}*"):
+        pid = path[len(root) + 1:].split('.', 1)[0]
+        if pid.isdigit() and path[len(root) + 1 + len(pid):] in (ext, f"{ext}.1"):
+            yield int(pid), path
+
+
+class ProcessCallLogHandler(RotatingFileHandler):
+    """
+    Appends to this process's own call log, so size-based rotation only ever
+    races with itself. After a fork the child reopens under its own pid.
+    """
+
+    def __init__(self, log_path, max_bytes):
+        self.log_path = log_path
+        self.pid = os.getpid()
+        super().__init__(_process_log_path(log_path, self.pid), encoding='utf-8',
+                         backupCount=1, maxBytes=max_bytes, delay=True)
+
+    def emit(self, record):
+        if self.pid != os.getpid():
+            self.acquire()
+            try:
+                if self.pid != os.getpid():
+                    if self.stream is not None:
+                        self.stream.close()  # The child's copy of the parent's file; flushed after every record
+                        self.stream = None
+                    self.pid = os.getpid()
+                    self.baseFilename = _process_log_path(self.log_path, self.pid)
+            finally:
+                self.release()
+        super().emit(record)
+
+
+def prune_call_logs(log_path, retention=LOG_RETENTION):
+    """
+    Removes the call logs of processes that have exited and have not written
+    for `retention` seconds.
+
+    Returns:
+        int: Number of files removed.
+    """
+    removed = 0
+    cutoff = time.time() - retention
+    for pid, path in _process_log_paths(log_path):
+        try:
+            if pid != os.getpid() and os.path.getmtime(path) < cutoff and not _process_alive(pid):
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue  # Removed by another worker meanwhile
+    return removed
+
+
+def init_http_metrics(app):
+    """Attaches the per-process call-log file (once per path). Called from create_app."""
+    log_path = app.config.get('HTTP_CALL_LOG')
+    if not log_path:
+        return
+    log_path = os.path.abspath(log_path)
+    if any(getattr(h, 'log_path', None) == log_path for h in call_logger.handlers):
+        return
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    prune_call_logs(log_path)
+    handler = ProcessCallLogHandler(log_path, app.config.get('HTTP_CALL_LOG_MAX_BYTES', DEFAULT_LOG_MAX_BYTES))
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    call_logger.addHandler(handler)
+    call_logger.setLevel(logging.INFO)
+    call_logger.propagate = False
+
+
+def host_of(url):
+    return urlsplit(url).hostname or 'unknown'
+
+
+def record_call(url, method, seconds, *, client, status=None, nbytes=0, outcome=OK, cache=None):
+    """
+    Records one outbound call.
+
+    Args:
+        url (str): The requested URL (the query string is not logged).
+        method (str): HTTP method.
+        seconds (float): Wall time of the call, or None for a cache hit.
+        client (str): Which caller made it, e.g. 'safe_fetch' or 'usccb'.
+        status (int): HTTP status, if a response arrived.
+        nbytes (int): Response body size.
+        outcome (str): 'ok' or an error kind ('network_error', 'http_error', ...).
+        cache (str): 'hit', 'miss' or None when the call was not cacheable.
+    """
+    host = host_of(url)
+    if seconds is not None:
+        CALL_LATENCY.observe(seconds, (host, client))
+        CALLS.inc((host, client, outcome))
+        if nbytes:
+            RESPONSE_BYTES.inc((host, client), nbytes)
+    if cache is not None:
+        CACHE_LOOKUPS.inc((client, cache))
+
+    if call_logger.handlers:
+        parts = urlsplit(url)
+        call_logger.info(json.dumps({
+            'time': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z',
+            'client': client,
+            'method': method.upper(),
+            'host': host,
+            'path': parts.path,
+            'ms': None if seconds is None else round(seconds * 1000, 1),
+            'status': status,
+            'bytes': nbytes,
+            'outcome': outcome,
+            'cache': cache,
+        }, separators=(',', ':')))
+
+
+class TimedCall:
+    """
+    Times a block and records it as one call; the block fills in the result.
+
+    Usage:
+        with TimedCall(url, 'GET', client='usccb') as call:
+            response = session.get(url)
+            call.status, call.nbytes = response.status_code, len(response.content)
+    """
+
+    def __init__(self, url, method, *, client, cache=None):
+        self.url, self.method, self.client, self.cache = url, method, client, cache
+        self.status = None
+        self.nbytes = 0
+        self.outcome = OK
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.outcome == OK:
+            self.outcome = 'network_error'
+        record_call(self.url, self.method, time.perf_counter() - self._start, client=self.client,
+                    status=self.status, nbytes=self.nbytes, outcome=self.outcome, cache=self.cache)
+        return False
+
+
+# -------------------------
+# Reading the call log back
+# -------------------------
+def read_call_log(log_path, last=None):
+    """
+    Returns the most recent logged calls of all processes, oldest first,
+    including the rotated files.
+
+    Args:
+        log_path (str): HTTP_CALL_LOG.
+        last (int): Keep only this many of the newest records.
+    """
+    log_path = os.path.abspath(log_path)
+    paths = [path for _, path in _process_log_paths(log_path)]
+    paths += [f"{log_path}.1", log_path]  # Written by versions before the per-process files
+    records = []
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue  # A line still being written
+        except FileNotFoundError:
+            continue
+    records.sort(key=lambda record: record.get('time') or '')
+    return records[-last:] if last else records
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def summarize_calls(records):
+    """
+    Aggregates call records per (client, host).
+
+    Returns:
+        list: Dictionaries with client, host, calls, p50/p95/p99/max ms, bytes,
+              outcomes (Counter) and cache_hit_rate (None when nothing was cacheable).
+    """
+    groups = defaultdict(lambda: {'latencies': [], 'bytes': 0, 'outcomes': Counter(), 'cache': Counter()})
+    for record in records:
+        group = groups[(record.get('client'), record.get('host'))]
+        if record.get('cache'):
+            group['cache'][record['cache']] += 1
+        if record.get('ms') is None:
+            continue  # Served from the cache, no call made
+        group['latencies'].append(record['ms'])
+        group['bytes'] += record.get('bytes') or 0
+        group['outcomes'][record.get('outcome') or OK] += 1
+
+    summary = []
+    for (client, host), group in sorted(groups.items(), key=lambda item: -len(item[1]['latencies'])):
+        latencies = sorted(group['latencies'])
+        lookups = sum(group['cache'].values())
+        summary.append({
+            'client': client,
+            'host': host,
+            'calls': len(latencies),
+            'p50_ms': _percentile(latencies, 0.50),
+            'p95_ms': _percentile(latencies, 0.95),
+            'p99_ms': _percentile(latencies, 0.99),
+            'max_ms': latencies[-1] if latencies else None,
+            'bytes': group['bytes'],
+            'outcomes': group['outcomes'],
+            'cache_hit_rate': group['cache']['hit'] / lookups if lookups else None,
+        })
+    return summary
@@ -0,0 +1,116 @@
+# /project_folder/app/dol_metrics/metrics_routes.py
+
+"""
+Request instrumentation and the Prometheus scrape endpoint.
+
+Every request is recorded under its endpoint name (e.g. `discourse.dialogues`),
+never its raw path, so label cardinality stays bounded; unmatched URLs are
+recorded as `<unmatched>`. `/metrics` itself is not instrumented.
+
+Settings:
+    METRICS_ENABLED         Record and expose metrics (default True).
+    METRICS_TOKEN           /metrics requires `Authorization: Bearer <token>`. Without a
+                            token /metrics answers 404, except in debug or testing,
+                            where it is open: the metrics name endpoints, outbound
+                            hosts, slow queries and pool state, which a public site
+                            must not show to anyone who asks.
+    METRICS_MULTIPROC_DIR   Aggregate across pre-fork workers (see metrics_utils).
+    METRICS_FLUSH_INTERVAL  Seconds between a worker's writes in multiprocess mode.
+"""
+
+import hmac
+import time
+
+from flask import Blueprint, Response, current_app, g, request, abort
+
+from .metrics_utils import (
+    registry, MultiprocessStore, render_prometheus, SIZE_BUCKETS, DEFAULT_FLUSH_INTERVAL
+)
+
+metrics_bp = Blueprint('metrics', __name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Time spent handling a request, by endpoint.', ('endpoint', 'method'))
+REQUESTS = registry.counter(
+    'http_requests_total', 'Requests handled, by endpoint and status code.', ('endpoint', 'method', 'status'))
+IN_FLIGHT = registry.gauge(
+    'http_requests_in_flight', 'Requests currently being handled, by endpoint.', ('endpoint',))
+RESPONSE_SIZE = registry.histogram(
+    'http_response_size_bytes', 'Response body size (when known), by endpoint.', ('endpoint',),
+    buckets=SIZE_BUCKETS)
+
+_stores = {}  # directory -> MultiprocessStore
+
+
+def _multiprocess_store():
+    directory = current_app.config.get('METRICS_MULTIPROC_DIR')
+    if not directory:
+        return None
+    store = _stores.get(directory)
+    if store is None:
+        store = _stores.setdefault(directory, MultiprocessStore(directory))
+    return store
+
+
+def _metrics_enabled():
+    return current_app.config.get('METRICS_ENABLED', True)
+
+
+@metrics_bp.before_app_request
+def start_request_timer():
+    if not _metrics_enabled() or request.endpoint == 'metrics.scrape':
+        return
+    store = _multiprocess_store()
+    if store is not None:
+        store.start(current_app.config.get('METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+    endpoint = request.endpoint or UNMATCHED_ENDPOINT
+    g._metrics = [time.perf_counter(), endpoint, False]  # start, endpoint, recorded
+    IN_FLIGHT.inc((endpoint,))
+
+
+@metrics_bp.after_app_request
+def record_request(response):
+    state = g.get('_metrics')
+    if state is not None:
+        start, endpoint, _ = state
+        REQUEST_LATENCY.observe(time.perf_counter() - start, (endpoint, request.method))
+        REQUESTS.inc((endpoint, request.method, str(response.status_code)))
+        if response.content_length is not None:
+            RESPONSE_SIZE.observe(response.content_length, (endpoint,))
+        state[2] = True
+    return response
+
+
+@metrics_bp.teardown_app_request
+def finish_request(exception):
+    state = g.pop('_metrics', None)
+    if state is None:
+        return
+    start, endpoint, recorded = state
+    if not recorded:
+        # An unhandled exception skipped after_request
+        REQUEST_LATENCY.observe(time.perf_counter() - start, (endpoint, request.method))
+        REQUESTS.inc((endpoint, request.method, '500'))
+    IN_FLIGHT.dec((endpoint,))
+
+
+@metrics_bp.route('/metrics')
+def scrape():
+    """Exposes all registered metrics in the Prometheus text format."""
+    if not _metrics_enabled():
+        abort(404)
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        if not (current_app.debug or current_app.testing):
+            abort(404)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        abort(401)
+
+    store = _multiprocess_store()
+    values = store.collect() if store is not None else registry.collect()
+    response = Response(render_prometheus(registry.families(), values), content_type=PROMETHEUS_CONTENT_TYPE)
+    response.cache_control.no_store = True
+    return response
@@ -0,0 +1,344 @@
+# /project_folder/app/dol_metrics/metrics_utils.py
+
+"""
+A small, dependency-free metrics registry with Prometheus text exposition.
+
+Recording is lock-free: every thread writes only to its own shard (a plain
+dict), so a request never waits on another request to count itself. Shards
+are merged when `/metrics` is scraped; shards of finished threads are folded
+into a "retired" total so counts survive thread turnover.
+
+Metric types:
+    Counter    monotonically increasing, `inc()`
+    Gauge      `inc()`/`dec()`, or `set_function()` to read a value at collection
+               (summed across threads and live processes)
+    Histogram  cumulative buckets plus _sum and _count, `observe()`
+
+Multiprocess mode (pre-fork servers such as gunicorn): when
+METRICS_MULTIPROC_DIR is set, every worker writes its merged totals to
+`<dir>/metrics-<pid>.json` every METRICS_FLUSH_INTERVAL seconds, and a
+scrape of any worker aggregates all files. Counters and histograms of exited
+workers keep counting (they must stay monotonic); their gauges are dropped.
+Empty the directory when the server (re)starts.
+
+Usage:
+    REQUESTS = registry.counter('app_things_total', 'Things done.', ('kind',))
+    REQUESTS.inc(('widget',))
+"""
+
+import atexit
+import glob
+import json
+import math
+import os
+import threading
+from bisect import bisect_left
+
+DEFAULT_FLUSH_INTERVAL = 5  # seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class _Shard:
+    """The values recorded by one thread: {(name, label_values): number_or_list}."""
+
+    __slots__ = ('thread', 'values')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.values = {}
+
+
+def _merge_into(target, values):
+    for key, value in values.items():
+        if isinstance(value, list):
+            current = target.get(key)
+            target[key] = list(value) if current is None else [a + b for a, b in zip(current, value)]
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        values = self._registry._values()
+        key = (self.name, labels)
+        values[key] = values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A gauge built from increments, e.g. requests in flight. There is no `set()`:
+    values from different threads are summed. A gauge of state that already
+    exists elsewhere (e.g. pool sizes) can instead be read when collected,
+    with `set_function`."""
+    type = 'gauge'
+
+    def set_function(self, function):
+        """
+        Reports `function()` at every collection.
+
+        Args:
+            function (callable): Returns {label_values: number}.
+        """
+        with self._registry._lock:
+            self._registry._callbacks[self.name] = function
+
+    def inc(self, labels=(), amount=1):
+        values = self._registry._values()
+        key = (self.name, labels)
+        values[key] = values.get(key, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        values = self._registry._values()
+        key = (self.name, labels)
+        counts = values.get(key)
+        if counts is None:
+            # One slot per bucket, one for +Inf, then the running sum
+            counts = values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+
+class MetricsRegistry:
+    """Holds the metric families and the per-thread shards of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families = {}
+        self._callbacks = {}  # gauge name -> function, see Gauge.set_function
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # A forked worker must not report the parent's counts as its own
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+
+    def _values(self):
+        """The calling thread's own value dict (the only dict it ever writes to)."""
+        try:
+            return self._local.values
+        except AttributeError:
+            shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+            self._local.values = shard.values
+            return shard.values
+
+    # --- Declaring metrics ---------------------------------------------------
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._families.get(name)
+            if metric is None:
+                metric = self._families[name] = cls(self, name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric '{name}' is already registered as a {metric.type}.")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    # --- Reading -----------------------------------------------------------
+    def collect(self):
+        """
+        Merges the shards of every thread in this process.
+
+        Returns:
+            dict: {(name, label_values): number, or histogram slot list}
+        """
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                else:
+                    # A finished thread can't write any more; fold it in for good
+                    _merge_into(self._retired, dict(shard.values))
+            self._shards = live
+            merged = {}
+            _merge_into(merged, self._retired)
+            callbacks = list(self._callbacks.items())
+        for shard in live:
+            _merge_into(merged, dict(shard.values))  # dict() copies atomically under the GIL
+        for name, function in callbacks:
+            _merge_into(merged, {(name, labels): value for labels, value in function().items()})
+        return merged
+
+    def families(self):
+        with self._lock:
+            return dict(self._families)
+
+
+registry = MetricsRegistry()
+
+
+# -------------------------
+# Multiprocess aggregation
+# -------------------------
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MultiprocessStore:
+    """Shares each worker's totals through one JSON file per process."""
+
+    def __init__(self, directory, metrics_registry=registry):
+        self.directory = directory
+        self.registry = metrics_registry
+        self._started_pid = None
+        self._stop = threading.Event()
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def write(self):
+        """Writes this process's merged totals (atomically replacing its previous file)."""
+        entries = [[name, list(labels), value] for (name, labels), value in self.registry.collect().items()]
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def start(self, interval=DEFAULT_FLUSH_INTERVAL):
+        """Starts the periodic writer for this process (once per pid)."""
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        self._stop = threading.Event()
+        thread = threading.Thread(target=self._run, args=(interval,), name='metrics-flush', daemon=True)
+        thread.start()
+        atexit.register(self.write)
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.write()
+            except OSError:
+                pass  # Retried on the next tick
+
+    def collect(self, fresh=True):
+        """
+        Merges the files of all workers, with this process's own values fresh.
+
+        Args:
+            fresh (bool): Write this process's file first; False only reads
+                (e.g. from a CLI command, which is not a worker).
+
+        Returns:
+            dict: Same shape as `MetricsRegistry.collect`.
+        """
+        if fresh:
+            self.write()
+        gauges = {name for name, metric in self.registry.families().items() if metric.type == 'gauge'}
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+                with open(path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (ValueError, OSError):
+                continue  # A file being replaced, or not ours
+            alive = _process_alive(pid)
+            _merge_into(merged, {
+                (name, tuple(labels)): value
+                for name, labels, value in entries
+                if alive or name not in gauges
+            })
+        return merged
+
+
+# -------------------------
+# Prometheus text format
+# -------------------------
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labelnames, label_values, extra=()):
+    pairs = list(zip(labelnames, label_values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def render_prometheus(families, values):
+    """
+    Formats merged values in the Prometheus text exposition format (0.0.4).
+
+    Args:
+        families (dict): name -> metric, from `MetricsRegistry.families()`.
+        values (dict): From `collect()`.
+
+    Returns:
+        str: The exposition text.
+    """
+    by_name = {}
+    for (name, labels), value in values.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(families):
+        metric = families[name]
+        lines.append(f"# HELP {name} {_escape(metric.documentation)}")
+        lines.append(f"# TYPE {name} {metric.type}")
+        for labels, value in sorted(by_name.get(name, ()), key=lambda item: tuple(map(str, item[0]))):
+            labels = tuple(labels)
+            if metric.type != 'histogram':
+                lines.append(f"{name}{_label_text(metric.labelnames, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (math.inf,), value[:-1]):
+                cumulative += count
+                le = _label_text(metric.labelnames, labels, (('le', _number(float(bound))),))
+                lines.append(f"{name}_bucket{le} {cumulative}")
+            label_text = _label_text(metric.labelnames, labels)
+            lines.append(f"{name}_sum{label_text} {_number(value[-1])}")
+            lines.append(f"{name}_count{label_text} {cumulative}")
+    return '\n'.join(lines) + '\n'
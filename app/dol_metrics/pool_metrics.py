@@ -0,0 +1,89 @@
+# /project_folder/app/dol_metrics/pool_metrics.py
+
+"""
+Connection-pool telemetry for every SQLAlchemy engine of the app.
+
+- `db_pool_checkout_seconds`: time to get a connection out of the pool,
+  including the wait for a free one, opening a new one and the pre-ping.
+  Recorded by `TimedQueuePool`, the pool class set by dol_db/engine.py.
+- `db_pool_timeouts_total`: checkouts that gave up after DB_POOL_TIMEOUT.
+- `db_pool_checked_out`, `db_pool_overflow`, `db_pool_size`: read from the
+  pools whenever metrics are collected.
+- `db_pool_invalidated_total`: connections thrown away after an error
+  (e.g. a MySQL connection that went away).
+
+Engines are labelled by their pool logging name: `primary`, `replica_1`, ...
+"""
+
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from .metrics_utils import registry
+
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CHECKOUT_LATENCY = registry.histogram(
+    'db_pool_checkout_seconds', 'Time to check a connection out of the pool, by engine.', ('engine',),
+    buckets=POOL_WAIT_BUCKETS)
+TIMEOUTS = registry.counter(
+    'db_pool_timeouts_total', 'Checkouts that timed out waiting for a free connection, by engine.', ('engine',))
+INVALIDATED = registry.counter(
+    'db_pool_invalidated_total', 'Pooled connections discarded after an error, by engine.', ('engine',))
+CHECKED_OUT = registry.gauge(
+    'db_pool_checked_out', 'Connections currently checked out of the pool, by engine.', ('engine',))
+OVERFLOW = registry.gauge(
+    'db_pool_overflow', 'Connections open beyond the pool size (negative: pool not yet filled), by engine.',
+    ('engine',))
+POOL_SIZE = registry.gauge(
+    'db_pool_size', 'Configured number of persistent connections, by engine.', ('engine',))
+
+
+def _pool_name(pool):
+    return pool.logging_name or 'primary'
+
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool that records how long each checkout took."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            TIMEOUTS.inc((_pool_name(self),))
+            raise
+        finally:
+            CHECKOUT_LATENCY.observe(time.perf_counter() - start, (_pool_name(self),))
+
+
+_engines = {}  # engine label -> Engine, for the collection-time gauges
+
+
+def _pool_values(read):
+    values = {}
+    for name, engine in list(_engines.items()):
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            values[(name,)] = read(pool)
+    return values
+
+
+def _count_invalidations(name):
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        INVALIDATED.inc((name,))
+    return on_invalidate
+
+
+def init_pool_metrics(app, db):
+    """Registers the engines of an app for pool telemetry. Called from create_app."""
+    if not _engines:
+        CHECKED_OUT.set_function(lambda: _pool_values(lambda pool: pool.checkedout()))
+        OVERFLOW.set_function(lambda: _pool_values(lambda pool: pool.overflow()))
+        POOL_SIZE.set_function(lambda: _pool_values(lambda pool: pool.size()))
+    with app.app_context():
+        for key, engine in db.engines.items():
+            name = engine.pool.logging_name or key or 'primary'
+            _engines[name] = engine  # The latest app's engine wins (tests and CLI create several)
+            event.listen(engine, 'invalidate', _count_invalidations(name))
@@ -0,0 +1,240 @@
+# /project_folder/app/dol_metrics/profiling.py
+
+"""
+On-demand profiling of a single request or of a route under repeated load.
+
+The output format picks the profiler:
+
+- `speedscope` (default) and `collapsed`: a background thread samples the
+  request thread's stack every PROFILER_INTERVAL_MS, giving real call stacks
+  as speedscope JSON or collapsed stacks (flamegraph.pl, inferno, speedscope);
+- `pstats`: deterministic cProfile, as a text report sorted by cumulative time.
+
+In production, with PROFILER_ENABLED set, an admin can append
+`?__profile=1` (optionally `&__profile_format=collapsed|speedscope|pstats`)
+to any URL and gets the profile back instead of the page. Without
+PROFILER_ENABLED no hook is installed at all, so ordinary requests pay
+nothing. `flask profile-route` does the same offline through the test client.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import Response, g, request
+
+DEFAULT_INTERVAL_MS = 1
+FORMATS = ('speedscope', 'collapsed', 'pstats')
+PROFILE_PARAM = '__profile'
+FORMAT_PARAM = '__profile_format'
+
+# The GIL switch interval is process-wide, so overlapping samplers share it:
+# it is lowered to the shortest active interval and restored by the last one out
+_switch_lock = threading.Lock()
+_switch_original = None
+_switch_active = Counter()  # sampling interval -> running samplers
+
+
+def _acquire_switch_interval(interval):
+    global _switch_original
+    with _switch_lock:
+        if not _switch_active:
+            _switch_original = sys.getswitchinterval()
+        _switch_active[interval] += 1
+        sys.setswitchinterval(min(_switch_original, *_switch_active))
+
+
+def _release_switch_interval(interval):
+    with _switch_lock:
+        _switch_active[interval] -= 1
+        if _switch_active[interval] <= 0:
+            del _switch_active[interval]
+        sys.setswitchinterval(min(_switch_original, *_switch_active) if _switch_active else _switch_original)
+
+
+class StackSampler:
+    """Periodically records the call stack of one thread."""
+
+    def __init__(self, thread_id=None, interval=DEFAULT_INTERVAL_MS / 1000):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()   # tuple of (function, file, line) root -> leaf -> samples
+        self.weights = Counter()  # same key -> seconds
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def start(self):
+        # The sampler only runs when the GIL is handed over, every 5 ms by default
+        _acquire_switch_interval(self.interval)
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        _release_switch_interval(self.interval)
+        self.duration = time.perf_counter() - self._started
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack = tuple(reversed(stack))
+            self.stacks[stack] += 1
+            self.weights[stack] += now - last
+            last = now
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+
+def _frame_label(frame):
+    name, filename, line = frame
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def to_collapsed(sampler):
+    """Brendan Gregg's collapsed-stack format: 'root;child;leaf <samples>' per line."""
+    lines = [f"{';'.join(_frame_label(f) for f in stack)} {count}"
+             for stack, count in sampler.stacks.most_common()]
+    return '\n'.join(lines) + '\n'
+
+
+def to_speedscope(sampler, name):
+    """A speedscope 'sampled' profile (https://www.speedscope.app/file-format-schema.json)."""
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, seconds in sampler.weights.items():
+        ids = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+            ids.append(index[frame])
+        samples.append(ids)
+        weights.append(round(seconds * 1000, 3))
+    return json.dumps({
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'exporter': 'dialogues profiler',
+        'name': name,
+        'activeProfileIndex': 0,
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': round(sum(weights), 3),
+            'samples': samples,
+            'weights': weights,
+        }],
+    })
+
+
+def pstats_text(profile, limit=40):
+    stream = io.StringIO()
+    pstats.Stats(profile, stream=stream).strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+class RouteProfiler:
+    """Runs one profiler around a block and renders the result in the requested format."""
+
+    def __init__(self, fmt='speedscope', interval_ms=DEFAULT_INTERVAL_MS):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown profile format '{fmt}'; use one of {', '.join(FORMATS)}.")
+        self.format = fmt
+        self.interval_ms = interval_ms
+        self._profiler = None
+
+    def start(self):
+        if self.format == 'pstats':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = StackSampler(interval=self.interval_ms / 1000)
+            self._profiler.start()
+
+    def stop(self):
+        if self.format == 'pstats':
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+
+    def render(self, name):
+        """
+        Returns:
+            tuple: (body_text, mimetype, file_extension)
+        """
+        if self.format == 'pstats':
+            return pstats_text(self._profiler), 'text/plain', 'txt'
+        if self.format == 'collapsed':
+            return to_collapsed(self._profiler), 'text/plain', 'collapsed.txt'
+        return to_speedscope(self._profiler, name), 'application/json', 'speedscope.json'
+
+
+def _is_admin(user):
+    return getattr(user, 'is_authenticated', False) and user.has_role('Admin')
+
+
+def init_profiler(app):
+    """
+    Installs the `?__profile=1` hooks, only when PROFILER_ENABLED is set.
+    Called from create_app.
+    """
+    if not app.config.get('PROFILER_ENABLED'):
+        return
+
+    from flask_login import current_user
+
+    @app.before_request
+    def start_profiling():
+        if PROFILE_PARAM not in request.args or not _is_admin(current_user):
+            return
+        fmt = request.args.get(FORMAT_PARAM, 'speedscope')
+        if fmt not in FORMATS:
+            return
+        profiler = RouteProfiler(fmt, app.config.get('PROFILER_INTERVAL_MS', DEFAULT_INTERVAL_MS))
+        g._route_profiler = profiler
+        profiler.start()
+
+    @app.after_request
+    def return_profile(response):
+        profiler = g.pop('_route_profiler', None)
+        if profiler is None:
+            return response
+        profiler.stop()
+        name = f"{request.method} {request.full_path.rstrip('?')}"
+        body, mimetype, extension = profiler.render(name)
+        app.logger.info(f"[PROFILE] {name} profiled by {current_user.email} ({profiler.format})")
+        profiled = Response(body, mimetype=mimetype)
+        profiled.headers['Content-Disposition'] = \
+            f'attachment; filename="profile-{request.endpoint or "request"}.{extension}"'
+        profiled.headers['X-Profiled-Status'] = str(response.status_code)
+        profiled.cache_control.no_store = True
+        return profiled
@@ -0,0 +1,212 @@
+# /project_folder/app/dol_metrics/sql_metrics.py
+
+"""
+Per-request SQL instrumentation.
+
+Cursor-execute hooks on every SQLAlchemy engine count and time each statement.
+Per request they keep the number of statements, the time spent in the
+database and how often each statement *shape* ran (the SQL with parameter
+placeholders and IN-lists collapsed). At the end of the request:
+
+- a shape that ran SQL_NPLUS1_THRESHOLD times or more is logged as a likely
+  N+1, with the route and the first application stack frame that issued it;
+- with SQL_SERVER_TIMING, a `Server-Timing: db;dur=...` header is added, so
+  the browser's network panel shows the database share of each response.
+
+Any statement slower than SQL_SLOW_QUERY_MS is appended to the slow-query
+log (SQL_SLOW_QUERY_LOG, JSON lines; parameters are never logged). Statement
+counts and latencies also feed the /metrics registry, labelled by endpoint
+(`<background>` outside a request, e.g. the view-count flush thread).
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics_utils import registry
+
+DEFAULT_SLOW_QUERY_MS = 200
+DEFAULT_NPLUS1_THRESHOLD = 5
+BACKGROUND_ENDPOINT = '<background>'
+SHAPE_MAX_LENGTH = 500
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRICS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+QUERY_LATENCY = registry.histogram(
+    'db_query_duration_seconds', 'Time spent executing SQL statements, by endpoint and operation.',
+    ('endpoint', 'operation'))
+QUERIES_PER_REQUEST = registry.histogram(
+    'db_queries_per_request', 'SQL statements issued per request, by endpoint.', ('endpoint',),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250))
+SLOW_QUERIES = registry.counter(
+    'db_slow_queries_total', 'Statements slower than SQL_SLOW_QUERY_MS, by endpoint.', ('endpoint',))
+NPLUS1 = registry.counter(
+    'db_n_plus_one_total', 'Requests with a repeated statement shape (likely N+1), by endpoint.', ('endpoint',))
+
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])"
+_IN_LIST = re.compile(r"\(\s*" + _PLACEHOLDER + r"(?:\s*,\s*" + _PLACEHOLDER + r")*\s*\)")
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+# A child of the Flask app logger ('app'): without a log file it goes wherever app.logger goes
+slow_query_logger = logging.getLogger('app.slow_sql')
+
+
+class RequestSQLStats:
+    """What one request did in the database."""
+
+    __slots__ = ('count', 'seconds', 'shapes', 'origins')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.origins = {}  # shape -> origin frame, captured when the N+1 threshold is crossed
+
+
+def statement_shape(statement):
+    """Normalizes a statement so repeated executions with different parameters compare equal."""
+    shape = _WHITESPACE.sub(' ', statement).strip()
+    shape = _IN_LIST.sub('(?...)', shape)
+    shape = _NUMBER.sub('?', shape)
+    return shape[:SHAPE_MAX_LENGTH]
+
+
+def _operation(statement):
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else 'UNKNOWN'
+
+
+def application_frame():
+    """
+    Returns 'path:line in function' for the innermost frame in application code
+    (outside dol_metrics and third-party packages), or None.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(APP_ROOT) and not filename.startswith(METRICS_DIR):
+            return f"{os.path.relpath(filename, os.path.dirname(APP_ROOT))}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def _endpoint():
+    return (request.endpoint or '<unmatched>') if has_request_context() else BACKGROUND_ENDPOINT
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    settings = _settings
+    if not settings.get('enabled', True):
+        return
+
+    endpoint = _endpoint()
+    QUERY_LATENCY.observe(elapsed, (endpoint, _operation(statement)))
+
+    shape = None
+    stats = g.get('_sql_stats') if has_request_context() else None
+    if stats is not None:
+        shape = statement_shape(statement)
+        stats.count += 1
+        stats.seconds += elapsed
+        stats.shapes[shape] += 1
+        if stats.shapes[shape] == settings['nplus1_threshold']:
+            stats.origins[shape] = application_frame()
+
+    if elapsed * 1000 >= settings['slow_query_ms']:
+        SLOW_QUERIES.inc((endpoint,))
+        slow_query_logger.warning(json.dumps({
+            'time': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z',
+            'ms': round(elapsed * 1000, 1),
+            'endpoint': endpoint,
+            'path': request.path if has_request_context() else None,
+            'origin': application_frame(),
+            'statement': shape or statement_shape(statement),
+        }))
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute never runs for a failed statement; drop its start time
+    conn = exception_context.connection
+    starts = conn.info.get('query_start') if conn is not None else None
+    if starts and exception_context.execution_context is not None:
+        starts.pop()
+
+
+_settings = {}
+_listening = False
+
+
+def init_sql_metrics(app):
+    """
+    Installs the cursor hooks (once per process) and this app's request hooks.
+    Called from create_app.
+    """
+    global _listening
+    _settings.update(
+        enabled=app.config.get('SQL_INSTRUMENTATION', True),
+        slow_query_ms=app.config.get('SQL_SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS),
+        nplus1_threshold=app.config.get('SQL_NPLUS1_THRESHOLD', DEFAULT_NPLUS1_THRESHOLD),
+    )
+    if not _listening:
+        # On the Engine class, so the main database and any bind are all covered
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _listening = True
+
+    log_path = app.config.get('SQL_SLOW_QUERY_LOG')
+    log_path = os.path.abspath(log_path) if log_path else None  # A bare filename has no dirname
+    if log_path and not any(getattr(h, 'baseFilename', None) == log_path for h in slow_query_logger.handlers):
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        handler = logging.FileHandler(log_path, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        slow_query_logger.addHandler(handler)
+        slow_query_logger.setLevel(logging.WARNING)
+        slow_query_logger.propagate = False
+
+    @app.before_request
+    def start_sql_stats():
+        if _settings['enabled']:
+            g._sql_stats = RequestSQLStats()
+
+    @app.after_request
+    def report_sql_stats(response):
+        stats = g.pop('_sql_stats', None)
+        if stats is None:
+            return response
+        endpoint = _endpoint()
+        QUERIES_PER_REQUEST.observe(stats.count, (endpoint,))
+
+        repeated = [(shape, n) for shape, n in stats.shapes.items() if n >= _settings['nplus1_threshold']]
+        if repeated:
+            NPLUS1.inc((endpoint,))
+            for shape, n in sorted(repeated, key=lambda item: item[1], reverse=True):
+                app.logger.warning(
+                    f"[SQL] Possible N+1 on {request.method} {request.path} ({endpoint}): "
+                    f"{n}x from {stats.origins.get(shape) or 'unknown origin'}: {shape[:200]}"
+                )
+
+        if app.config.get('SQL_SERVER_TIMING'):
+            timing = f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"'
+            existing = response.headers.get('Server-Timing')
+            response.headers['Server-Timing'] = f"{existing}, {timing}" if existing else timing
+        return response
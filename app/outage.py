@@ -0,0 +1,64 @@
+# /project_folder/app/outage.py
+
+"""
+The "Connecting to the Sanctuary..." page served while the database is down.
+
+The quote pool is parsed once and the page is rendered once, when the app is
+created, so the outage path (see handle_db_connection_error) only has to hand
+out the same bytes: no file I/O, CSV parsing or template rendering while
+worker threads are already stuck on database timeouts.
+"""
+
+from collections import namedtuple
+
+from flask import Response
+
+from .datafiles import load_data_csv
+
+QUOTES_FILE = 'Jesus_speaks.csv'
+DEFAULT_RETRY_AFTER = 30  # seconds
+
+Quote = namedtuple('Quote', 'text ref age')
+
+FALLBACK_QUOTES = (
+    Quote('Come to me, all you who are weary and burdened, and I will give you rest.', 'Matthew 11:28', ''),
+)
+
+
+def load_quote_pool():
+    """
+    Returns:
+        tuple: Quote(text, ref, age) for every quote in the CSV, or the fallback if it is missing.
+    """
+    rows = load_data_csv(QUOTES_FILE)
+    quotes = tuple(
+        Quote(row.get('Quote', ''), row.get('ref', ''), row.get('Age', ''))
+        for row in rows if row.get('Quote')
+    )
+    return quotes or FALLBACK_QUOTES
+
+
+def render_outage_page(app):
+    """
+    Renders the 503 page once. Called from create_app after the blueprints are
+    registered (the page links back to main.splash).
+
+    Note: the template is rendered directly rather than through render_template,
+    so no context processor (and therefore no database query) runs.
+
+    Returns:
+        bytes: The encoded HTML.
+    """
+    with app.test_request_context('/'):
+        quotes = load_quote_pool()
+        html = app.jinja_env.get_template('errors/503.html').render(quotes=quotes)
+    app.logger.info(f"Pre-rendered the outage page with {len(quotes)} quotes ({len(html)} chars)")
+    return html.encode('utf-8')
+
+
+def outage_response(body, retry_after=DEFAULT_RETRY_AFTER):
+    """Wraps the pre-rendered page in a 503 that clients retry and proxies never store."""
+    response = Response(body, status=503, mimetype='text/html')
+    response.headers['Retry-After'] = str(retry_after)
+    response.cache_control.no_store = True
+    return response
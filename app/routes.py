@@ -1,10 +1,12 @@
-import json
 import os
 from flask import Blueprint, render_template, current_app, request, jsonify,url_for,redirect, flash
 from datetime import datetime
-from PIL import Image
+from .dol_media.media_utils import (spool_image, dispatch_image, find_spooled_image, discard_image, is_pending,
+                                   PROFILE_PICTURE_FOLDER, PROFILE_PICTURE_SIZE)
 from .dol_db.dbops import create_user, get_user_by_email
-from .dol_db.models import DiscourseBlog, SubCategory, db
+from .datafiles import load_data_json
+from .dol_db.models import DiscourseBlog, SubCategory, User, db
+from .dol_db.user_cache import invalidate_user
 from sqlalchemy.orm import joinedload # Assuming you will use it
 from flask_jwt_extended import create_access_token, create_refresh_token
 from flask_login import login_user, logout_user, login_required, current_user
@@ -12,15 +14,6 @@ from flask_login import login_user, logout_user, login_required, current_user
 bp = Blueprint('main', __name__)
 
 
-def load_json_data(filename):
-    """Helper function to load data from the static/data folder."""
-    filepath = os.path.join(current_app.root_path, 'static', 'data', filename)
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return [] if 'json' in filename and 's' in filename else {}
-    
 @bp.app_context_processor
 def inject_now():
     """Makes the 'now' function available to all templates for the current year."""
@@ -28,10 +21,8 @@ def inject_now():
 
 @bp.context_processor
 def inject_shared_data():
-    """Injects data needed by the base layout into all templates."""
-    topics_data = load_json_data('topics.json')
-    daily_data = load_json_data('daily.json')
-    return dict(topics_data=topics_data, daily_data=daily_data)
+    """Injects data needed by the base layout into all templates (daily_data comes from the global snapshot)."""
+    return dict(topics_data=load_data_json('topics.json', default=()))
 
 
 @bp.route('/')
@@ -74,26 +65,27 @@ def upload_image():
 
     try:
         # --- MODIFIED SAVE PATH ---
-        # Create the target directory if it doesn't exist
         upload_folder = os.path.join(current_app.root_path, 'static', 'images', subfolder)
-        os.makedirs(upload_folder, exist_ok=True)
-        
         webp_filename = f"{safe_filename}.webp"
-        save_path = os.path.join(upload_folder, webp_filename)
 
-        with Image.open(file.stream) as img:
-            # Resize for profile pictures to a consistent size
-            if subfolder == 'profile_pics':
-                img.thumbnail((300, 300)) # Create a thumbnail, maintains aspect ratio
+        # Resize for profile pictures to a consistent size (maintains aspect ratio)
+        max_size = PROFILE_PICTURE_SIZE if subfolder == 'profile_pics' else None
 
-            img.save(save_path, 'webp', quality=85)
+        # Spool the upload and encode it in the background; the file appears
+        # under its final name once the worker is done. A profile picture is
+        # only dispatched when the profile form that uses it is saved, so the
+        # row can hold a pending token with the old picture as the fallback.
+        pending_image = spool_image(file, upload_folder, webp_filename, max_size=max_size)
+        if subfolder != 'profile_pics':
+            dispatch_image(pending_image)
         
         # Return the final filename to the client
         return jsonify({
             'status': 'success',
-            'message': f'Image saved as {webp_filename}',
-            'filename': webp_filename
-        })
+            'message': f'Image queued as {webp_filename}',
+            'filename': webp_filename,
+            'pending_image_id': pending_image.pending_id
+        }), 202
 
     except Exception as e:
         current_app.logger.error(f"Image upload failed: {e}")
@@ -118,33 +110,52 @@ def profile_page():
 def update_profile():
     """Handles the submission of the profile update form."""
     
+    # `current_user` is a read-only cached snapshot; load the model to write to it.
+    user = db.session.get(User, current_user.id)
+
     # Update the user's attributes directly from the form data.
     # The `request.form.get()` method is used to access form data.
-    current_user.name = request.form.get('name')
-    current_user.other_names = request.form.get('other_names')
-    current_user.contact = request.form.get('contact')
-    current_user.organization_name = request.form.get('organization_name')
-    current_user.website = request.form.get('website')
-    current_user.education = request.form.get('education')
-    current_user.career = request.form.get('career')
+    user.name = request.form.get('name')
+    user.other_names = request.form.get('other_names')
+    user.contact = request.form.get('contact')
+    user.organization_name = request.form.get('organization_name')
+    user.website = request.form.get('website')
+    user.education = request.form.get('education')
+    user.career = request.form.get('career')
     
+    # Shown again if the new picture can't be encoded (an earlier upload still pending has no file yet)
+    previous_picture = 'default.webp' if is_pending(user.profile_picture) else user.profile_picture
+    pending_picture = None
     new_picture_filename = request.form.get('profile_picture')
     if new_picture_filename:
-        current_user.profile_picture = new_picture_filename
+        # Uploaded through /upload-image, which spooled it without encoding it yet
+        upload_folder = os.path.join(current_app.static_folder, *PROFILE_PICTURE_FOLDER.split('/'))
+        pending_picture = find_spooled_image(upload_folder, new_picture_filename, max_size=PROFILE_PICTURE_SIZE)
+        user.profile_picture = pending_picture.token if pending_picture else new_picture_filename
 
     # Basic validation to ensure required fields aren't blanked out.
-    if not current_user.name or not current_user.other_names:
+    if not user.name or not user.other_names:
+        db.session.rollback()
+        discard_image(pending_picture)
         flash('First Name and Last Name are required fields.', 'danger')
         return redirect(url_for('main.profile_page'))
 
     try:
         # Commit the changes to the database
         db.session.commit()
-        flash('Your profile has been updated successfully!', 'success')
     except Exception as e:
         db.session.rollback()
+        discard_image(pending_picture)
         current_app.logger.error(f"Error updating profile for user {current_user.id}: {e}")
         flash('An error occurred while updating your profile. Please try again.', 'danger')
+        return redirect(url_for('main.profile_page'))
+
+    invalidate_user(user.id)
+    if pending_picture:
+        # Until it is encoded the picture shows a placeholder; if encoding fails the old one returns
+        dispatch_image(pending_picture, User, user.id, 'profile_picture',
+                       fallback=previous_picture, on_done=invalidate_user)
+    flash('Your profile has been updated successfully!', 'success')
 
     return redirect(url_for('main.profile_page'))
 
@@ -222,6 +233,7 @@ def login_page():
 @bp.route('/logout')
 @login_required
 def logout():
+    invalidate_user(current_user.id)
     logout_user()
     return redirect(url_for('main.splash'))
 
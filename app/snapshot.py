@@ -0,0 +1,172 @@
+# /project_folder/app/snapshot.py
+
+"""
+Cached snapshot of the data every layout page needs (see inject_global_data).
+
+The sidebar categories and `daily.json` used to be rebuilt on every
+`render_template`. They are now built once into an immutable snapshot,
+together with pre-serialized JSON for the page scripts, and reused until
+something changes:
+
+- a session that commits a write to a Category, SubCategory or to a
+  DiscourseBlog's listed fields bumps the snapshot version (which also keys
+  the cached pages of `/discourse/api/index`, the on-demand content listing);
+- `daily.json` comes from the shared data-file loader (datafiles.py), which
+  re-reads it when its modification time changes;
+- the version is the `snapshot` tag of the application cache (app/cache.py),
+  so with a shared cache backend a write in one worker reaches the others at
+  once; as a safety net for writes made outside the app, a snapshot is never
+  older than SNAPSHOT_MAX_AGE seconds.
+
+If the categories can't be read, the page gets the last good sidebar (or an
+empty one) and nothing is cached, so the next render tries again.
+"""
+
+import threading
+import time
+
+from jinja2.utils import htmlsafe_json_dumps
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, joinedload
+
+from .dol_db.models import Category, SubCategory, DiscourseBlog
+from .dol_db.routing import use_primary
+from .datafiles import load_data_json
+from .cache import cache
+
+DEFAULT_MAX_AGE = 60  # seconds
+SNAPSHOT_TAG = 'snapshot'
+
+# Writes to these models invalidate the snapshot. For DiscourseBlog only the
+# columns shown in the content listing matter, so comment counts, view counts
+# etc. don't.
+WATCHED_MODELS = {
+    Category: None,
+    SubCategory: None,
+    DiscourseBlog: ('title', 'subcategory_id', 'is_approved', 'date_posted'),
+}
+
+_lock = threading.Lock()
+_snapshot = None  # (version, built_at, data); kept in process, it is the template context itself
+
+
+class GlobalSnapshot(dict):
+    """Read-only template context shared by every render."""
+
+    def __setitem__(self, key, value):
+        raise TypeError("The global snapshot is read-only.")
+
+
+def bump_snapshot_version():
+    cache.invalidate_tags(SNAPSHOT_TAG)
+
+
+def get_snapshot_version():
+    return cache.tag_version(SNAPSHOT_TAG)
+
+
+def _build_sidebar(app):
+    """Returns the sidebar categories, or None if they could not be read."""
+    sidebar_data = []
+    try:
+        # Fetch all categories and their subcategories in a single, efficient query.
+        all_categories = Category.query.options(
+            joinedload(Category.subcategories)
+        ).order_by(Category.name).all()
+
+        for cat in all_categories:
+            if len(cat.subcategories) > 0:
+                sidebar_data.append({
+                    'id': cat.id,
+                    'name': cat.name,
+                    'icon': "fa-landmark",  # Placeholder icon
+                    'subcategories': [
+                        {'id': sub.id, 'name': sub.name}
+                        for sub in sorted(cat.subcategories, key=lambda x: x.name)
+                    ]
+                })
+    except Exception as e:
+        app.logger.error(f"[CONTEXT] Could not build sidebar_data: {e}")
+        return None
+    return sidebar_data
+
+
+def get_global_snapshot(app):
+    """
+    Returns the current snapshot, rebuilding it if it is stale.
+
+    Returns:
+        GlobalSnapshot: daily_data, sidebar_data and its HTML-safe JSON
+                        form sidebar_json.
+    """
+    global _snapshot
+    daily_data = load_data_json('daily.json')
+    max_age = app.config.get('SNAPSHOT_MAX_AGE', DEFAULT_MAX_AGE)
+
+    version = get_snapshot_version()
+    with _lock:
+        cached = _snapshot
+    if cached is not None:
+        cached_version, built_at, data = cached
+        if cached_version == version and time.monotonic() - built_at < max_age:
+            if data['daily_data'] is daily_data:
+                return data
+            # Only the daily readings changed: keep the database parts
+            data = GlobalSnapshot(data, daily_data=daily_data)
+            with _lock:
+                if _snapshot is cached:
+                    _snapshot = (version, built_at, data)
+            return data
+
+    app.logger.debug(f"[CONTEXT] Rebuilding global snapshot (version {version})")
+    with use_primary():  # Reused under `version`, which a lagging replica may predate
+        sidebar_data = _build_sidebar(app)
+    if sidebar_data is None:
+        # Not cached, so the next render retries; until then the last good sidebar beats none
+        if cached is not None:
+            return GlobalSnapshot(cached[2], daily_data=daily_data)
+        return GlobalSnapshot(daily_data=daily_data, sidebar_data=[], sidebar_json=htmlsafe_json_dumps([]))
+    data = GlobalSnapshot(
+        daily_data=daily_data,
+        sidebar_data=sidebar_data,
+        sidebar_json=htmlsafe_json_dumps(sidebar_data),
+    )
+    # A write that landed while we were building must not be cached over
+    if get_snapshot_version() == version:
+        with _lock:
+            _snapshot = (version, time.monotonic(), data)
+    return data
+
+
+# -------------------------
+# Invalidation on commit
+# -------------------------
+def _touches_snapshot(obj, check_fields=True):
+    model = type(obj)
+    if model not in WATCHED_MODELS:
+        return False
+    fields = WATCHED_MODELS[model]
+    if fields is None or not check_fields:
+        return True
+    attrs = inspect(obj).attrs
+    return any(attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_snapshot_writes(session, flush_context):
+    # new/dirty/deleted and attribute history still show the pre-flush state here
+    if any(_touches_snapshot(obj, check_fields=False) for obj in session.new) \
+            or any(_touches_snapshot(obj) for obj in session.dirty) \
+            or any(_touches_snapshot(obj, check_fields=False) for obj in session.deleted):
+        session.info['snapshot_dirty'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_snapshot(session):
+    if session.info.pop('snapshot_dirty', False):
+        bump_snapshot_version()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_snapshot_writes(session):
+    session.info.pop('snapshot_dirty', None)
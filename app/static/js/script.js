@@ -88,29 +88,82 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    /**
+     * Fetches one page of a subcategory's approved discourses from the content index API.
+     * The browser revalidates with the page's ETag, so unchanged listings come back as 304.
+     * @param {number} subCategoryId The subcategory to list.
+     * @param {string|null} cursor The `next_cursor` of the previous page, or null for the first.
+     * @returns {Promise<{items: Array, next_cursor: string|null}>}
+     */
+    async function fetchContentIndex(subCategoryId, cursor = null) {
+        const params = new URLSearchParams({ subcategory: subCategoryId });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`/discourse/api/index?${params}`);
+        if (!response.ok) throw new Error(`HTTP error ${response.status}`);
+        const result = await response.json();
+        if (result.status !== 'success') throw new Error(result.message || 'Could not load discourses.');
+        return result;
+    }
+
+    /**
+     * Appends discourse links to the third navigation panel, followed by a
+     * "More..." link when another page exists.
+     * @param {number} subCategoryId The subcategory being listed.
+     * @param {{items: Array, next_cursor: string|null}} page A page from fetchContentIndex.
+     */
+    function appendDiscourseLinks(subCategoryId, page) {
+        if (!discourseNavList) return;
+        page.items.forEach(disc => {
+            const li = document.createElement('li');
+            const a = document.createElement('a');
+            a.href = '#';
+            a.dataset.discourseId = disc.id;
+            a.textContent = disc.title;
+            li.appendChild(a);
+            discourseNavList.appendChild(li);
+        });
+        if (page.next_cursor) {
+            const li = document.createElement('li');
+            li.innerHTML = '<a href="#" class="load-more-discourses">More&hellip;</a>';
+            li.firstChild.addEventListener('click', async (e) => {
+                e.preventDefault();
+                e.stopPropagation(); // Not a discourse link
+                li.remove();
+                try {
+                    appendDiscourseLinks(subCategoryId, await fetchContentIndex(subCategoryId, page.next_cursor));
+                } catch (error) {
+                    console.error("Content index fetch error:", error);
+                }
+            });
+            discourseNavList.appendChild(li);
+        }
+    }
+
     /**
      * Handles clicks on the subcategory navigation panel.
      * @param {Event} e The click event.
      */
-    function handleSubcategoryClick(e) {
+    async function handleSubcategoryClick(e) {
         const link = e.target.closest('a');
         if (!link) return;
         e.preventDefault();
 
         if (discourseNav) discourseNav.classList.remove('visible');
         const subCategoryId = parseInt(link.dataset.subcategoryId, 10);
-        const discoursesForSubcat = CONTENT_DATA.filter(c => c.subcategory_id === subCategoryId);
+        let page;
+        try {
+            page = await fetchContentIndex(subCategoryId);
+        } catch (error) {
+            console.error("Content index fetch error:", error);
+            return;
+        }
 
-        if (discoursesForSubcat.length > 0) {
+        if (page.items.length > 0) {
             updateActiveLink(subNavList, link);
             if (discourseNavTitle) discourseNavTitle.textContent = link.textContent;
             if (discourseNavList) {
                 discourseNavList.innerHTML = '';
-                discoursesForSubcat.forEach(disc => {
-                    const li = document.createElement('li');
-                    li.innerHTML = `<a href="#" data-discourse-id="${disc.id}">${disc.title}</a>`;
-                    discourseNavList.appendChild(li);
-                });
+                appendDiscourseLinks(subCategoryId, page);
             }
             if (discourseNav) discourseNav.classList.add('visible');
         } else {
@@ -220,6 +273,10 @@ document.addEventListener('DOMContentLoaded', () => {
             if (discourse.featured_image_url) {
                 const img = document.createElement('img');
                 img.src = discourse.featured_image_url;
+                if (discourse.featured_image_srcset) {
+                    img.srcset = discourse.featured_image_srcset;
+                    img.sizes = '(max-width: 768px) 100vw, 768px';
+                }
                 img.alt = discourse.title;
                 img.className = 'featured-image';
                 imageContainer.appendChild(img);
@@ -0,0 +1,270 @@
+# /project_folder/benchmarks/endpoints.py
+
+"""
+Offline throughput and latency benchmark of the hot endpoints of every blueprint.
+
+Boots the app against a generated SQLite dataset with the external APIs
+stubbed (see fixtures.py), warms each endpoint up, then drives it through the
+WSGI test client and reports p50/p95/p99 latency and requests per second.
+Path parameters (discourse, author, subcategory ids) are drawn from the
+dataset with a seeded generator, so runs are repeatable.
+
+Usage (from the project root):
+    python benchmarks/endpoints.py [--scale small|medium|large] [--requests 200]
+        [--concurrency 1] [--only discourse] [--fetch-latency-ms 0] [--cache-url memory://]
+        [--out benchmarks/results/run.json] [--compare benchmarks/results/baseline.json]
+
+Results are written as JSON (default: benchmarks/results/<timestamp>.json);
+with --compare, each endpoint's p50/p95 and throughput are printed next to
+the earlier run's. Numbers are only comparable between runs on the same
+machine, scale and options. SQLite is a stand-in: relative changes are
+meaningful, absolute numbers are not MySQL's.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+
+from fixtures import PROJECT_ROOT, BENCH_PASSWORD, SCALES, boot_app, generate_dataset, install_stubs, scale_from
+
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results')
+
+# (name, path template, needs login). Templates are filled from the dataset ids.
+ENDPOINTS = (
+    ('main.index', '/', False),
+    ('main.profile', '/profile', True),
+    ('discourse.dialogues', '/discourse/dialogues', False),
+    ('discourse.api_get', '/discourse/api/get/{discourse_id}', False),
+    ('discourse.comments', '/discourse/api/{discourse_id}/comments', False),
+    ('discourse.index', '/discourse/api/index?subcategory={subcategory_id}', False),
+    ('discourse.trending', '/discourse/api/trending', False),
+    ('discourse.navigation', '/discourse/api/navigation/{discourse_id}', False),
+    ('discourse.related', '/discourse/api/related/{discourse_id}', False),
+    ('discourse.search', '/discourse/api/search?q={word}', True),
+    ('discourse.author', '/discourse/author/{user_id}', False),
+    ('liturgy.calendar', '/liturgy/liturgy', False),
+    ('liturgy.devotions', '/liturgy/daily-devotions', False),
+    ('liturgy.readings', '/liturgy/api/get-readings/{date}', False),
+    ('bible.home', '/bible/', False),
+    ('bible.translations', '/bible/api/translations', False),
+    ('bible.metadata', '/bible/api/OEB/metadata', False),
+    ('bible.search', '/bible/api/intelligent_search?q=John%203:16&t=OEB', False),
+    ('charity.home', '/charity/home', True),
+    ('charity.search', '/charity/api/search?search={charity_word}', True),
+    ('academic.theology', '/academic/theology', False),
+)
+
+SEARCH_WORDS = ('grace', 'faith', 'council', 'wisdom', 'mission')
+CHARITY_WORDS = ('Nairobi', 'Lima', 'Charity 1', 'mercy')
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def _fill(template, ids, rng):
+    return template.format(
+        discourse_id=rng.choice(ids['discourse_ids']) if ids['discourse_ids'] else 0,
+        user_id=rng.choice(ids['user_ids']) if ids['user_ids'] else 0,
+        subcategory_id=rng.choice(ids['subcategory_ids']) if ids['subcategory_ids'] else 0,
+        word=rng.choice(SEARCH_WORDS),
+        charity_word=rng.choice(CHARITY_WORDS),
+        date=date(2025, 1, 1 + rng.randrange(28)).isoformat(),
+    )
+
+
+def _client(app, login):
+    client = app.test_client()
+    if login:
+        response = client.post('/login', data={'email': 'user0@bench.local', 'password': BENCH_PASSWORD})
+        if response.status_code >= 400:
+            raise RuntimeError(f"Benchmark login failed with status {response.status_code}")
+    return client
+
+
+def run_endpoint(app, ids, name, template, login, requests, concurrency, warmup, seed):
+    """
+    Benchmarks one endpoint.
+
+    Returns:
+        dict: Latency percentiles (ms), throughput and status counts.
+    """
+    rng = random.Random(f"{seed}:{name}")
+    warm_client = _client(app, login)
+    for _ in range(warmup):
+        warm_client.get(_fill(template, ids, rng))
+
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+
+    def worker(client, count, worker_seed):
+        local_rng = random.Random(worker_seed)
+        local_latencies, local_statuses = [], Counter()
+        for _ in range(count):
+            path = _fill(template, ids, local_rng)
+            start = time.perf_counter()
+            response = client.get(path)
+            response.get_data()
+            local_latencies.append((time.perf_counter() - start) * 1000)
+            local_statuses[response.status_code] += 1
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    # Log in before the clock starts: throughput counts only the measured requests
+    clients = [_client(app, login) for _ in per_worker]
+    threads = [threading.Thread(target=worker, args=(client, count, f"{seed}:{name}:{i}"))
+               for i, (client, count) in enumerate(zip(clients, per_worker))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(n for status, n in statuses.items() if status >= 500)
+    return {
+        'path': template,
+        'login': login,
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): n for status, n in sorted(statuses.items())},
+        'p50_ms': round(_percentile(latencies, 0.50), 3) if latencies else None,
+        'p95_ms': round(_percentile(latencies, 0.95), 3) if latencies else None,
+        'p99_ms': round(_percentile(latencies, 0.99), 3) if latencies else None,
+        'mean_ms': round(statistics.fmean(latencies), 3) if latencies else None,
+        'max_ms': round(latencies[-1], 3) if latencies else None,
+        'rps': round(len(latencies) / wall, 1) if wall else None,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    previous = (baseline or {}).get('endpoints', {})
+    header = f"{'endpoint':<24} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}  statuses"
+    print(header)
+    print('-' * len(header))
+    for name, row in results['endpoints'].items():
+        statuses = ' '.join(f"{status}x{n}" for status, n in row['statuses'].items())
+        print(f"{name:<24} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['rps']:>9}  {statuses}")
+        before = previous.get(name)
+        if before:
+            def delta(key):
+                if not before.get(key) or row.get(key) is None:
+                    return '-'
+                return f"{(row[key] - before[key]) / before[key]:+.0%}"
+            print(f"{'  vs baseline':<24} {delta('p50_ms'):>9} {delta('p95_ms'):>9} {delta('p99_ms'):>9} {delta('rps'):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--users', type=int, help="Override the scale's user count.")
+    parser.add_argument('--discourses', type=int, help="Override the scale's discourse count.")
+    parser.add_argument('--comments', type=int, dest='comments_per_discourse', help="Comments per discourse.")
+    parser.add_argument('--charities', type=int, help="Override the scale's charity count.")
+    parser.add_argument('--days', type=int, dest='liturgical_days', help="Liturgical days to create.")
+    parser.add_argument('--requests', type=int, default=200, help="Measured requests per endpoint.")
+    parser.add_argument('--warmup', type=int, default=10, help="Unmeasured requests per endpoint first.")
+    parser.add_argument('--concurrency', type=int, default=1, help="Client threads per endpoint.")
+    parser.add_argument('--only', action='append', default=[],
+                        help="Only endpoints whose name starts with this (repeatable), e.g. --only discourse.")
+    parser.add_argument('--fetch-latency-ms', type=float, default=0, help="Simulated latency of stubbed API calls.")
+    parser.add_argument('--cache-url', help="CACHE_URL of the application cache, e.g. sqlite:///bench-cache.db.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help="SQLite file to use (default: a temporary file, removed afterwards).")
+    parser.add_argument('--out', help="Where to write the JSON results.")
+    parser.add_argument('--compare', help="An earlier results file to compare against.")
+    args = parser.parse_args()
+
+    scale = scale_from(args.scale, users=args.users, discourses=args.discourses,
+                       comments_per_discourse=args.comments_per_discourse, charities=args.charities,
+                       liturgical_days=args.liturgical_days)
+    endpoints = [e for e in ENDPOINTS if not args.only or any(e[0].startswith(p) for p in args.only)]
+    if not endpoints:
+        parser.error('--only matched no endpoints')
+
+    db_path = args.db or tempfile.mktemp(prefix='bench-', suffix='.db')
+    if args.cache_url:
+        os.environ['CACHE_URL'] = args.cache_url
+    try:
+        app = boot_app(db_path)
+        install_stubs(args.fetch_latency_ms)
+        print(f"Generating the '{args.scale}' dataset in {db_path} ...", flush=True)
+        started = time.perf_counter()
+        ids = generate_dataset(app, scale, seed=args.seed)
+        print(f"  done in {time.perf_counter() - started:.1f}s\n", flush=True)
+
+        results = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'git_revision': _git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'scale': args.scale,
+                'dataset': scale.__dict__,
+                'requests': args.requests,
+                'warmup': args.warmup,
+                'concurrency': args.concurrency,
+                'fetch_latency_ms': args.fetch_latency_ms,
+                'cache_url': os.environ.get('CACHE_URL', 'memory://'),
+                'seed': args.seed,
+            },
+            'endpoints': {},
+        }
+        for name, template, login in endpoints:
+            print(f"  {name} ...", end=' ', flush=True)
+            row = run_endpoint(app, ids, name, template, login, args.requests,
+                               max(args.concurrency, 1), args.warmup, args.seed)
+            results['endpoints'][name] = row
+            print(f"p50 {row['p50_ms']} ms, {row['rps']} req/s", flush=True)
+    finally:
+        from app.dol_discourse.disc_views import view_counter
+        view_counter.shutdown()  # Flush buffered view counts while the database still exists
+        if not args.db and os.path.exists(db_path):
+            os.remove(db_path)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print()
+    print_results(results, baseline)
+    print(f"\nResults written to {out}")
+
+    failing = [name for name, row in results['endpoints'].items() if row['errors']]
+    if failing:
+        print(f"Endpoints with 5xx responses: {', '.join(failing)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
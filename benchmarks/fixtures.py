@@ -0,0 +1,283 @@
+# /project_folder/benchmarks/fixtures.py
+
+"""
+Offline stand-ins for the benchmark suite: a generated SQLite database and
+stubs for the external APIs.
+
+- `boot_app(db_path)` creates the application against `sqlite:///<db_path>`
+  (through DATABASE_URL), with the outbound call log switched off.
+- `generate_dataset(app, scale)` fills it with users, categories, discourses
+  (with resources and comments), vetted charities and liturgical days.
+  Generation is seeded, so the same scale always yields the same data.
+- `install_stubs(latency_ms)` replaces the network layer: `requests.request`
+  (used by lit_utils.safe_fetch) returns canned JSON and the USCCB client
+  returns canned readings, each after an optional simulated latency. Everything
+  above the transport (safe_fetch's cache, error shaping, instrumentation)
+  runs for real.
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, asdict
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+WORDS = (
+    'grace faith hope charity mercy truth church council doctrine scripture tradition prayer '
+    'liturgy sacrament virtue justice reason creation covenant wisdom spirit gospel mission '
+    'community family dignity freedom conscience peace history theology philosophy science'
+).split()
+
+
+@dataclass(frozen=True)
+class Scale:
+    users: int
+    categories: int
+    subcategories_per_category: int
+    discourses: int
+    comments_per_discourse: int
+    charities: int
+    liturgical_days: int
+
+
+SCALES = {
+    'small': Scale(users=20, categories=4, subcategories_per_category=3, discourses=200,
+                   comments_per_discourse=5, charities=30, liturgical_days=60),
+    'medium': Scale(users=200, categories=8, subcategories_per_category=5, discourses=2000,
+                    comments_per_discourse=10, charities=300, liturgical_days=366),
+    'large': Scale(users=1000, categories=12, subcategories_per_category=8, discourses=20000,
+                   comments_per_discourse=20, charities=2000, liturgical_days=366),
+}
+
+BENCH_PASSWORD = 'bench-password'
+
+
+def scale_from(name, **overrides):
+    """Returns the named Scale with any non-None field overridden."""
+    base = asdict(SCALES[name])
+    base.update({k: v for k, v in overrides.items() if v is not None})
+    return Scale(**base)
+
+
+def boot_app(db_path, database_url=None):
+    """
+    Creates the application against a SQLite file.
+
+    Args:
+        db_path (str): The SQLite file.
+        database_url (str): A full URI to use instead (e.g. a scratch MySQL database).
+
+    Returns:
+        Flask: The app, with CSRF off so the login form can be posted.
+    """
+    env = {
+        'DATABASE_URL': database_url or f"sqlite:///{os.path.abspath(db_path)}",
+        'HTTP_CALL_LOG': '',  # Metrics only; no call-log writes during the run
+        'PROFILER_ENABLED': '0',
+    }
+    os.environ.update(env)
+    # create_app only needs these to be present when DATABASE_URL is set
+    for key in ('DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_NAME', 'SECRET_KEY', 'JWT_SECRET_KEY'):
+        os.environ.setdefault(key, 'bench')
+
+    from app import create_app
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    return app
+
+
+def _sentence(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def _body(rng, paragraphs):
+    return ''.join(f"<p>{_sentence(rng, rng.randint(40, 120))}.</p>" for _ in range(paragraphs))
+
+
+def generate_dataset(app, scale, seed=42):
+    """
+    Creates the schema and fills it. Rows are added in batches with bulk saves.
+
+    Args:
+        app (Flask): From `boot_app`.
+        scale (Scale): How much of everything to create.
+        seed (int): Seed of the generator.
+
+    Returns:
+        dict: Ids the benchmark draws request parameters from.
+    """
+    from app.dol_db.models import (
+        db, User, Role, RoleType, Category, SubCategory, DiscourseBlog, DiscourseComment, Resource,
+        ResourceType, ResourceMedium, Charity, CharityCategory, CharityCategoryDef, LiturgicalDay
+    )
+    from app.dol_discourse.disc_text import extract_body_fields
+
+    rng = random.Random(seed)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        roles = {rt: Role(name=rt, description=rt.value) for rt in RoleType}
+        db.session.add_all(roles.values())
+
+        users = []
+        for i in range(scale.users):
+            user = User(username=f"user{i}", email=f"user{i}@bench.local", name=f"Name{i}",
+                        other_names=f"Other{i}", is_authorized=True, password_hash='!')
+            if i == 0:
+                # The account the benchmark logs in with (hashing every password would dominate setup)
+                user.set_password(BENCH_PASSWORD)
+            user.roles.append(roles[RoleType.ADMIN if i == 0 else RoleType.READER])
+            users.append(user)
+        db.session.add_all(users)
+
+        subcategories = []
+        for c in range(scale.categories):
+            category = Category(name=f"Category {c}")
+            db.session.add(category)
+            for s in range(scale.subcategories_per_category):
+                subcategory = SubCategory(name=f"Subcategory {c}.{s}", category=category)
+                db.session.add(subcategory)
+                subcategories.append(subcategory)
+        db.session.commit()
+        user_ids = [u.id for u in users]
+        subcategory_ids = [s.id for s in subcategories]
+
+        start = datetime(2024, 1, 1)
+        for first in range(0, scale.discourses, 500):
+            batch = []
+            for i in range(first, min(first + 500, scale.discourses)):
+                discourse = DiscourseBlog(
+                    user_id=rng.choice(user_ids), subcategory_id=rng.choice(subcategory_ids),
+                    reference=f"BENCH-{i}", title=_sentence(rng, rng.randint(3, 9)),
+                    body=_body(rng, rng.randint(2, 8)), is_approved=rng.random() < 0.95,
+                    date_posted=start + timedelta(minutes=37 * i),
+                    comment_count=scale.comments_per_discourse,
+                )
+                for field, value in extract_body_fields(discourse.body).items():
+                    setattr(discourse, field, value)
+                discourse.resources.append(Resource(
+                    type=rng.choice(list(ResourceType)), name=_sentence(rng, 3),
+                    medium=rng.choice(list(ResourceMedium)), link='https://example.org/resource'))
+                batch.append(discourse)
+            db.session.add_all(batch)
+            db.session.flush()
+            db.session.bulk_save_objects([
+                DiscourseComment(user_id=rng.choice(user_ids), discourse_id=d.id, body=_sentence(rng, 20),
+                                 date_commented=d.date_posted + timedelta(hours=j + 1))
+                for d in batch for j in range(scale.comments_per_discourse)
+            ])
+            db.session.commit()
+
+        category_defs = {cat: CharityCategoryDef(name=cat) for cat in CharityCategory}
+        db.session.add_all(category_defs.values())
+        for i in range(scale.charities):
+            charity = Charity(name=f"Charity {i} {_sentence(rng, 2)}", email=f"charity{i}@bench.local",
+                              location=rng.choice(('Nairobi, Kenya', 'Lagos, Nigeria', 'Manila, Philippines',
+                                                   'Lima, Peru', 'Kraków, Poland')),
+                              description=_sentence(rng, 60), is_vetted=rng.random() < 0.9)
+            charity.categories.extend(rng.sample(list(category_defs.values()), 2))
+            db.session.add(charity)
+
+        # The liturgy page reads the current year's US calendar from the database
+        year = date.today().year
+        for offset in range(min(scale.liturgical_days, 366)):
+            day = date(year, 1, 1) + timedelta(days=offset)
+            if day.year != year:
+                break
+            event = _litcal_event(day, f"Weekday {offset + 1}")
+            db.session.add(LiturgicalDay(
+                date=day, region='US', year=year, name=event['name'], grade=event['grade'],
+                grade_name=event['grade_lcl'], liturgical_season=event['liturgical_season_lcl'],
+                full_data=[event],
+            ))
+        db.session.commit()
+
+        discourse_ids = [row.id for row in DiscourseBlog.query.filter_by(is_approved=True)
+                         .with_entities(DiscourseBlog.id)]
+        return {
+            'user_ids': user_ids,
+            'subcategory_ids': subcategory_ids,
+            'discourse_ids': discourse_ids,
+            'admin_email': users[0].email if users else None,
+        }
+
+
+# -------------------------
+# External API stubs
+# -------------------------
+def _litcal_event(day, name):
+    return {
+        'event_key': name.replace(' ', ''), 'name': name, 'color': ['green'], 'grade': 0,
+        'grade_lcl': 'weekday', 'liturgical_season': 'ORDINARY_TIME',
+        'liturgical_season_lcl': 'Ordinary Time', 'year': day.year, 'month': day.month, 'day': day.day,
+    }
+
+
+def _canned_payload(url):
+    """What each external API returns, shaped like the real responses the routes normalize."""
+    if 'litcal' in url:
+        year = date.today().year
+        return {'litcal': [_litcal_event(date(year, 1, 1) + timedelta(days=d), f"Day {d + 1}") for d in range(365)]}
+    if 'basic_prayers' in url:
+        return [{'title': f"Prayer {i}", 'prayerText': _sentence(random.Random(i), 60)} for i in range(20)]
+    if 'rosary' in url:
+        return {'title': 'The Glorious Mysteries', 'mysteries': [f"Mystery {i}" for i in range(1, 6)]}
+    if 'saint' in url:
+        return {'title': 'Saint of the Day', 'description': _sentence(random.Random(0), 80)}
+    return {}
+
+
+class _FakeUSCCB:
+    """Stands in for plugins.catholic_mass_readings.USCCB."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get_mass(self, target_date, type_=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        readings = [SimpleNamespace(header=header, text=_sentence(random.Random(header), 150))
+                    for header in ('Reading 1', 'Responsorial Psalm', 'Gospel')]
+        return SimpleNamespace(sections=[SimpleNamespace(readings=readings)])
+
+
+def install_stubs(latency_ms=0):
+    """
+    Replaces the network layer with canned responses.
+
+    Args:
+        latency_ms (float): Simulated round trip of every stubbed call.
+    """
+    import requests
+    from app.dol_liturgy import lit_utils
+
+    latency = latency_ms / 1000
+
+    def fake_request(method, url, **kwargs):
+        if latency:
+            time.sleep(latency)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.encoding = 'utf-8'
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(_canned_payload(url)).encode('utf-8')
+        return response
+
+    requests.request = fake_request
+    lit_utils._usccb_client = lambda: _FakeUSCCB(latency)
@@ -0,0 +1,287 @@
+# /project_folder/benchmarks/pool_load.py
+
+"""
+Load test of the database connection pool: how large must the pool be for a
+given number of workers and threads?
+
+Generates the benchmark dataset (see fixtures.py), then, for each pool size
+in the sweep, forks --workers processes (like gunicorn workers), each with
+its own app and pool, and runs --threads request threads in each (like
+gthread) against the database-heavy endpoints for --duration seconds.
+
+Per pool size it reports:
+    throughput and request latency (p50/p95/p99),
+    checkout wait (from db_pool_checkout_seconds; p95 is a bucket bound),
+    the peak number of connections checked out at once in any worker,
+    pool timeouts (requests that gave up after DB_POOL_TIMEOUT),
+    the connections the fleet may open: workers x (size + overflow).
+
+Usage (from the project root):
+    python benchmarks/pool_load.py [--workers 2] [--threads 8] [--duration 10]
+        [--pool-sizes 2,4,8] [--max-overflow 0] [--pool-timeout 1]
+        [--max-connections 151] [--database-url mysql+pymysql://...]
+
+A thread holds one connection for the length of a request, so a worker needs
+pool_size + max_overflow >= its threads; anything less shows up as checkout
+wait and, past DB_POOL_TIMEOUT, as timeouts. The total must stay under the
+server's max_connections (minus what migrations, cron jobs and admins use).
+With --database-url the dataset is generated in that database: its tables
+are DROPPED and recreated, so only point it at a scratch database.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from fixtures import boot_app, generate_dataset, install_stubs, scale_from, SCALES
+from endpoints import ENDPOINTS, RESULTS_DIR, _client, _fill, _percentile
+
+# The endpoints whose time is dominated by queries
+DEFAULT_MIX = (
+    'main.index', 'discourse.dialogues', 'discourse.api_get', 'discourse.comments',
+    'discourse.index', 'discourse.navigation', 'discourse.author', 'charity.search',
+)
+SAMPLE_INTERVAL = 0.001  # seconds between reads of pool.checkedout()
+
+
+def _bucket_percentile(buckets, counts, fraction):
+    """Upper bound of the histogram bucket holding the given fraction of observations."""
+    total = sum(counts)
+    if not total:
+        return None
+    target = math.ceil(fraction * total)
+    seen = 0
+    for bound, count in zip(buckets + (math.inf,), counts):
+        seen += count
+        if seen >= target:
+            return bound
+    return math.inf
+
+
+def _worker(index, args, ids, mix, pool_size, results):
+    """One forked worker: boots its own app and pool, then runs the request threads."""
+    os.environ.update({
+        'DB_POOL_SIZE': str(pool_size),
+        'DB_MAX_OVERFLOW': str(args.max_overflow),
+        'DB_POOL_TIMEOUT': str(args.pool_timeout),
+    })
+    app = boot_app(args.db_path, args.database_url)
+    install_stubs(args.fetch_latency_ms)
+
+    from app.dol_db.models import db
+    from app.dol_metrics.metrics_utils import registry
+    from app.dol_metrics.pool_metrics import CHECKOUT_LATENCY
+    with app.app_context():
+        engine = db.engine
+
+    endpoints = [e for e in ENDPOINTS if e[0] in mix]
+    # Log in before the load starts, one thread at a time, so a starved pool can't fail the logins
+    clients = [{False: _client(app, False), True: _client(app, True)} for _ in range(args.threads)]
+    deadline = time.monotonic() + args.duration
+    latencies, statuses, lock = [], Counter(), threading.Lock()
+    peak = 0
+    running = threading.Event()
+    running.set()
+
+    def sample():
+        nonlocal peak
+        while running.is_set():
+            peak = max(peak, engine.pool.checkedout())
+            time.sleep(SAMPLE_INTERVAL)
+
+    def request_thread(seed, clients):
+        rng = random.Random(seed)
+        local_latencies, local_statuses = [], Counter()
+        while time.monotonic() < deadline:
+            name, template, login = rng.choice(endpoints)
+            client = clients[login]
+            start = time.perf_counter()
+            response = client.get(_fill(template, ids, rng))
+            response.get_data()
+            local_latencies.append((time.perf_counter() - start) * 1000)
+            local_statuses[response.status_code] += 1
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    threads = [threading.Thread(target=request_thread, args=(f"{args.seed}:{index}:{t}", clients[t]))
+               for t in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    running.clear()
+    sampler.join()
+
+    from app.dol_discourse.disc_views import view_counter
+    view_counter.shutdown()
+
+    values = registry.collect()
+    empty = [0] * (len(CHECKOUT_LATENCY.buckets) + 1) + [0.0]
+    checkout = values.get(('db_pool_checkout_seconds', ('primary',)), empty)
+    results.put({
+        'latencies': latencies,
+        'statuses': dict(statuses),
+        'peak_checked_out': peak,
+        'checkout_counts': checkout[:-1],
+        'checkout_sum': checkout[-1],
+        'timeouts': values.get(('db_pool_timeouts_total', ('primary',)), 0),
+    })
+
+
+def run_pool_size(args, ids, mix, pool_size):
+    """
+    Runs one load test with the given pool size.
+
+    Returns:
+        dict: The aggregated figures for the report.
+    """
+    from app.dol_metrics.pool_metrics import POOL_WAIT_BUCKETS
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(i, args, ids, mix, pool_size, results))
+                 for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    # Drain before joining: a child can't exit while its result is stuck in the pipe
+    rows = [results.get(timeout=args.duration + 120) for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = sorted(ms for row in rows for ms in row['latencies'])
+    statuses = Counter()
+    for row in rows:
+        statuses.update({int(status): n for status, n in row['statuses'].items()})
+    checkout_counts = [sum(values) for values in zip(*(row['checkout_counts'] for row in rows))]
+    checkouts = sum(checkout_counts)
+    checkout_sum = sum(row['checkout_sum'] for row in rows)
+    p95_wait = _bucket_percentile(POOL_WAIT_BUCKETS, checkout_counts, 0.95)
+    return {
+        'pool_size': pool_size,
+        'max_overflow': args.max_overflow,
+        'connections': args.workers * (pool_size + args.max_overflow),
+        'requests': len(latencies),
+        'errors': sum(n for status, n in statuses.items() if status >= 500),
+        'statuses': {str(status): n for status, n in sorted(statuses.items())},
+        'rps': round(len(latencies) / args.duration, 1),
+        'p50_ms': round(_percentile(latencies, 0.50), 3) if latencies else None,
+        'p95_ms': round(_percentile(latencies, 0.95), 3) if latencies else None,
+        'p99_ms': round(_percentile(latencies, 0.99), 3) if latencies else None,
+        'mean_ms': round(statistics.fmean(latencies), 3) if latencies else None,
+        'checkouts': checkouts,
+        'checkout_mean_ms': round(checkout_sum / checkouts * 1000, 3) if checkouts else None,
+        'checkout_p95_ms': None if p95_wait is None else (p95_wait * 1000 if p95_wait != math.inf else 'inf'),
+        'peak_checked_out': max(row['peak_checked_out'] for row in rows),
+        'timeouts': sum(row['timeouts'] for row in rows),
+    }
+
+
+def print_report(args, rows):
+    header = (f"{'size+ovf':>9} {'conns':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'wait avg':>9} {'wait p95':>9} {'peak':>5} {'timeouts':>9} {'5xx':>5}")
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        wait_p95 = row['checkout_p95_ms']
+        print(f"{row['pool_size']:>5}+{row['max_overflow']:<3} {row['connections']:>6} {row['rps']:>8} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+              f"{row['checkout_mean_ms'] if row['checkout_mean_ms'] is not None else '-':>9} "
+              f"{'-' if wait_p95 is None else f'<={wait_p95:g}':>9} "
+              f"{row['peak_checked_out']:>5} {row['timeouts']:>9} {row['errors']:>5}")
+
+    print(f"\n{args.workers} worker(s) x {args.threads} thread(s): each worker holds at most one connection "
+          f"per request thread, so pool_size + max_overflow >= {args.threads} avoids waiting for the pool.")
+    healthy = [row for row in rows if not row['timeouts'] and not row['errors']
+               and row['peak_checked_out'] <= row['pool_size'] + row['max_overflow']]
+    best_rps = max((row['rps'] for row in healthy), default=0)
+    # The smallest pool without timeouts within 5% of the best such throughput
+    candidates = [row for row in healthy if row['rps'] >= 0.95 * best_rps]
+    if candidates:
+        pick = min(candidates, key=lambda row: row['pool_size'] + row['max_overflow'])
+        print(f"Recommended: DB_POOL_SIZE={pick['pool_size']} DB_MAX_OVERFLOW={pick['max_overflow']} "
+              f"(peak {pick['peak_checked_out']} checked out, {pick['rps']} req/s).")
+        total = pick['connections']
+        if args.replicas:
+            total *= 1 + args.replicas
+            print(f"With {args.replicas} replica(s), each engine has its own pool: up to {total} connections.")
+        verdict = 'fits under' if total <= args.max_connections else 'EXCEEDS'
+        print(f"{total} connection(s) {verdict} max_connections={args.max_connections}.")
+    else:
+        print("No pool size in the sweep ran without timeouts at full throughput; try larger sizes.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2, help="Forked worker processes.")
+    parser.add_argument('--threads', type=int, default=8, help="Request threads per worker.")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds of load per pool size.")
+    parser.add_argument('--pool-sizes', default='2,4,8', help="Comma-separated DB_POOL_SIZE values to sweep.")
+    parser.add_argument('--max-overflow', type=int, default=0, help="DB_MAX_OVERFLOW for every run.")
+    parser.add_argument('--pool-timeout', type=int, default=1, help="DB_POOL_TIMEOUT for every run.")
+    parser.add_argument('--max-connections', type=int, default=151, help="The server's max_connections.")
+    parser.add_argument('--replicas', type=int, default=0, help="Read replicas in production (each has a pool).")
+    parser.add_argument('--only', action='append', default=[],
+                        help="Endpoint names to load (repeatable; default: the database-heavy ones).")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--fetch-latency-ms', type=float, default=0, help="Simulated latency of stubbed API calls.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help="Run against this database instead of SQLite (tables are dropped!).")
+    parser.add_argument('--out', help="Where to write the JSON results.")
+    args = parser.parse_args()
+
+    pool_sizes = [int(size) for size in args.pool_sizes.split(',') if size.strip()]
+    mix = tuple(args.only) or DEFAULT_MIX
+    unknown = set(mix) - {name for name, _, _ in ENDPOINTS}
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    args.db_path = tempfile.mktemp(prefix='pool-', suffix='.db')
+    rows = []
+    try:
+        app = boot_app(args.db_path, args.database_url)
+        print("Generating the dataset ...", flush=True)
+        ids = generate_dataset(app, scale_from(args.scale), seed=args.seed)
+        from app.dol_db.models import db
+        from app.dol_discourse.disc_views import view_counter
+        view_counter.shutdown()
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()  # No connection may be shared with the forked workers
+
+        for pool_size in pool_sizes:
+            print(f"  pool_size={pool_size} max_overflow={args.max_overflow}: "
+                  f"{args.workers}x{args.threads} threads for {args.duration:g}s ...", flush=True)
+            rows.append(run_pool_size(args, ids, mix, pool_size))
+    finally:
+        if os.path.exists(args.db_path):
+            os.remove(args.db_path)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"pool-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    meta = {k: v for k, v in vars(args).items() if k not in ('db_path', 'database_url', 'out')}
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump({'meta': {'timestamp': datetime.now().isoformat(timespec='seconds'), **meta},
+                   'runs': rows}, f, indent=2)
+
+    print()
+    print_report(args, rows)
+    print(f"\nResults written to {out}")
+
+
+if __name__ == '__main__':
+    if sys.platform == 'win32':
+        sys.exit("The pool load test forks worker processes; run it on Linux or macOS.")
+    main()
@@ -0,0 +1,152 @@
+# /project_folder/benchmarks/query_budget.py
+
+"""
+Regression check of the loader profiles: every endpoint must answer 200 and
+stay within its SQL statement budget.
+
+The loader profiles (app/dol_db/loaders.py) end in `raiseload('*')`, so a
+template or serializer touching a relationship its profile did not plan for
+fails with a 500 instead of issuing lazy loads. This drives each endpoint of
+the benchmark suite (plus the pages that use the remaining profiles) on the
+generated SQLite dataset, with the application cache cleared before every
+request so the database path always runs. Statements are counted by the
+per-request SQL instrumentation (dol_metrics/sql_metrics.py), read back from
+its Server-Timing header.
+
+Usage (from the project root):
+    python benchmarks/query_budget.py [--scale small] [--draws 3] [--only discourse]
+
+Exits non-zero if any endpoint fails or exceeds its budget. A budget is the
+most statements any draw of the endpoint may run; lower it when a change
+removes queries, raise it only with a reason.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+
+from fixtures import SCALES, boot_app, generate_dataset, install_stubs, scale_from
+from endpoints import ENDPOINTS, _client, _fill
+
+# Pages using the loader profiles that ENDPOINTS does not reach
+EXTRA_ENDPOINTS = (
+    ('discourse.dialogues_open', '/discourse/dialogues?discourse_id={discourse_id}', False),
+    ('discourse.edit', '/discourse/edit/{discourse_id}', True),
+    ('admin.discourses', '/admin/discourseblog/', True),
+    ('admin.liturgy', '/admin/liturgy/', True),
+)
+
+# Most statements one request may run, cold cache, logged-in user loaded from the database
+QUERY_BUDGETS = {
+    'main.index': 1,
+    'main.profile': 1,
+    'discourse.dialogues': 3,
+    'discourse.dialogues_open': 3,
+    'discourse.api_get': 3,
+    'discourse.comments': 1,
+    'discourse.index': 1,
+    'discourse.trending': 1,
+    'discourse.navigation': 3,
+    'discourse.related': 0,
+    'discourse.search': 2,
+    'discourse.author': 5,
+    'discourse.edit': 4,
+    'liturgy.calendar': 1,
+    'liturgy.devotions': 0,
+    'liturgy.readings': 0,
+    'bible.home': 0,
+    'bible.translations': 0,
+    'bible.metadata': 0,
+    'bible.search': 0,
+    'charity.home': 5,
+    'charity.search': 4,
+    'academic.theology': 0,
+    'admin.discourses': 3,
+    'admin.liturgy': 3,
+}
+
+SERVER_TIMING = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def statement_count(response):
+    """The statement count the SQL instrumentation put in the Server-Timing header."""
+    match = SERVER_TIMING.search(response.headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+def check_endpoint(app, ids, name, template, login, draws, seed):
+    """
+    Requests one endpoint `draws` times with different parameters.
+
+    Returns:
+        dict: The paths that did not answer 200 and the highest statement count.
+    """
+    from app.cache import cache
+
+    rng = random.Random(f"{seed}:{name}")
+    client = _client(app, login)
+    failed, most = [], 0
+    for _ in range(draws):
+        path = _fill(template, ids, rng)
+        cache.clear()  # Budgets are for the database path, not a cache hit
+        response = client.get(path)
+        if response.status_code != 200:
+            failed.append(f"{path} -> {response.status_code}")
+        most = max(most, statement_count(response) or 0)
+    return {'failed': failed, 'statements': most}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--draws', type=int, default=3, help="Requests per endpoint, each with other parameters.")
+    parser.add_argument('--only', action='append', default=[],
+                        help="Only endpoints whose name starts with this (repeatable), e.g. --only discourse.")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    endpoints = [e for e in ENDPOINTS + EXTRA_ENDPOINTS if not args.only or any(e[0].startswith(p) for p in args.only)]
+    if not endpoints:
+        parser.error('--only matched no endpoints')
+
+    db_path = tempfile.mktemp(prefix='budget-', suffix='.db')
+    os.environ['SQL_SERVER_TIMING'] = '1'
+    problems = []
+    try:
+        app = boot_app(db_path)
+        app.config['LOADER_RAISELOAD'] = True  # The point of the check
+        install_stubs()
+        print(f"Generating the '{args.scale}' dataset ...", flush=True)
+        ids = generate_dataset(app, scale_from(args.scale), seed=args.seed)
+
+        print(f"\n{'endpoint':<28} {'statements':>10} {'budget':>7}")
+        for name, template, login in endpoints:
+            result = check_endpoint(app, ids, name, template, login, args.draws, args.seed)
+            budget = QUERY_BUDGETS.get(name)
+            over = budget is not None and result['statements'] > budget
+            status = 'FAIL' if result['failed'] or over else 'ok'
+            print(f"{name:<28} {result['statements']:>10} {budget if budget is not None else '-':>7}  {status}")
+            for failure in result['failed']:
+                print(f"    {failure}")
+                problems.append(f"{name}: {failure}")
+            if over:
+                problems.append(f"{name}: {result['statements']} statements, budget {budget}")
+            elif budget is None:
+                problems.append(f"{name}: no budget in QUERY_BUDGETS (ran {result['statements']})")
+
+        from app.dol_discourse.disc_views import view_counter
+        view_counter.shutdown()
+    finally:
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+    if problems:
+        sys.exit("\nQuery budget check failed:\n  " + "\n  ".join(problems))
+    print("\nEvery endpoint answered 200 within its statement budget.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# /project_folder/benchmarks/replica_routing.py
+
+"""
+Walks through read/write splitting (see app/dol_db/routing.py) with two
+SQLite files, and checks that every read lands where it should.
+
+The primary is generated with the benchmark dataset; "replication" is a
+SQLite backup of the primary into the replica file. The script then drives
+GET requests through the test client and counts the SELECTs each database
+receives from request threads (the replica monitor's own queries are not
+counted). Reads are made on a cleared cache, except in step 2's cache check:
+
+    1. fresh replica              -> reads go to replica_1
+    2. right after a visitor's write, that visitor -> primary (read-your-writes)
+       while another visitor      -> replica_1
+       the cached discourse payload, rebuilt by the other visitor after the
+       write, still has the writer's comment (cache fills read the primary)
+    3. after DATABASE_STICKY_SECONDS, replicated again -> replica_1
+    4. replication stopped for longer than DATABASE_REPLICA_MAX_LAG
+                                  -> primary
+
+Usage (from the project root):
+    python benchmarks/replica_routing.py [--max-lag 1] [--check-interval 0.2] [--sticky-seconds 1]
+
+Exits non-zero if any step routes its reads to the wrong database.
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from flask import has_request_context
+from sqlalchemy import event
+
+from fixtures import BENCH_PASSWORD, boot_app, generate_dataset, install_stubs, scale_from
+
+
+def replicate(primary_path, replica_path):
+    """Copies the primary into the replica file, consistently (SQLite online backup)."""
+    source, target = sqlite3.connect(primary_path), sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+class ReadCounter:
+    """Counts SELECTs run from request threads, per database."""
+
+    def __init__(self, engines):
+        self.reads = Counter()
+        for name, engine in engines.items():
+            event.listen(engine, 'before_cursor_execute', self._listener(name))
+
+    def _listener(self, name):
+        def count(conn, cursor, statement, parameters, context, executemany):
+            if has_request_context() and statement.lstrip().upper().startswith('SELECT'):
+                self.reads[name] += 1
+        return count
+
+    def measure(self, request):
+        """Runs `request()` and returns the reads it caused, per database."""
+        self.reads.clear()
+        response = request()
+        if response.status_code != 200:
+            raise RuntimeError(f"Request failed with status {response.status_code}")
+        return dict(self.reads)
+
+
+def wait_for(router, predicate, timeout):
+    """Re-checks the replicas until `predicate(replica)` holds for replica_1."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        router.check()
+        if predicate(router.replicas[0]):
+            return True
+        time.sleep(router.check_interval)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check where reads are routed with a SQLite read replica.")
+    parser.add_argument('--max-lag', type=float, default=1, help="DATABASE_REPLICA_MAX_LAG (seconds).")
+    parser.add_argument('--check-interval', type=float, default=0.2, help="DATABASE_REPLICA_CHECK_INTERVAL (seconds).")
+    parser.add_argument('--sticky-seconds', type=int, default=1, help="DATABASE_STICKY_SECONDS.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='replica-')
+    primary_path = os.path.join(workdir, 'primary.db')
+    replica_path = os.path.join(workdir, 'replica.db')
+    os.environ.update({
+        'DATABASE_REPLICA_URLS': f"sqlite:///{replica_path}",
+        'DATABASE_REPLICA_MAX_LAG': str(args.max_lag),
+        'DATABASE_REPLICA_CHECK_INTERVAL': str(args.check_interval),
+        'DATABASE_STICKY_SECONDS': str(args.sticky_seconds),
+        'CACHE_URL': 'memory://',
+    })
+    failures = []
+    try:
+        app = boot_app(primary_path)
+        install_stubs()
+        ids = generate_dataset(app, scale_from('small', discourses=20, comments_per_discourse=2, charities=5))
+        from app.cache import cache
+        from app.dol_db.models import db
+        from app.dol_discourse.disc_views import view_counter
+
+        router = app.extensions['db_router']
+        with app.app_context():
+            counter = ReadCounter({'primary': db.engines[None], 'replica_1': db.engines['replica_1']})
+        discourse_id = ids['discourse_ids'][0]
+        path = f"/discourse/api/{discourse_id}/comments"
+        detail_path = f"/discourse/api/get/{discourse_id}"
+
+        def comment_count(client):
+            response = client.get(detail_path)  # Through the payload cache
+            if response.status_code != 200:
+                raise RuntimeError(f"Request failed with status {response.status_code}")
+            return response.get_json()['discourse']['comment_count']
+
+        def read(client):
+            cache.clear()  # Every read must reach a database
+            return counter.measure(lambda: client.get(path))
+
+        def expect(step, reads, target):
+            ok = reads.get(target, 0) > 0 and sum(reads.values()) == reads[target]
+            print(f"  {'ok  ' if ok else 'FAIL'} {step}: {reads or 'no reads'} (expected {target})")
+            if not ok:
+                failures.append(step)
+
+        writer, other = app.test_client(), app.test_client()
+        response = writer.post('/login', data={'email': ids['admin_email'], 'password': BENCH_PASSWORD})
+        if response.status_code >= 400:
+            sys.exit(f"Login failed with status {response.status_code}")
+
+        print("1. Replica freshly copied from the primary")
+        router.beat()
+        replicate(primary_path, replica_path)
+        if not wait_for(router, lambda r: r.healthy, timeout=5):
+            failures.append('replica never became healthy')
+        expect("anonymous read", read(other), 'replica_1')
+
+        print("2. Right after a write")
+        count_before = comment_count(other)  # Cached from the (fresh) replica
+        response = writer.post('/discourse/api/add-comment',
+                               json={'discourse_id': discourse_id, 'comment_body': 'Read your writes.'})
+        if response.status_code != 201:
+            sys.exit(f"Writing a comment failed with status {response.status_code}")
+        expect("the writer's next read", read(writer), 'primary')
+        expect("another visitor's read", read(other), 'replica_1')
+        # The other visitor rebuilds the invalidated payload first; the replica still lacks the comment
+        counts = (comment_count(other), comment_count(writer))
+        ok = counts == (count_before + 1, count_before + 1)
+        print(f"  {'ok  ' if ok else 'FAIL'} cached payload rebuilt by another visitor: comment_count "
+              f"{counts[0]}, then the writer sees {counts[1]} (expected {count_before + 1})")
+        if not ok:
+            failures.append('cached payload after a write')
+
+        print(f"3. {args.sticky_seconds}s later, replicated again")
+        time.sleep(args.sticky_seconds + 0.1)
+        router.beat()
+        replicate(primary_path, replica_path)
+        wait_for(router, lambda r: r.healthy, timeout=5)
+        expect("the writer's read", read(writer), 'replica_1')
+
+        print(f"4. Replication stopped for more than {args.max_lag:g}s")
+        if not wait_for(router, lambda r: not r.healthy, timeout=args.max_lag + 10 * args.check_interval + 5):
+            failures.append('replica never fell behind')
+        print(f"     replica_1: {router.replicas[0].lag:.1f}s behind")
+        expect("anonymous read", read(other), 'primary')
+
+        router.stop()
+        view_counter.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        sys.exit(f"\nReads went to the wrong database in: {', '.join(failures)}")
+    print("\nAll reads were routed as expected.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# /project_folder/benchmarks/startup_importtime.py
+
+"""
+Cold-start import budget for the application factory.
+
+Runs `python -X importtime -c "from app import create_app; create_app()"` in
+fresh interpreters, sums the self time of every import and compares the median
+against a budget. It also fails if any module that should only be imported on
+first use (see LAZY_MODULES) was loaded during startup.
+
+Usage (from the project root):
+    python benchmarks/startup_importtime.py [--budget-ms 1000] [--runs 5] [--top 15]
+
+Exits with status 1 when the budget is exceeded or a lazy module was imported.
+The budget can also be set with STARTUP_IMPORT_BUDGET_MS.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET_MS = 1000
+STARTUP_CODE = "from app import create_app; create_app()"
+
+# Loaded on first use by the code paths that need them; never at startup.
+# (PIL.Image is not listed: flask_admin.form.upload imports it unconditionally.)
+LAZY_MODULES = (
+    'numpy',                          # disc_related
+    'scipy',                          # disc_related
+    'requests',                       # lit_utils.safe_fetch
+    'plugins.catholic_mass_readings', # lit_utils.fetch_readings_async
+    'bs4',
+    'html5lib',
+    'curl_cffi',
+    'pytz',
+)
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure_once():
+    """
+    Runs the startup code once in a fresh interpreter.
+
+    Returns:
+        tuple: (total_ms, {module: cumulative_ms} for the top two import levels, set_of_all_modules)
+    """
+    env = dict(os.environ)
+    # create_app only needs these to be present; it does not connect at startup
+    for key, value in (('DB_USER', 'bench'), ('DB_PASSWORD', 'bench'), ('DB_HOST', 'localhost'),
+                       ('DB_NAME', 'bench'), ('SECRET_KEY', 'bench'), ('JWT_SECRET_KEY', 'bench')):
+        env.setdefault(key, value)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_CODE],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"Startup failed:\n{result.stderr[-2000:]}")
+
+    total_us, outer, modules = 0, {}, set()
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        total_us += int(self_us)
+        modules.add(name)
+        if len(indent) <= 3:  # Top-level imports and their direct children
+            outer[name] = int(cumulative_us) / 1000
+    return total_us / 1000, outer, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.environ.get('STARTUP_IMPORT_BUDGET_MS', DEFAULT_BUDGET_MS)))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="How many of the slowest imports to list.")
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(max(args.runs, 1))]
+    runs.sort(key=lambda run: run[0])
+    median_ms, outer, modules = runs[len(runs) // 2]
+
+    print(f"Startup import time over {len(runs)} runs: "
+          f"median {median_ms:.0f} ms (min {runs[0][0]:.0f}, max {runs[-1][0]:.0f}), "
+          f"stdev {statistics.pstdev(r[0] for r in runs):.0f} ms; budget {args.budget_ms:.0f} ms")
+    print("\nSlowest imports, top two levels (median run):")
+    for name, ms in sorted(outer.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    eager = sorted(m for m in LAZY_MODULES if m in modules)
+    failed = False
+    if eager:
+        print(f"\nFAIL: imported at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"\nFAIL: median {median_ms:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if not failed:
+        print("\nOK")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""Add comment_count to DiscourseBlog and keyset index on comments
+
+Revision ID: 1b7e4c9d2a10
+Revises: e08eaf379e4e
+Create Date: 2026-10-19 09:12:41.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b7e4c9d2a10'
+down_revision = 'e08eaf379e4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('discourse_blogs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('discourse_comments', schema=None) as batch_op:
+        batch_op.create_index('ix_discourse_comments_keyset', ['discourse_id', 'date_commented', 'id'], unique=False)
+
+    # Backfill the counter from the existing comments
+    op.execute(
+        "UPDATE discourse_blogs SET comment_count = "
+        "(SELECT COUNT(*) FROM discourse_comments WHERE discourse_comments.discourse_id = discourse_blogs.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('discourse_comments', schema=None) as batch_op:
+        batch_op.drop_index('ix_discourse_comments_keyset')
+
+    with op.batch_alter_table('discourse_blogs', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')